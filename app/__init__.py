@@ -1,14 +1,33 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from config import Config
+from app.config import Config
+from app.services.cache import init_results_cache
+from app.services.instrumentation import init_instrumentation
+from app.services.jobs import JobQueue
+from app.services.recommender import init_recommender
+from app.services.telemetry import init_telemetry_store
+from app.services.tracking import init_tracker_manager
 
 db = SQLAlchemy()
+jobs = JobQueue()
 
 def create_app(config_class=Config):
-    app = Flask(__name__)
+    app = Flask(__name__, template_folder='../templates', static_folder='../static')
     app.config.from_object(config_class)
     
     db.init_app(app)
+    init_instrumentation(app)
+    jobs.init_app(app)
+    init_tracker_manager(app)
+    init_results_cache(app)
+    init_recommender(app)
+    init_telemetry_store(app)
+    
+    from app.services.rollups import init_rollups
+    init_rollups(app)
+    
+    from app.services.fleet import init_fleet
+    init_fleet(app)
     
     from app.routes.main import bp as main_bp
     app.register_blueprint(main_bp)
@@ -16,4 +35,17 @@ def create_app(config_class=Config):
     from app.routes.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    from app.services.reports import init_reports
+    init_reports(app)
+    
+    from app.models.models import create_missing_columns, create_missing_indexes
+    with app.app_context():
+        db.create_all()
+        create_missing_columns(db.engine)
+        create_missing_indexes(db.engine)
+    
+    if app.config.get('PRELOAD'):
+        from app.services.preload import prepare_for_fork
+        prepare_for_fork(app)
+    
     return app
\ No newline at end of file
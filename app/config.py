@@ -7,6 +7,106 @@ class Config:
     CLOUD_CREDENTIALS = {
         'aws': {
             'access_key': os.environ.get('AWS_ACCESS_KEY'),
-            'secret_key': os.environ.get('AWS_SECRET_KEY')
+            'secret_key': os.environ.get('AWS_SECRET_KEY'),
+            'token': os.environ.get('AWS_COLLECTOR_TOKEN')
+        },
+        'azure': {
+            'tenant_id': os.environ.get('AZURE_TENANT_ID'),
+            'client_id': os.environ.get('AZURE_CLIENT_ID'),
+            'client_secret': os.environ.get('AZURE_CLIENT_SECRET'),
+            'token': os.environ.get('AZURE_COLLECTOR_TOKEN')
+        },
+        'gcp': {
+            'project_id': os.environ.get('GCP_PROJECT_ID'),
+            'token': os.environ.get('GCP_COLLECTOR_TOKEN')
         }
-    }
\ No newline at end of file
+    }
+    # Async provider collectors (app.core.collectors) used by
+    # `flask fleet run --collect`: API root per provider, connections and
+    # requests per second per provider, and the on-disk cache of catalog
+    # lookups with its TTL in seconds
+    COLLECTOR_ENDPOINTS = {
+        'aws': os.environ.get('AWS_COLLECTOR_URL'),
+        'azure': os.environ.get('AZURE_COLLECTOR_URL'),
+        'gcp': os.environ.get('GCP_COLLECTOR_URL')
+    }
+    COLLECTOR_CONNECTIONS = int(os.environ.get('COLLECTOR_CONNECTIONS') or 8)
+    COLLECTOR_RATE_LIMIT = float(os.environ.get('COLLECTOR_RATE_LIMIT') or 20)
+    COLLECTOR_RETRIES = int(os.environ.get('COLLECTOR_RETRIES') or 4)
+    COLLECTOR_TIMEOUT = float(os.environ.get('COLLECTOR_TIMEOUT') or 30)
+    COLLECTOR_MAX_RESPONSE_BYTES = int(os.environ.get('COLLECTOR_MAX_RESPONSE_BYTES') or 64 * 1024 * 1024)
+    COLLECTOR_CACHE_PATH = os.environ.get('COLLECTOR_CACHE_PATH') or 'collector_cache'
+    COLLECTOR_CACHE_TTL = float(os.environ.get('COLLECTOR_CACHE_TTL') or 86400)
+    # Set by gunicorn.conf.py when the app is loaded once in the gunicorn
+    # master and shared by forked workers (app.services.preload)
+    PRELOAD = os.environ.get('APP_PRELOAD') == '1'
+    # Request, database and stage metrics served in Prometheus text format
+    # at METRICS_PATH. Requests taking SLOW_REQUEST_SECONDS or longer are
+    # logged with their slowest queries and stage timings (0 disables).
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    METRICS_PATH = os.environ.get('METRICS_PATH') or '/metrics'
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS') or 0)
+    # Web server worker processes serving the app, set by gunicorn.conf.py
+    WORKER_PROCESSES = int(os.environ.get('APP_WORKERS') or 1)
+    # Background measurement jobs. JOB_BACKEND is 'memory' (per process) or
+    # 'sqlite' (shared by every worker process pointing at JOB_DB_PATH); the
+    # memory backend only works with a single worker process.
+    JOB_BACKEND = os.environ.get('JOB_BACKEND') or ('sqlite' if WORKER_PROCESSES > 1 else 'memory')
+    JOB_DB_PATH = os.environ.get('JOB_DB_PATH') or 'greeninfer_jobs.db'
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE') or 32)
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 1.0)
+    # A running job whose worker has not renewed its lease for this many
+    # seconds is requeued, or failed after JOB_MAX_ATTEMPTS
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS') or 60)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 2)
+    ANALYZE_DURATION = int(os.environ.get('ANALYZE_DURATION') or 60)
+    # Longest run a POST /api/analyze job may ask for, in seconds
+    ANALYZE_MAX_DURATION = int(os.environ.get('ANALYZE_MAX_DURATION') or 3600)
+    # POST /api/analyze may only profile this server process and its
+    # children unless this is set, as any host process could be sampled
+    PROFILE_ANY_PID = os.environ.get('PROFILE_ANY_PID') == '1'
+    # Seconds between /proc samples it may ask for
+    PROFILE_MIN_INTERVAL = 0.01
+    PROFILE_MAX_INTERVAL = 60.0
+    # Emissions measurement. CARBON_INTENSITY (gCO2/kWh) is used when the
+    # meter cannot attribute emissions to a location itself.
+    TRACKER_MEASURE_POWER_SECS = float(os.environ.get('TRACKER_MEASURE_POWER_SECS') or 15)
+    TRACKER_WARM_UP = os.environ.get('TRACKER_WARM_UP', '1') != '0'
+    CARBON_INTENSITY = float(os.environ.get('CARBON_INTENSITY') or 400)
+    # Rows per transaction for POST /api/assessments/bulk (?chunk_size=)
+    BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE') or 1000)
+    BULK_MAX_CHUNK_SIZE = 10000
+    BULK_MAX_ERRORS = 1000
+    # Cached recommendation and ROI results, keyed by assessment content
+    RESULTS_CACHE_SIZE = int(os.environ.get('RESULTS_CACHE_SIZE') or 1024)
+    RESULTS_CACHE_TTL = float(os.environ.get('RESULTS_CACHE_TTL') or 3600)
+    ENERGY_PRICE_USD_PER_KWH = float(os.environ.get('ENERGY_PRICE_USD_PER_KWH') or 0.15)
+    # Longest window of series POST /api/simulate replays
+    SIMULATION_MAX_DAYS = int(os.environ.get('SIMULATION_MAX_DAYS') or 90)
+    # Largest series (samples times devices) it builds, how many simulators
+    # the results cache keeps, and intermediate results each one keeps
+    SIMULATION_MAX_SAMPLES = int(os.environ.get('SIMULATION_MAX_SAMPLES') or 4_000_000)
+    SIMULATION_CACHE_SIZE = int(os.environ.get('SIMULATION_CACHE_SIZE') or 16)
+    SIMULATION_GRAPH_CACHE_SIZE = int(os.environ.get('SIMULATION_GRAPH_CACHE_SIZE') or 16)
+    # GET /api/assessments page sizes and the default rollup window in days
+    HISTORY_PAGE_SIZE = 50
+    HISTORY_MAX_PAGE_SIZE = 500
+    HISTORY_ROLLUP_DAYS = int(os.environ.get('HISTORY_ROLLUP_DAYS') or 30)
+    # Telemetry segment store for POST /api/telemetry
+    TELEMETRY_PATH = os.environ.get('TELEMETRY_PATH') or 'telemetry'
+    TELEMETRY_COMPACT_INTERVAL = float(os.environ.get('TELEMETRY_COMPACT_INTERVAL') or 300)
+    TELEMETRY_COMPACT_MIN_SEGMENTS = 16
+    TELEMETRY_SEGMENT_SAMPLES = 1_000_000
+    TELEMETRY_MAX_BATCH_BYTES = 16 * 1024 * 1024
+    # Day-partitioned archive that compaction moves telemetry older than
+    # TELEMETRY_ARCHIVE_AFTER seconds into; RESOLUTION is seconds per slot
+    TELEMETRY_ARCHIVE_PATH = os.environ.get('TELEMETRY_ARCHIVE_PATH') or 'telemetry_archive'
+    TELEMETRY_ARCHIVE_RESOLUTION = int(os.environ.get('TELEMETRY_ARCHIVE_RESOLUTION') or 10)
+    TELEMETRY_ARCHIVE_AFTER = float(os.environ.get('TELEMETRY_ARCHIVE_AFTER') or 86400)
+    # flask fleet run: worker processes (default: CPU count), seconds per
+    # attempt and retries of failed deployments, the first after RETRY_DELAY
+    FLEET_WORKERS = int(os.environ.get('FLEET_WORKERS') or 0) or None
+    FLEET_TASK_TIMEOUT = float(os.environ.get('FLEET_TASK_TIMEOUT') or 600)
+    FLEET_RETRIES = int(os.environ.get('FLEET_RETRIES') or 2)
+    FLEET_RETRY_DELAY = 1.0
\ No newline at end of file
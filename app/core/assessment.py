@@ -1,29 +1,53 @@
 import os
-import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Tuple
+from app.core.energy import DeviceInventory, EnergyModel
+from app.core.inference import get_inference_table
+from app.core.metrics import MetricFrame, to_timedelta
+from app.core.providers import StubProvider
+from app.services.instrumentation import timed
+from app.services.telemetry import TelemetryStore, get_telemetry_store
 
 class AssessmentEngine:
     """Analyzes AI deployments by collecting model specs, hardware utilization, and energy data."""
     
-    def __init__(self, cloud_provider: str = None, api_keys: Dict = None):
+    def __init__(self, cloud_provider: str = None, api_keys: Dict = None,
+                 region: str = None, inventory: DeviceInventory = None,
+                 telemetry_source: str = None, telemetry: TelemetryStore = None,
+                 provider: StubProvider = None, deployment: str = None):
         """Initialize the assessment engine.
         
         Args:
             cloud_provider: The cloud provider (aws, azure, gcp)
             api_keys: Dictionary containing API keys for cloud provider access
+            region: Cloud region of the deployment, used for carbon intensity
+            inventory: Hardware SKU of each GPU, used for power curves
+            telemetry_source: Source name the deployment reports telemetry under
+            telemetry: Telemetry store to read, defaulting to the configured one
+            provider: Client answering provider calls in place of the cloud SDK,
+                e.g. a StubProvider or a collectors.CollectorProvider
+            deployment: Name of the deployment being assessed
         """
         self.cloud_provider = cloud_provider
         self.api_keys = api_keys or {}
+        self.region = region
+        self.inventory = inventory or DeviceInventory()
+        self.telemetry_source = telemetry_source
+        self.telemetry = telemetry or get_telemetry_store()
+        self.provider = provider
+        self.deployment = deployment
         self.collected_data = {}
         
+    @timed('assessment.connect')
     def connect_cloud_provider(self) -> bool:
         """Establish connection to the specified cloud provider.
         
         Returns:
             bool: True if connection successful, False otherwise
         """
+        if self.provider is not None:
+            return self.provider.connect(self.api_keys)
         # In a real implementation, this would use the appropriate SDK
         # For the prototype, we'll simulate a connection
         if self.cloud_provider in ['aws', 'azure', 'gcp'] and self.api_keys:
@@ -31,12 +55,17 @@ class AssessmentEngine:
             return True
         return False
     
+    @timed('assessment.models')
     def collect_model_specs(self) -> Dict:
         """Collect specifications of deployed AI models.
         
         Returns:
             Dictionary containing model specifications
         """
+        if self.provider is not None:
+            models = self.provider.describe_models(self.deployment)
+            self.collected_data['models'] = models
+            return models
         # For the prototype, return sample data
         sample_models = {
             'model1': {'type': 'transformer', 'parameters': 175e9, 'precision': 'fp16'},
@@ -46,90 +75,102 @@ class AssessmentEngine:
         self.collected_data['models'] = sample_models
         return sample_models
     
-    def collect_hardware_metrics(self, days: int = 7) -> Dict:
+    @timed('assessment.hardware_metrics')
+    def collect_hardware_metrics(self, days: int = 7, interval: str = '1h',
+                                 num_gpus: int = 4) -> MetricFrame:
         """Collect hardware utilization metrics.
         
+        Reads the last ``days`` of telemetry reported under
+        ``telemetry_source``, falling back to the metrics the provider
+        client reports for the deployment. If neither has samples in that
+        window, simulated metrics are returned instead.
+        
         Args:
             days: Number of days of historical data to collect
+            interval: Sampling interval of the returned series
+            num_gpus: Number of GPUs to simulate per-device series for
             
         Returns:
-            Dictionary containing hardware metrics
+            MetricFrame with gpu, cpu and memory utilization series
         """
-        # Simulate hardware metrics collection
-        now = datetime.now()
-        dates = [now - timedelta(days=i) for i in range(days)]
-        
-        gpu_utilization = {
-            date.strftime('%Y-%m-%d'): np.random.uniform(0.3, 0.8) 
-            for date in dates
-        }
-        
-        cpu_utilization = {
-            date.strftime('%Y-%m-%d'): np.random.uniform(0.2, 0.6) 
-            for date in dates
-        }
+        step = to_timedelta(interval)
+        end = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 's')
+        if self.telemetry_source:
+            metrics = self.telemetry.frame(self.telemetry_source, end - np.timedelta64(days, 'D'),
+                                           end + np.timedelta64(1, 's'), interval)
+            if metrics is not None:
+                self.collected_data['hardware_metrics'] = metrics
+                return metrics
+        if self.provider is not None:
+            metrics = self.provider.hardware_metrics(self.deployment, end - np.timedelta64(days, 'D'),
+                                                     end, interval)
+            if metrics is not None:
+                self.collected_data['hardware_metrics'] = metrics
+                return metrics
         
-        memory_utilization = {
-            date.strftime('%Y-%m-%d'): np.random.uniform(0.4, 0.9) 
-            for date in dates
-        }
+        # Simulate hardware metrics collection
+        timestamps = np.arange(end - np.timedelta64(days, 'D'), end, step)
+        samples = len(timestamps)
         
-        metrics = {
-            'gpu_utilization': gpu_utilization,
-            'cpu_utilization': cpu_utilization,
-            'memory_utilization': memory_utilization
-        }
+        metrics = MetricFrame(timestamps)
+        metrics.add('gpu_utilization',
+                    np.random.uniform(0.3, 0.8, (num_gpus, samples)),
+                    [f'gpu{i}' for i in range(num_gpus)])
+        metrics.add('cpu_utilization', np.random.uniform(0.2, 0.6, samples), ['host'])
+        metrics.add('memory_utilization', np.random.uniform(0.4, 0.9, samples), ['host'])
         
         self.collected_data['hardware_metrics'] = metrics
         return metrics
     
+    @timed('assessment.energy')
     def estimate_energy_consumption(self) -> Dict:
         """Estimate energy consumption based on hardware utilization.
         
+        Integrates per-device power over the full GPU utilization series and
+        weights each hour's energy by the region's carbon intensity. Each
+        collected model's energy per token and per request is estimated from
+        its type, size, precision and batch size on the deployment's SKU.
+        
         Returns:
             Dictionary containing energy estimates
         """
-        # This would use a more sophisticated model in a real implementation
-        # For now, we'll use a simplified calculation
-        
         if 'hardware_metrics' not in self.collected_data:
             self.collect_hardware_metrics()
             
-        gpu_util = np.mean(list(self.collected_data['hardware_metrics']['gpu_utilization'].values()))
-        
-        # Simple energy model:
-        # Assuming 300W per GPU at full utilization, 100W base load
-        avg_power_per_gpu = 100 + (200 * gpu_util)  # Watts
-        
-        # Assume 4 GPUs for this example
-        num_gpus = 4
-        daily_energy = avg_power_per_gpu * num_gpus * 24 / 1000  # kWh per day
-        
-        # Carbon intensity (gCO2/kWh) varies by region, using 400 as example
-        carbon_intensity = 400
-        daily_carbon = daily_energy * carbon_intensity / 1000  # kg CO2 per day
-        
-        energy_data = {
-            'avg_power_per_gpu_watts': avg_power_per_gpu,
-            'total_power_watts': avg_power_per_gpu * num_gpus,
-            'daily_energy_kwh': daily_energy,
-            'daily_carbon_kg': daily_carbon,
-            'monthly_energy_kwh': daily_energy * 30,
-            'monthly_carbon_kg': daily_carbon * 30,
-        }
+        model = EnergyModel(self.inventory)
+        energy_data = model.estimate(self.collected_data['hardware_metrics'], self.region)
+        models = self.collected_data.get('models')
+        if models:
+            costs = get_inference_table().models(models, self.inventory.default_sku)
+            energy_data['inference'] = {
+                name: {key: values[i].item() for key, values in costs.items()}
+                for i, name in enumerate(models)
+            }
         
         self.collected_data['energy_data'] = energy_data
         return energy_data
     
-    def run_full_assessment(self) -> Dict:
+    @timed('assessment.full')
+    def run_full_assessment(self, days: int = 7, interval: str = '1h', num_gpus: int = 4) -> Dict:
         """Run a complete assessment of the AI infrastructure.
         
+        Args:
+            days: Number of days of hardware metrics to assess
+            interval: Sampling interval of the metrics
+            num_gpus: Number of GPUs to simulate when there is no telemetry
+            
         Returns:
             Dictionary containing all assessment data
         """
+        self.collected_data['deployment'] = {
+            'name': self.deployment,
+            'cloud_provider': self.cloud_provider,
+            'region': self.region,
+            'sku': self.inventory.default_sku
+        }
         self.connect_cloud_provider()
         self.collect_model_specs()
-        self.collect_hardware_metrics()
+        self.collect_hardware_metrics(days, interval, num_gpus)
         self.estimate_energy_consumption()
         return self.collected_data
 
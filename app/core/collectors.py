@@ -0,0 +1,783 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import ssl
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from app.core.metrics import Frequency, MetricFrame, TimeLike, to_timedelta
+from app.core.providers import PROVIDERS, ProviderError
+
+# Metrics AssessmentEngine reads, and the device they are reported for when
+# they are host-level rather than per accelerator
+METRICS = ('gpu_utilization', 'cpu_utilization', 'memory_utilization')
+HOST_DEVICE = 'host'
+
+# Largest response body read before a request is failed
+MAX_RESPONSE_BYTES = 64 * 1024 * 1024
+
+
+class HTTPError(ProviderError):
+    """A provider request that failed, with the HTTP status if one was received."""
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """Connection errors, timeouts, 429 and 5xx are worth retrying."""
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+@dataclass
+class Response:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else None
+
+
+class ConnectionPool:
+    """HTTP/1.1 keep-alive connections to one host, shared by concurrent
+    requests.
+
+    At most ``size`` connections are open at once, which also bounds the
+    requests in flight; further requests wait for a connection to be
+    returned. Create it inside the event loop that uses it.
+    """
+
+    def __init__(self, base_url: str, size: int = 8, timeout: float = 30.0,
+                 max_response_bytes: int = MAX_RESPONSE_BYTES):
+        """Initialize the pool.
+
+        Args:
+            base_url: Scheme, host, port and path prefix of the API
+            size: Maximum open connections
+            timeout: Seconds a single request may take
+            max_response_bytes: Largest response body accepted
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'Invalid base URL: {base_url!r}')
+        self.netloc = parts.netloc
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.prefix = parts.path.rstrip('/')
+        self.size = size
+        self.timeout = timeout
+        self.max_response_bytes = max_response_bytes
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(size)
+        self.opened = 0
+        self.requests = 0
+
+    def target(self, path: str, params: Dict = None) -> str:
+        """Request target for a path relative to the base URL, or for an
+        absolute URL on the same host such as a next-page link."""
+        if '://' in path:
+            parts = urlsplit(path)
+            if parts.netloc != self.netloc:
+                raise HTTPError(f'Refusing to follow link to another host: {parts.netloc}')
+            path = parts.path + (f'?{parts.query}' if parts.query else '')
+        else:
+            path = self.prefix + path
+        if params:
+            path += ('&' if '?' in path else '?') + urlencode(params)
+        return path
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.opened += 1
+        return reader, writer
+
+    @staticmethod
+    def _discard(conn):
+        conn[1].close()
+
+    async def _exchange(self, conn, method: str, target: str, headers: Dict[str, str],
+                        body: Optional[bytes]) -> Tuple[Response, bool]:
+        reader, writer = conn
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {self.netloc}', 'Connection: keep-alive',
+                 'Accept: application/json', 'Accept-Encoding: identity']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        if body is not None:
+            lines.append(f'Content-Length: {len(body)}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        limit = self.max_response_bytes
+        too_large = HTTPError(f'{method} {target}: response larger than {limit} bytes', int(status))
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            received = 0
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    await reader.readline()
+                    break
+                received += size
+                if received > limit:
+                    raise too_large
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            length = int(response_headers['content-length'])
+            if length > limit:
+                raise too_large
+            content = await reader.readexactly(length)
+        elif method == 'HEAD' or status in ('204', '304'):
+            content = b''
+        else:
+            chunks = []
+            received = 0
+            while True:
+                chunk = await reader.read(64 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > limit:
+                    raise too_large
+                chunks.append(chunk)
+            content = b''.join(chunks)
+            keep_alive = False
+        return Response(int(status), response_headers, content), keep_alive
+
+    async def request(self, method: str, path: str, params: Dict = None,
+                      headers: Dict[str, str] = None, body: bytes = None) -> Response:
+        """Send one request and read its response.
+
+        A kept-alive connection the server has since closed is replaced
+        and the request re-sent once.
+
+        Raises:
+            HTTPError: without a status if the connection failed or timed out
+        """
+        target = self.target(path, params)
+        async with self._slots:
+            self.requests += 1
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._open(), self.timeout)
+                try:
+                    response, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, target, headers, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    self._discard(conn)
+                    conn = await asyncio.wait_for(self._open(), self.timeout)
+                    response, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, target, headers, body), self.timeout)
+            except asyncio.TimeoutError:
+                if conn is not None:
+                    self._discard(conn)
+                raise HTTPError(f'{method} {target} timed out after {self.timeout:g}s')
+            except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                if conn is not None:
+                    self._discard(conn)
+                raise HTTPError(f'{method} {target} failed: {type(exc).__name__}: {exc}')
+            except BaseException:
+                if conn is not None:
+                    self._discard(conn)
+                raise
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                self._discard(conn)
+            return response
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` requests per second in bursts of up to
+    ``burst``. Waiters are served in arrival order."""
+
+    def __init__(self, rate: float = None, burst: int = None):
+        """Initialize the limiter.
+
+        Args:
+            rate: Requests per second, or None for no limit
+            burst: Requests allowed back to back, defaulting to one second's worth
+        """
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold back every request for ``seconds``, e.g. after a 429."""
+        if self.rate:
+            self._refill()
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter: retry ``n`` (from 0) waits a
+    uniform random time up to ``min(cap, base * 2 ** n)`` seconds, or the
+    server's Retry-After if that is longer."""
+    retries: int = 4
+    base: float = 0.1
+    cap: float = 10.0
+
+    def delay(self, attempt: int, retry_after: float = None, rng: random.Random = random) -> float:
+        return max(rng.uniform(0, min(self.cap, self.base * 2 ** attempt)), retry_after or 0.0)
+
+
+class ResponseCache:
+    """On-disk cache of JSON responses to idempotent lookups, such as
+    instance-type catalogs, that expire after ``ttl`` seconds.
+
+    Each entry is one file under ``root`` named by a digest of the request,
+    written atomically, so processes sharing the directory never see
+    partial entries.
+    """
+
+    def __init__(self, root: str, ttl: float = 86400):
+        self.root = root
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f'{key}.json')
+
+    def get(self, key: str) -> Any:
+        """Return the cached body, or None if missing or expired."""
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.ttl is not None and entry['stored'] + self.ttl < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['body']
+
+    def put(self, key: str, body: Any):
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'stored': time.time(), 'body': body}, f)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def clear(self):
+        for name in os.listdir(self.root):
+            if name.endswith('.json'):
+                os.unlink(os.path.join(self.root, name))
+
+
+# (path, query parameters, response field listing the items)
+ListRequest = Tuple[str, Dict[str, Any], str]
+
+
+class ProviderAdapter:
+    """Maps collector operations onto one provider's API.
+
+    Adapters speak a JSON dialect of each provider's catalog and monitoring
+    APIs that keeps its resource naming and pagination convention. They
+    authenticate with a bearer ``token`` from the credentials; vendor
+    request signing is not implemented, so the base URL points at a
+    collection gateway or at the fake servers in app.core.fake_clouds.
+    """
+    name: str = None
+    # Provider metric name of each metric in METRICS, reported in percent
+    metric_names: Dict[str, str] = {}
+
+    def __init__(self, credentials: Dict = None):
+        self.credentials = credentials or {}
+
+    def auth_headers(self) -> Dict[str, str]:
+        token = self.credentials.get('token')
+        return {'Authorization': f'Bearer {token}'} if token else {}
+
+    def first_page(self, params: Dict, page_size: int) -> Dict:
+        raise NotImplementedError
+
+    def next_page(self, body: Dict, path: str, params: Dict) -> Optional[Tuple[str, Dict]]:
+        """Path and parameters of the page after ``body``, or None if it was the last."""
+        raise NotImplementedError
+
+    def models(self, deployment: str) -> ListRequest:
+        raise NotImplementedError
+
+    def model_spec(self, item: Dict) -> Tuple[str, Dict]:
+        raise NotImplementedError
+
+    def accelerators(self, deployment: str) -> ListRequest:
+        raise NotImplementedError
+
+    def device(self, item: Dict) -> str:
+        raise NotImplementedError
+
+    def instance_types(self) -> ListRequest:
+        raise NotImplementedError
+
+    def instance_type(self, item: Dict) -> Dict:
+        raise NotImplementedError
+
+    def metric_data(self, deployment: str, metric: str, device: str,
+                    start: int, end: int, period: int) -> ListRequest:
+        """Datapoints of one device's metric in ``[start, end)`` epoch seconds,
+        aggregated over ``period`` seconds."""
+        raise NotImplementedError
+
+    def point(self, item: Dict) -> Tuple[int, float]:
+        raise NotImplementedError
+
+
+class AWSAdapter(ProviderAdapter):
+    """Opaque ``NextToken`` pagination with ``MaxResults`` page sizes."""
+    name = 'aws'
+    metric_names = {'gpu_utilization': 'GPUUtilization', 'cpu_utilization': 'CPUUtilization',
+                    'memory_utilization': 'MemoryUtilization'}
+
+    def first_page(self, params, page_size):
+        return dict(params, MaxResults=page_size)
+
+    def next_page(self, body, path, params):
+        token = body.get('NextToken')
+        return (path, dict(params, NextToken=token)) if token else None
+
+    def models(self, deployment):
+        return '/sagemaker/models', {'DeploymentName': deployment}, 'Models'
+
+    def model_spec(self, item):
+        return item['ModelName'], {'type': item['ModelType'], 'parameters': float(item['ParameterCount']),
+                                   'precision': item['Precision']}
+
+    def accelerators(self, deployment):
+        return '/ec2/accelerators', {'DeploymentName': deployment}, 'Accelerators'
+
+    def device(self, item):
+        return item['DeviceId']
+
+    def instance_types(self):
+        return '/ec2/instance-types', {}, 'InstanceTypes'
+
+    def instance_type(self, item):
+        return {'name': item['InstanceType'], 'gpus': item['GpuCount'], 'gpu_model': item['GpuModel'],
+                'vcpus': item['VCpus'], 'memory_gb': item['MemoryGiB']}
+
+    def metric_data(self, deployment, metric, device, start, end, period):
+        return '/cloudwatch/metric-data', {
+            'DeploymentName': deployment, 'MetricName': self.metric_names[metric], 'DeviceId': device,
+            'StartTime': start, 'EndTime': end, 'Period': period,
+        }, 'Datapoints'
+
+    def point(self, item):
+        return item['Timestamp'], item['Value']
+
+
+class AzureAdapter(ProviderAdapter):
+    """``$top`` page sizes and absolute ``nextLink`` URLs."""
+    name = 'azure'
+    api_version = '2024-04-01'
+    metric_names = {'gpu_utilization': 'GpuUtilizationPercentage',
+                    'cpu_utilization': 'CpuUtilizationPercentage',
+                    'memory_utilization': 'MemoryUtilizationPercentage'}
+
+    def first_page(self, params, page_size):
+        return dict(params, **{'api-version': self.api_version, '$top': page_size})
+
+    def next_page(self, body, path, params):
+        link = body.get('nextLink')
+        return (link, {}) if link else None
+
+    def models(self, deployment):
+        return f'/workspaces/{deployment}/models', {}, 'value'
+
+    def model_spec(self, item):
+        props = item['properties']
+        return item['name'], {'type': props['modelType'], 'parameters': float(props['parameterCount']),
+                              'precision': props['precision']}
+
+    def accelerators(self, deployment):
+        return f'/workspaces/{deployment}/accelerators', {}, 'value'
+
+    def device(self, item):
+        return item['name']
+
+    def instance_types(self):
+        return '/vmSizes', {}, 'value'
+
+    def instance_type(self, item):
+        props = item['properties']
+        return {'name': item['name'], 'gpus': props['gpus'], 'gpu_model': props['gpuModel'],
+                'vcpus': props['vCPUs'], 'memory_gb': props['memoryGB']}
+
+    def metric_data(self, deployment, metric, device, start, end, period):
+        return f'/workspaces/{deployment}/metrics', {
+            'metricnames': self.metric_names[metric], 'device': device,
+            'timespan': f'{start}/{end}', 'interval': period,
+        }, 'value'
+
+    def point(self, item):
+        return item['timeStamp'], item['average']
+
+
+class GCPAdapter(ProviderAdapter):
+    """``pageSize``/``pageToken`` pagination answered with ``nextPageToken``,
+    under the project named by the credentials' ``project_id``."""
+    name = 'gcp'
+    metric_names = {'gpu_utilization': 'accelerator/duty_cycle', 'cpu_utilization': 'instance/cpu/utilization',
+                    'memory_utilization': 'instance/memory/percent_used'}
+
+    @property
+    def project(self) -> str:
+        return self.credentials.get('project_id') or 'default'
+
+    def first_page(self, params, page_size):
+        return dict(params, pageSize=page_size)
+
+    def next_page(self, body, path, params):
+        token = body.get('nextPageToken')
+        return (path, dict(params, pageToken=token)) if token else None
+
+    def models(self, deployment):
+        return f'/v1/projects/{self.project}/deployments/{deployment}/models', {}, 'models'
+
+    def model_spec(self, item):
+        return item['name'], {'type': item['type'], 'parameters': float(item['parameterCount']),
+                              'precision': item['precision']}
+
+    def accelerators(self, deployment):
+        return f'/v1/projects/{self.project}/deployments/{deployment}/accelerators', {}, 'accelerators'
+
+    def device(self, item):
+        return item['id']
+
+    def instance_types(self):
+        return f'/v1/projects/{self.project}/machineTypes', {}, 'machineTypes'
+
+    def instance_type(self, item):
+        return {'name': item['name'], 'gpus': item['accelerators'], 'gpu_model': item['acceleratorType'],
+                'vcpus': item['guestCpus'], 'memory_gb': item['memoryMb'] / 1024}
+
+    def metric_data(self, deployment, metric, device, start, end, period):
+        return f'/v3/projects/{self.project}/deployments/{deployment}/timeSeries', {
+            'metric': self.metric_names[metric], 'device': device,
+            'startTime': start, 'endTime': end, 'alignmentPeriod': f'{period}s',
+        }, 'points'
+
+    def point(self, item):
+        return item['time'], item['value']
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (AWSAdapter, AzureAdapter, GCPAdapter)}
+
+
+class CloudCollector:
+    """Collects deployment data from one cloud provider's API with asyncio.
+
+    Requests share a keep-alive ConnectionPool and a token-bucket
+    RateLimiter. Connection errors, timeouts, 429 and 5xx responses are
+    retried with jittered exponential backoff, and a Retry-After pauses
+    every request to the provider. Metric series are fetched concurrently,
+    each split into time shards whose pages are walked in parallel.
+    Idempotent catalog lookups are served from ``cache`` when given.
+
+    Create and use it inside one event loop, and close it (or use
+    ``async with``) when done.
+    """
+
+    def __init__(self, provider: str, base_url: str, credentials: Dict = None,
+                 connections: int = 8, rate_limit: float = 20.0, burst: int = None,
+                 retry: RetryPolicy = None, timeout: float = 30.0, page_size: int = 500,
+                 shards: int = 4, cache: ResponseCache = None, seed: int = None,
+                 max_response_bytes: int = MAX_RESPONSE_BYTES):
+        """Initialize the collector.
+
+        Args:
+            provider: Cloud provider (aws, azure, gcp)
+            base_url: Root URL of the provider's API
+            credentials: The provider's entry of CLOUD_CREDENTIALS
+            connections: Maximum open connections, and so concurrent requests
+            rate_limit: Requests per second, or None for no limit
+            burst: Requests allowed back to back under the rate limit
+            retry: Backoff for transient failures
+            timeout: Seconds a single request may take
+            page_size: Items requested per page
+            shards: Time shards each metric series is split into
+            cache: Cache for idempotent lookups
+            seed: Seed for the retry jitter
+            max_response_bytes: Largest response body accepted
+        """
+        if provider not in PROVIDERS:
+            raise ValueError(f'Unknown cloud provider: {provider}')
+        self.provider = provider
+        self.adapter = ADAPTERS[provider](credentials)
+        self.pool = ConnectionPool(base_url, connections, timeout, max_response_bytes)
+        self.limiter = RateLimiter(rate_limit, burst)
+        self.retry = retry or RetryPolicy()
+        self.page_size = page_size
+        self.shards = max(1, shards)
+        self.cache = cache
+        self.retries = 0
+        self._random = random.Random(seed)
+
+    async def __aenter__(self) -> 'CloudCollector':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.pool.close()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'requests': self.pool.requests,
+            'retries': self.retries,
+            'connections_opened': self.pool.opened,
+            'cache_hits': self.cache.hits if self.cache else 0,
+        }
+
+    async def fetch(self, path: str, params: Dict = None) -> Dict:
+        """GET one JSON document, retrying transient failures.
+
+        Raises:
+            HTTPError: for client errors, or once retries are exhausted
+        """
+        for attempt in range(self.retry.retries + 1):
+            await self.limiter.acquire()
+            try:
+                response = await self.pool.request('GET', path, params, self.adapter.auth_headers())
+                if response.status >= 400:
+                    retry_after = response.headers.get('retry-after')
+                    raise HTTPError(f'{self.provider}: GET {path} returned {response.status}',
+                                    response.status, float(retry_after) if retry_after else None)
+                return response.json()
+            except HTTPError as exc:
+                if not exc.retryable or attempt == self.retry.retries:
+                    raise
+                if exc.retry_after:
+                    self.limiter.pause(exc.retry_after)
+                self.retries += 1
+                await asyncio.sleep(self.retry.delay(attempt, exc.retry_after, self._random))
+
+    async def paginate(self, request: ListRequest, cacheable: bool = False) -> List[Dict]:
+        """Follow a list request's pages and return all of its items."""
+        path, params, field = request
+        key = None
+        if cacheable and self.cache is not None:
+            key = ResponseCache.key(self.provider, self.pool.netloc, path, params)
+            items = self.cache.get(key)
+            if items is not None:
+                return items
+        items = []
+        page = (path, self.adapter.first_page(params, self.page_size))
+        while page is not None:
+            body = await self.fetch(*page)
+            items.extend(body.get(field) or [])
+            page = self.adapter.next_page(body, *page)
+        if key is not None:
+            self.cache.put(key, items)
+        return items
+
+    async def describe_models(self, deployment: str) -> Dict[str, Dict]:
+        """Return ``model name -> spec`` for the models of a deployment."""
+        items = await self.paginate(self.adapter.models(deployment))
+        return dict(self.adapter.model_spec(item) for item in items)
+
+    async def accelerators(self, deployment: str) -> List[str]:
+        items = await self.paginate(self.adapter.accelerators(deployment))
+        return [self.adapter.device(item) for item in items]
+
+    async def instance_types(self, cached: bool = True) -> List[Dict]:
+        """The provider's instance-type catalog, cached on disk unless
+        ``cached`` is false."""
+        items = await self.paginate(self.adapter.instance_types(), cacheable=cached)
+        return [self.adapter.instance_type(item) for item in items]
+
+    async def metric_series(self, deployment: str, metric: str, device: str,
+                            start: int, end: int, period: int) -> Tuple[np.ndarray, np.ndarray]:
+        """One device's metric in ``[start, end)`` epoch seconds as
+        (timestamps, utilization fractions), fetching ``shards`` time
+        windows concurrently."""
+        span = -(-(end - start) // period)
+        step = -(-span // self.shards) * period
+        bounds = [(lo, min(lo + step, end)) for lo in range(start, end, step)]
+        shards = await asyncio.gather(*(
+            self.paginate(self.adapter.metric_data(deployment, metric, device, lo, hi, period))
+            for lo, hi in bounds
+        ))
+        points = [self.adapter.point(item) for items in shards for item in items]
+        timestamps = np.array([t for t, _ in points], dtype=np.int64)
+        values = np.array([v for _, v in points], dtype=np.float32) / 100
+        return timestamps, values
+
+    async def hardware_metrics(self, deployment: str, start: TimeLike, end: TimeLike,
+                               interval: Frequency = '1h') -> Optional[MetricFrame]:
+        """Read gpu, cpu and memory utilization in ``[start, end)`` into a
+        MetricFrame on an ``interval`` grid, fetching every series at once.
+
+        Returns:
+            The frame, or None if the deployment reported no datapoints
+        """
+        period = int(to_timedelta(interval).astype(np.int64))
+        start = int(np.datetime64(start, 's').astype(np.int64)) // period * period
+        end = int(np.datetime64(end, 's').astype(np.int64))
+        if end <= start:
+            return None
+        devices = await self.accelerators(deployment)
+        series = [(metric, device) for metric in METRICS
+                  for device in (devices if metric == 'gpu_utilization' else [HOST_DEVICE])]
+        results = await asyncio.gather(*(
+            self.metric_series(deployment, metric, device, start, end, period) for metric, device in series
+        ))
+        if not any(len(timestamps) for timestamps, _ in results):
+            return None
+
+        axis = np.arange(start, end, period, dtype=np.int64)
+        columns = {metric: [] for metric in METRICS}
+        for (metric, device), (timestamps, values) in zip(series, results):
+            row = np.full(len(axis), np.nan, dtype=np.float32)
+            slots = (timestamps - start) // period
+            inside = (slots >= 0) & (slots < len(axis))
+            row[slots[inside]] = values[inside]
+            columns[metric].append((device, row))
+        frame = MetricFrame(axis.astype('datetime64[s]'))
+        for metric, rows in columns.items():
+            if rows:
+                frame.add(metric, np.vstack([row for _, row in rows]), [device for device, _ in rows])
+        return frame
+
+    async def collect(self, deployment: str, start: TimeLike, end: TimeLike,
+                      interval: Frequency = '1h') -> Dict:
+        """Models and hardware metrics of a deployment, fetched concurrently."""
+        models, metrics = await asyncio.gather(
+            self.describe_models(deployment), self.hardware_metrics(deployment, start, end, interval))
+        return {'models': models, 'hardware_metrics': metrics}
+
+
+class CollectorProvider:
+    """Synchronous provider client for AssessmentEngine backed by a
+    CloudCollector.
+
+    The collector lives on a private event loop that is kept between
+    calls, so every call of an assessment shares one connection pool.
+    Close the provider when done with it.
+    """
+
+    def __init__(self, name: str, base_url: str, cache_path: str = None,
+                 cache_ttl: float = 86400, **options):
+        """Initialize the provider.
+
+        Args:
+            name: Cloud provider (aws, azure, gcp)
+            base_url: Root URL of the provider's API
+            cache_path: Directory of the response cache, or None for no cache
+            cache_ttl: Seconds cached responses stay valid
+            **options: Further CloudCollector arguments
+        """
+        if name not in PROVIDERS:
+            raise ValueError(f'Unknown cloud provider: {name}')
+        self.name = name
+        self.base_url = base_url
+        self.cache = ResponseCache(cache_path, cache_ttl) if cache_path else None
+        self.options = options
+        self._loop = None
+        self._collector = None
+
+    def _run(self, method: str, *args):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        if self._collector is None:
+            async def create():
+                return CloudCollector(self.name, self.base_url, cache=self.cache, **self.options)
+            self._collector = self._loop.run_until_complete(create())
+        return self._loop.run_until_complete(getattr(self._collector, method)(*args))
+
+    def connect(self, api_keys: Dict = None) -> bool:
+        """Use ``api_keys`` for later calls and check them against the
+        instance-type catalog, fetched past the cache since cached entries
+        are not tied to the credentials that fetched them."""
+        if api_keys is not None:
+            self.options['credentials'] = api_keys
+            if self._collector is not None:
+                self._collector.adapter.credentials = api_keys
+        self._run('instance_types', False)
+        return True
+
+    def describe_models(self, deployment: str = None) -> Dict:
+        """Return ``model name -> spec`` for the models of a deployment."""
+        return self._run('describe_models', deployment)
+
+    def hardware_metrics(self, deployment: str, start: TimeLike, end: TimeLike,
+                         interval: Frequency = '1h') -> Optional[MetricFrame]:
+        return self._run('hardware_metrics', deployment, start, end, interval)
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._collector is not None:
+            self._loop.run_until_complete(self._collector.close())
+            self._collector = None
+        self._loop.close()
+        self._loop = None
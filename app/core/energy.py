@@ -0,0 +1,269 @@
+import csv
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.metrics import MetricFrame
+
+DEFAULT_INTENSITY_PATH = os.environ.get('CARBON_INTENSITY_PATH') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'carbon_intensity.csv'
+)
+
+# gCO2/kWh used for regions missing from the intensity table
+DEFAULT_CARBON_INTENSITY = 400.0
+
+# Number of (device, sample) cells processed per block when integrating energy
+BLOCK_CELLS = 1 << 22
+
+
+class PowerCurve:
+    """Maps utilization to power draw for one hardware SKU.
+
+    Power is ``idle + (max - idle) * utilization ** exponent`` watts.
+    """
+
+    def __init__(self, idle_watts: float, max_watts: float, exponent: float = 1.0):
+        self.idle_watts = idle_watts
+        self.max_watts = max_watts
+        self.exponent = exponent
+
+    def power(self, utilization: np.ndarray) -> np.ndarray:
+        utilization = np.clip(utilization, 0, 1)
+        return self.idle_watts + (self.max_watts - self.idle_watts) * utilization ** self.exponent
+
+
+POWER_CURVES: Dict[str, PowerCurve] = {
+    # The original flat model: 100W base load, 300W at full utilization
+    'generic': PowerCurve(100, 300),
+    'a100': PowerCurve(55, 400, 0.9),
+    'h100': PowerCurve(70, 700, 0.9),
+    'v100': PowerCurve(40, 300, 0.9),
+    'a10g': PowerCurve(25, 150),
+    't4': PowerCurve(10, 70),
+    'l4': PowerCurve(16, 72),
+    'inferentia2': PowerCurve(20, 120),
+}
+
+
+class DeviceInventory:
+    """Assigns a hardware SKU to each device label of a metric."""
+
+    def __init__(self, skus: Dict[str, str] = None, default_sku: str = 'generic',
+                 curves: Dict[str, PowerCurve] = None):
+        """Initialize the inventory.
+
+        Args:
+            skus: Device label to SKU name, e.g. {'gpu0': 'a100'}
+            default_sku: SKU for devices not listed in ``skus``
+            curves: Power curves by SKU, defaulting to POWER_CURVES
+        """
+        self.skus = dict(skus or {})
+        self.default_sku = default_sku
+        self.curves = curves or POWER_CURVES
+        for sku in set(self.skus.values()) | {default_sku}:
+            if sku not in self.curves:
+                raise ValueError(f'No power curve for SKU: {sku}')
+
+    def sku(self, device: str) -> str:
+        return self.skus.get(device, self.default_sku)
+
+    def curve_arrays(self, devices: Sequence[str]):
+        """Return idle watts, dynamic range and exponent per device as
+        column vectors ready to broadcast against (devices, samples)."""
+        curves = [self.curves[self.sku(device)] for device in devices]
+        idle = np.array([c.idle_watts for c in curves], dtype=np.float32)[:, np.newaxis]
+        span = np.array([c.max_watts - c.idle_watts for c in curves], dtype=np.float32)[:, np.newaxis]
+        exponent = np.array([c.exponent for c in curves], dtype=np.float32)[:, np.newaxis]
+        return idle, span, exponent
+
+
+class CarbonIntensityTable:
+    """Hourly grid carbon intensity (gCO2/kWh) by region.
+
+    Values are held in one float32 array of shape ``(regions, hours)``. A
+    table with 24 columns is a typical day indexed by UTC hour of day; one
+    with 8760 columns is indexed by UTC hour of year.
+    """
+
+    def __init__(self, regions: Sequence[str], values: np.ndarray,
+                 default: float = DEFAULT_CARBON_INTENSITY):
+        self.regions = list(regions)
+        self.values = np.ascontiguousarray(values, dtype=np.float32)
+        if self.values.shape != (len(self.regions), self.values.shape[1]) or \
+                self.values.shape[1] not in (24, 8760):
+            raise ValueError('values must have shape (regions, 24) or (regions, 8760)')
+        self.default = default
+        self._index = {region: i for i, region in enumerate(self.regions)}
+
+    def __contains__(self, region: str) -> bool:
+        return region in self._index
+
+    @property
+    def hours(self) -> int:
+        return self.values.shape[1]
+
+    def curve(self, region: str) -> np.ndarray:
+        """Return the region's hourly curve, or a flat default curve."""
+        if region in self._index:
+            return self.values[self._index[region]]
+        return np.full(self.hours, self.default, dtype=np.float32)
+
+    def mean(self, region: str) -> float:
+        return float(self.curve(region).mean())
+
+    def origin(self, timestamp) -> np.datetime64:
+        """Return the hour that column 0 stands for at ``timestamp``: the
+        start of its UTC day for a 24-hour table, of its UTC year otherwise."""
+        unit = 'datetime64[D]' if self.hours == 24 else 'datetime64[Y]'
+        return np.datetime64(timestamp).astype(unit).astype('datetime64[h]')
+
+    def lookup(self, region: str, timestamps: np.ndarray) -> np.ndarray:
+        """Return the intensity in effect at each timestamp."""
+        hours = np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64)
+        if self.hours == 24:
+            index = hours % 24
+        else:
+            year_start = np.asarray(timestamps, dtype='datetime64[Y]').astype('datetime64[h]').astype(np.int64)
+            index = np.minimum(hours - year_start, self.hours - 1)
+        return self.curve(region)[index]
+
+    @classmethod
+    def from_records(cls, regions: Sequence[str], hours: Sequence[int],
+                     intensities: Sequence[float]) -> 'CarbonIntensityTable':
+        regions = np.asarray(regions)
+        hours = np.asarray(hours, dtype=np.int64)
+        names, region_index = np.unique(regions, return_inverse=True)
+        width = 24 if hours.max() < 24 else 8760
+        values = np.full((len(names), width), np.nan, dtype=np.float32)
+        values[region_index, hours] = intensities
+        # Fill hours missing from the file with the region's mean
+        missing = np.isnan(values)
+        if missing.any():
+            values = np.where(missing, np.nanmean(values, axis=1)[:, np.newaxis], values)
+        return cls([str(name) for name in names], values)
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'CarbonIntensityTable':
+        """Load a CSV with ``region``, ``hour`` and ``intensity_g_per_kwh`` columns."""
+        regions: List[str] = []
+        hours: List[int] = []
+        intensities: List[float] = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                regions.append(row['region'])
+                hours.append(int(row['hour']))
+                intensities.append(float(row['intensity_g_per_kwh']))
+        return cls.from_records(regions, hours, intensities)
+
+    @classmethod
+    def from_parquet(cls, path: str) -> 'CarbonIntensityTable':
+        """Load a Parquet file with the same columns as ``from_csv``."""
+        import pandas as pd
+        df = pd.read_parquet(path, columns=['region', 'hour', 'intensity_g_per_kwh'])
+        return cls.from_records(df['region'].to_numpy(), df['hour'].to_numpy(),
+                                df['intensity_g_per_kwh'].to_numpy())
+
+    @classmethod
+    def load(cls, path: str) -> 'CarbonIntensityTable':
+        if path.endswith('.parquet'):
+            return cls.from_parquet(path)
+        return cls.from_csv(path)
+
+
+_tables: Dict[str, CarbonIntensityTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_intensity_table(path: str = None) -> CarbonIntensityTable:
+    """Return the intensity table at ``path``, loading it on first use only."""
+    path = os.path.abspath(path or DEFAULT_INTENSITY_PATH)
+    with _tables_lock:
+        if path not in _tables:
+            _tables[path] = CarbonIntensityTable.load(path)
+        return _tables[path]
+
+
+def sample_hours(frame: MetricFrame) -> np.ndarray:
+    """Hours each sample of ``frame`` is held for.
+
+    A sample lasts until the next one but never longer than the frame's
+    typical interval, so a gap in the telemetry is left out rather than
+    integrated at the last utilization seen. The last sample lasts one
+    interval, or an hour if it is the only one.
+    """
+    timestamps = frame.timestamps
+    interval = frame.interval if len(timestamps) > 1 else np.timedelta64(1, 'h')
+    steps = np.minimum(np.diff(timestamps, append=timestamps[-1] + interval), interval)
+    return steps / np.timedelta64(1, 'h')
+
+
+class EnergyModel:
+    """Integrates power and emissions over utilization time series."""
+
+    def __init__(self, inventory: DeviceInventory = None,
+                 intensity: CarbonIntensityTable = None, pue: float = 1.0):
+        """Initialize the energy model.
+
+        Args:
+            inventory: SKU of each device, defaulting to the generic curve
+            intensity: Hourly carbon intensity table, defaulting to the bundled one
+            pue: Data center power usage effectiveness applied to device power
+        """
+        self.inventory = inventory or DeviceInventory()
+        self.intensity = intensity or get_intensity_table()
+        self.pue = pue
+
+    def estimate(self, frame: MetricFrame, region: Optional[str],
+                 metric: str = 'gpu_utilization') -> Dict:
+        """Estimate energy and emissions for the devices in ``metric``.
+
+        Each sample is held for the time until the next one, capped at the
+        typical interval so telemetry gaps count as unobserved time (see
+        ``sample_hours``). Missing values are filled with the device's mean
+        utilization.
+
+        Returns:
+            Dictionary containing energy and carbon totals and daily/monthly rates
+        """
+        utilization = frame.values(metric)
+        devices = frame.devices(metric)
+        num_devices, samples = utilization.shape
+        if not samples:
+            raise ValueError(f'No {metric} samples to estimate energy from')
+
+        step_hours = sample_hours(frame).astype(np.float32)
+        intensity = self.intensity.lookup(region, frame.timestamps)
+        idle, span, exponent = self.inventory.curve_arrays(devices)
+        device_means = np.nan_to_num(np.nanmean(utilization, axis=1), nan=0.0)[:, np.newaxis]
+
+        energy_kwh = 0.0
+        carbon_kg = 0.0
+        peak_watts = 0.0
+        block = max(1, BLOCK_CELLS // num_devices)
+        for lo in range(0, samples, block):
+            util = utilization[:, lo:lo + block]
+            util = np.where(np.isnan(util), device_means, np.clip(util, 0, 1))
+            watts = (idle + span * util ** exponent).sum(axis=0) * self.pue
+            step_kwh = watts * step_hours[lo:lo + block] / 1000
+            energy_kwh += float(step_kwh.sum(dtype=np.float64))
+            carbon_kg += float(np.dot(step_kwh.astype(np.float64), intensity[lo:lo + block]) / 1000)
+            peak_watts = max(peak_watts, float(watts.max()))
+
+        hours = float(step_hours.sum(dtype=np.float64))
+        days = hours / 24
+        return {
+            'devices': num_devices,
+            'duration_hours': hours,
+            'avg_power_per_gpu_watts': energy_kwh * 1000 / hours / num_devices,
+            'total_power_watts': energy_kwh * 1000 / hours,
+            'peak_power_watts': peak_watts,
+            'total_energy_kwh': energy_kwh,
+            'total_carbon_kg': carbon_kg,
+            'carbon_intensity_g_per_kwh': carbon_kg * 1000 / energy_kwh if energy_kwh else self.intensity.mean(region),
+            'daily_energy_kwh': energy_kwh / days,
+            'daily_carbon_kg': carbon_kg / days,
+            'monthly_energy_kwh': energy_kwh / days * 30,
+            'monthly_carbon_kg': carbon_kg / days * 30,
+        }
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from app.core.providers import PROVIDERS, SAMPLE_MODELS
+
+GPU_MODELS = ('a100', 'h100', 'v100', 't4', 'l4')
+
+# Paged collection: (response field, item count, item at index)
+Collection = Tuple[str, int, Callable[[int], Dict]]
+
+REASONS = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests', 503: 'Service Unavailable'}
+
+
+class NotFound(Exception):
+    pass
+
+
+def utilization(*key) -> float:
+    """Deterministic utilization percentage for a series and timestamp: a
+    daily cycle with per-series phase plus noise."""
+    *series, timestamp = key
+    phase = zlib.crc32('/'.join(map(str, series)).encode()) % 86400
+    noise = zlib.crc32('/'.join(map(str, key)).encode()) % 1000 / 1000
+    daily = (1 + math.sin(2 * math.pi * (timestamp + phase) / 86400)) / 2
+    return round(100 * (0.2 + 0.5 * daily + 0.2 * noise), 2)
+
+
+class FakeCloudServer:
+    """Local HTTP server answering the API dialect CloudCollector speaks for
+    one provider, so collection can be run and timed offline.
+
+    Serves deterministic models, accelerators, an instance-type catalog
+    and metric datapoints, in pages of at most ``page_size`` items, over
+    keep-alive connections. Responses can be delayed and made to fail, and
+    requests beyond ``rate_limit`` per second are answered with 429 and a
+    Retry-After. The server runs its own event loop on a background thread;
+    ``stats`` counts requests and peak open connections and in-flight
+    requests.
+    """
+
+    def __init__(self, provider: str, latency: float = 0.0, failure_rate: float = 0.0,
+                 rate_limit: float = None, page_size: int = 100, accelerators: int = 4,
+                 catalog_size: int = 400, seed: int = None, host: str = '127.0.0.1', port: int = 0):
+        """Initialize the server.
+
+        Args:
+            provider: Provider whose dialect to speak (aws, azure, gcp)
+            latency: Seconds before each response
+            failure_rate: Fraction of requests answered with 503
+            rate_limit: Requests per second before answering 429, or None
+            page_size: Largest page served, whatever the client asks for
+            accelerators: GPUs reported per deployment
+            catalog_size: Entries in the instance-type catalog
+            seed: Seed for the failures
+            host: Interface to listen on
+            port: Port to listen on, 0 for any free port
+        """
+        if provider not in PROVIDERS:
+            raise ValueError(f'Unknown cloud provider: {provider}')
+        self.provider = provider
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.page_size = page_size
+        self.accelerators = accelerators
+        self.catalog_size = catalog_size
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server = None
+        self._writers = set()
+        self._window = (0.0, 0)
+        self.stats = {'requests': 0, 'throttled': 0, 'failed': 0, 'connections': 0,
+                      'open_connections': 0, 'peak_connections': 0, 'in_flight': 0, 'peak_in_flight': 0}
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def start(self) -> str:
+        """Start serving and return the base URL."""
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            for writer in self._writers:
+                writer.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name=f'fake-{self.provider}', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.url
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self) -> 'FakeCloudServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _throttled(self) -> bool:
+        if not self.rate_limit:
+            return False
+        second, count = self._window
+        now = math.floor(time.monotonic())
+        if now != second:
+            second, count = now, 0
+        self._window = (second, count + 1)
+        return count >= self.rate_limit
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        stats = self.stats
+        self._writers.add(writer)
+        stats['connections'] += 1
+        stats['open_connections'] += 1
+        stats['peak_connections'] = max(stats['peak_connections'], stats['open_connections'])
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    return
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get('content-length'):
+                    await reader.readexactly(int(headers['content-length']))
+
+                stats['requests'] += 1
+                stats['in_flight'] += 1
+                stats['peak_in_flight'] = max(stats['peak_in_flight'], stats['in_flight'])
+                try:
+                    status, body, extra = await self._respond(method, target)
+                finally:
+                    stats['in_flight'] -= 1
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                head = [f'HTTP/1.1 {status} {REASONS.get(status, "Error")}',
+                        'Content-Type: application/json', f'Content-Length: {len(body)}',
+                        f'Connection: {"keep-alive" if keep_alive else "close"}']
+                head += [f'{name}: {value}' for name, value in extra.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            stats['open_connections'] -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, method: str, target: str) -> Tuple[int, bytes, Dict]:
+        if self._throttled():
+            self.stats['throttled'] += 1
+            return 429, b'{"error": "rate limited"}', {'Retry-After': '1'}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            self.stats['failed'] += 1
+            return 503, b'{"error": "unavailable"}', {}
+        parts = urlsplit(target)
+        params = dict(parse_qsl(parts.query))
+        try:
+            if method != 'GET':
+                raise NotFound()
+            body = getattr(self, f'_{self.provider}')(parts.path, params)
+        except (NotFound, KeyError, ValueError):
+            return 404, json.dumps({'error': f'No such resource: {parts.path}'}).encode(), {}
+        return 200, json.dumps(body).encode(), {}
+
+    def _page(self, collection: Collection, size, offset) -> Tuple[Dict, Optional[int]]:
+        field, count, item = collection
+        size = min(int(size or self.page_size), self.page_size)
+        offset = int(offset or 0)
+        end = min(offset + size, count)
+        return {field: [item(i) for i in range(offset, end)]}, end if end < count else None
+
+    # Collections, independent of how each provider names and pages them
+
+    def _models(self, deployment: str):
+        # Same models StubProvider reports for the deployment
+        picker = random.Random(f'{self.provider}/{deployment}')
+        templates = picker.sample(SAMPLE_MODELS, picker.randint(1, 3))
+        return [(f'model{i + 1}', spec) for i, spec in enumerate(templates)]
+
+    def _catalog(self, i: int) -> Dict:
+        gpus = (0, 1, 2, 4, 8)[i % 5]
+        return {'name': f'{self.provider}-gpu{gpus}-{i}', 'gpus': gpus,
+                'gpu_model': GPU_MODELS[i % len(GPU_MODELS)] if gpus else None,
+                'vcpus': 4 * (1 + i % 24), 'memory_gb': 16 * (1 + i % 24)}
+
+    def _points(self, deployment, metric, device, start, end, period) -> Tuple[int, Callable]:
+        start, end, period = int(start), int(end), int(period)
+        if period <= 0:
+            raise ValueError(period)
+        first = -(-start // period) * period
+        count = max(0, -(-(end - first) // period))
+
+        def point(i):
+            timestamp = first + i * period
+            return timestamp, utilization(self.provider, deployment, metric, device, timestamp)
+
+        return count, point
+
+    def _aws(self, path: str, params: Dict) -> Dict:
+        size, token = params.get('MaxResults'), params.get('NextToken')
+        deployment = params.get('DeploymentName')
+        if path == '/sagemaker/models':
+            models = self._models(deployment)
+            collection = ('Models', len(models), lambda i: {
+                'ModelName': models[i][0], 'ModelType': models[i][1]['type'],
+                'ParameterCount': models[i][1]['parameters'], 'Precision': models[i][1]['precision']})
+        elif path == '/ec2/accelerators':
+            collection = ('Accelerators', self.accelerators, lambda i: {'DeviceId': f'gpu{i}'})
+        elif path == '/ec2/instance-types':
+            def entry(i):
+                spec = self._catalog(i)
+                return {'InstanceType': spec['name'], 'GpuCount': spec['gpus'], 'GpuModel': spec['gpu_model'],
+                        'VCpus': spec['vcpus'], 'MemoryGiB': spec['memory_gb']}
+            collection = ('InstanceTypes', self.catalog_size, entry)
+        elif path == '/cloudwatch/metric-data':
+            count, point = self._points(deployment, params['MetricName'], params['DeviceId'],
+                                        params['StartTime'], params['EndTime'], params['Period'])
+            collection = ('Datapoints', count, lambda i: dict(zip(('Timestamp', 'Value'), point(i))))
+        else:
+            raise NotFound()
+        body, following = self._page(collection, size, token)
+        if following is not None:
+            body['NextToken'] = str(following)
+        return body
+
+    def _azure(self, path: str, params: Dict) -> Dict:
+        match = re.fullmatch(r'/workspaces/([^/]+)/(models|accelerators|metrics)', path)
+        if match:
+            deployment, resource = match.groups()
+            if resource == 'models':
+                models = self._models(deployment)
+                collection = ('value', len(models), lambda i: {'name': models[i][0], 'properties': {
+                    'modelType': models[i][1]['type'], 'parameterCount': models[i][1]['parameters'],
+                    'precision': models[i][1]['precision']}})
+            elif resource == 'accelerators':
+                collection = ('value', self.accelerators, lambda i: {'name': f'gpu{i}'})
+            else:
+                start, end = params['timespan'].split('/')
+                count, point = self._points(deployment, params['metricnames'], params['device'],
+                                            start, end, params['interval'])
+                collection = ('value', count, lambda i: dict(zip(('timeStamp', 'average'), point(i))))
+        elif path == '/vmSizes':
+            def entry(i):
+                spec = self._catalog(i)
+                return {'name': spec['name'], 'properties': {
+                    'gpus': spec['gpus'], 'gpuModel': spec['gpu_model'],
+                    'vCPUs': spec['vcpus'], 'memoryGB': spec['memory_gb']}}
+            collection = ('value', self.catalog_size, entry)
+        else:
+            raise NotFound()
+        body, following = self._page(collection, params.get('$top'), params.get('$skiptoken'))
+        if following is not None:
+            body['nextLink'] = f'{self.url}{path}?{urlencode(dict(params, **{"$skiptoken": following}))}'
+        return body
+
+    def _gcp(self, path: str, params: Dict) -> Dict:
+        match = re.fullmatch(r'/v[13]/projects/[^/]+/(?:deployments/([^/]+)/)?'
+                             r'(models|accelerators|machineTypes|timeSeries)', path)
+        if not match:
+            raise NotFound()
+        deployment, resource = match.groups()
+        if resource == 'machineTypes':
+            def entry(i):
+                spec = self._catalog(i)
+                return {'name': spec['name'], 'accelerators': spec['gpus'], 'acceleratorType': spec['gpu_model'],
+                        'guestCpus': spec['vcpus'], 'memoryMb': spec['memory_gb'] * 1024}
+            collection = ('machineTypes', self.catalog_size, entry)
+        elif deployment is None:
+            raise NotFound()
+        elif resource == 'models':
+            models = self._models(deployment)
+            collection = ('models', len(models), lambda i: {
+                'name': models[i][0], 'type': models[i][1]['type'],
+                'parameterCount': models[i][1]['parameters'], 'precision': models[i][1]['precision']})
+        elif resource == 'accelerators':
+            collection = ('accelerators', self.accelerators, lambda i: {'id': f'gpu{i}'})
+        else:
+            count, point = self._points(deployment, params['metric'], params['device'], params['startTime'],
+                                        params['endTime'], params['alignmentPeriod'].rstrip('s'))
+            collection = ('points', count, lambda i: dict(zip(('time', 'value'), point(i))))
+        body, following = self._page(collection, params.get('pageSize'), params.get('pageToken'))
+        if following is not None:
+            body['nextPageToken'] = str(following)
+        return body
@@ -0,0 +1,245 @@
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.energy import POWER_CURVES, PowerCurve
+
+# Work per parameter per token (or image, or step) and tokens per request
+# for each model type. A transformer decoder does about two FLOPs per
+# parameter per generated token; convolutions reuse each weight across the
+# image, so a CNN does far more work per parameter per request.
+MODEL_TYPES: Dict[str, Dict[str, float]] = {
+    'transformer': {'flops_per_parameter': 2.0, 'tokens_per_request': 256},
+    'rnn': {'flops_per_parameter': 2.0, 'tokens_per_request': 100},
+    'cnn': {'flops_per_parameter': 300.0, 'tokens_per_request': 1},
+}
+
+# Bytes per weight and the peak-throughput class each precision runs at
+PRECISIONS: Dict[str, tuple] = {
+    'fp32': (4.0, 'fp32'),
+    'fp16': (2.0, 'fp16'),
+    'bf16': (2.0, 'fp16'),
+    'fp8': (1.0, 'int8'),
+    'int8': (1.0, 'int8'),
+    'int4': (0.5, 'int8'),
+}
+
+# Batch sizes the lookup table is computed at; other sizes round down
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Parameter counts the lookup table is computed at, 16 per decade from 1M
+# to 1T; costs in between are interpolated on a log-log scale
+PARAMETER_GRID = np.logspace(6, 12, 97)
+
+DEFAULT_BATCH_SIZE = 8
+
+# Achievable fraction of peak FLOPs and of peak memory bandwidth
+COMPUTE_EFFICIENCY = 0.5
+BANDWIDTH_EFFICIENCY = 0.8
+# Kernel launch and host synchronization time per forward step
+STEP_OVERHEAD_SECONDS = 5e-4
+# Share of a device's dynamic power drawn while it only streams memory;
+# busy arithmetic units draw the rest
+MEMORY_POWER_SHARE = 0.6
+# Memory kept free for activations and KV cache when sharding weights
+MEMORY_HEADROOM = 1.2
+
+
+class Accelerator:
+    """Dense peak throughput, memory bandwidth and capacity of one SKU."""
+
+    def __init__(self, tflops: Dict[str, float], bandwidth_gbs: float, memory_gb: float):
+        self.tflops = tflops
+        self.bandwidth_gbs = bandwidth_gbs
+        self.memory_gb = memory_gb
+
+
+ACCELERATORS: Dict[str, Accelerator] = {
+    'generic': Accelerator({'fp32': 15.0, 'fp16': 100.0, 'int8': 200.0}, 900, 32),
+    'a100': Accelerator({'fp32': 19.5, 'fp16': 312.0, 'int8': 624.0}, 2039, 80),
+    'h100': Accelerator({'fp32': 67.0, 'fp16': 989.0, 'int8': 1979.0}, 3350, 80),
+    'v100': Accelerator({'fp32': 15.7, 'fp16': 125.0, 'int8': 62.0}, 900, 32),
+    'a10g': Accelerator({'fp32': 31.2, 'fp16': 125.0, 'int8': 250.0}, 600, 24),
+    't4': Accelerator({'fp32': 8.1, 'fp16': 65.0, 'int8': 130.0}, 320, 16),
+    'l4': Accelerator({'fp32': 30.3, 'fp16': 121.0, 'int8': 242.0}, 300, 24),
+    'inferentia2': Accelerator({'fp32': 47.5, 'fp16': 190.0, 'int8': 380.0}, 820, 32),
+}
+
+
+def step_costs(model_type: str, parameters, precision: str, batch_size: int,
+               accelerator: Accelerator, curve: PowerCurve) -> Dict[str, np.ndarray]:
+    """Roofline cost of one forward step over ``batch_size`` tokens.
+
+    A step reads every weight once, shared by the whole batch, and does
+    ``flops_per_parameter`` FLOPs per weight per token. It takes as long
+    as the slower of the two, plus a fixed overhead, on as many devices as
+    the weights need to fit.
+
+    Args:
+        parameters: Parameter counts, scalar or array
+        accelerator: Throughput and memory of the device
+        curve: Power curve of the device
+
+    Returns:
+        Arrays of ``devices``, ``seconds``, ``joules`` and ``memory_bound``
+        per step
+    """
+    parameters = np.asarray(parameters, dtype=np.float64)
+    bytes_per_weight, compute_class = PRECISIONS[precision]
+    weight_bytes = parameters * bytes_per_weight
+    devices = np.maximum(1, np.ceil(weight_bytes * MEMORY_HEADROOM / (accelerator.memory_gb * 1e9)))
+    flops = MODEL_TYPES[model_type]['flops_per_parameter'] * parameters * batch_size
+    compute_seconds = flops / (devices * accelerator.tflops[compute_class] * 1e12 * COMPUTE_EFFICIENCY)
+    memory_seconds = weight_bytes / (devices * accelerator.bandwidth_gbs * 1e9 * BANDWIDTH_EFFICIENCY)
+    seconds = np.maximum(compute_seconds, memory_seconds) + STEP_OVERHEAD_SECONDS
+    activity = MEMORY_POWER_SHARE + (1 - MEMORY_POWER_SHARE) * compute_seconds / seconds
+    watts = devices * (curve.idle_watts + (curve.max_watts - curve.idle_watts) * np.minimum(activity, 1))
+    return {
+        'devices': devices,
+        'seconds': seconds,
+        'joules': watts * seconds,
+        'memory_bound': memory_seconds > compute_seconds,
+    }
+
+
+class InferenceCostTable:
+    """Energy per token over (model type, parameters, precision, batch, SKU).
+
+    Every combination on the grid is computed once up front, so costing
+    any number of models is an index lookup plus a log-log interpolation
+    between the two nearest parameter counts.
+    """
+
+    def __init__(self, accelerators: Dict[str, Accelerator] = None, curves: Dict[str, PowerCurve] = None):
+        self.accelerators = accelerators or ACCELERATORS
+        curves = curves or POWER_CURVES
+        self.types = list(MODEL_TYPES)
+        self.precisions = list(PRECISIONS)
+        self.batches = np.array(BATCH_SIZES)
+        self.skus = [sku for sku in self.accelerators if sku in curves]
+        self.log_parameters = np.log(PARAMETER_GRID)
+        shape = (len(self.types), len(self.precisions), len(self.batches), len(self.skus), len(PARAMETER_GRID))
+        self.log_joules = np.empty(shape)
+        self.seconds = np.empty(shape)
+        self.devices = np.empty(shape, dtype=np.int32)
+        self.memory_bound = np.empty(shape, dtype=bool)
+        for t, model_type in enumerate(self.types):
+            for p, precision in enumerate(self.precisions):
+                for b, batch in enumerate(self.batches):
+                    for s, sku in enumerate(self.skus):
+                        step = step_costs(model_type, PARAMETER_GRID, precision, int(batch),
+                                          self.accelerators[sku], curves[sku])
+                        self.log_joules[t, p, b, s] = np.log(step['joules'] / batch)
+                        self.seconds[t, p, b, s] = step['seconds'] / batch
+                        self.devices[t, p, b, s] = step['devices']
+                        self.memory_bound[t, p, b, s] = step['memory_bound']
+        self.tokens_per_request = np.array([MODEL_TYPES[t]['tokens_per_request'] for t in self.types])
+        self._type_index = {name: i for i, name in enumerate(self.types)}
+        self._precision_index = {name: i for i, name in enumerate(self.precisions)}
+        self._sku_index = {name: i for i, name in enumerate(self.skus)}
+
+    @staticmethod
+    def _index(values, index: Dict[str, int], default: str, n: int) -> np.ndarray:
+        if isinstance(values, str) or values is None:
+            return np.full(n, index.get(values, index[default]), dtype=np.int64)
+        fallback = index[default]
+        return np.array([index.get(value, fallback) for value in values], dtype=np.int64)
+
+    def lookup(self, model_types, parameters, precisions, batch_sizes=DEFAULT_BATCH_SIZE,
+               skus='generic') -> Dict[str, np.ndarray]:
+        """Inference cost of many models at once.
+
+        Every argument is a sequence with one entry per model or a single
+        value for all of them. Unknown types are costed as transformers,
+        unknown precisions as fp32 and unknown SKUs as the generic device;
+        batch sizes round down to the table's.
+
+        Returns:
+            Arrays of ``joules_per_token``, ``joules_per_request``,
+            ``seconds_per_token``, ``devices`` and ``memory_bound``
+        """
+        parameters = np.atleast_1d(np.asarray(parameters, dtype=np.float64))
+        n = len(parameters)
+        t = self._index(model_types, self._type_index, 'transformer', n)
+        p = self._index(precisions, self._precision_index, 'fp32', n)
+        s = self._index(skus, self._sku_index, 'generic', n)
+        batch = np.broadcast_to(np.asarray(batch_sizes, dtype=np.int64), (n,))
+        b = np.clip(np.searchsorted(self.batches, batch, side='right') - 1, 0, len(self.batches) - 1)
+
+        x = np.log(np.clip(parameters, PARAMETER_GRID[0], PARAMETER_GRID[-1]))
+        hi = np.clip(np.searchsorted(self.log_parameters, x), 1, len(PARAMETER_GRID) - 1)
+        lo = hi - 1
+        weight = (x - self.log_parameters[lo]) / (self.log_parameters[hi] - self.log_parameters[lo])
+        log_joules = (1 - weight) * self.log_joules[t, p, b, s, lo] + weight * self.log_joules[t, p, b, s, hi]
+        # Models larger than the grid scale linearly from its last point
+        joules = np.exp(log_joules) * np.maximum(parameters / PARAMETER_GRID[-1], 1)
+        nearest = np.where(weight < 0.5, lo, hi)
+        return {
+            'joules_per_token': joules,
+            'joules_per_request': joules * self.tokens_per_request[t],
+            'seconds_per_token': self.seconds[t, p, b, s, nearest],
+            'devices': self.devices[t, p, b, s, nearest],
+            'memory_bound': self.memory_bound[t, p, b, s, nearest],
+        }
+
+    def models(self, models: Dict[str, Dict], sku: str = 'generic', **overrides) -> Dict[str, np.ndarray]:
+        """Inference cost of model specs as AssessmentEngine collects them.
+
+        Args:
+            models: Specs by name, each optionally with its own
+                ``batch_size`` and ``sku``
+            sku: SKU of models that do not name one
+            overrides: Replacements for ``lookup`` arguments, e.g.
+                ``precisions='fp16'`` to cost every model quantized
+        """
+        specs = list(models.values())
+        arguments = {
+            'model_types': [spec.get('type') for spec in specs],
+            'parameters': [spec.get('parameters') or 0 for spec in specs],
+            'precisions': [spec.get('precision') for spec in specs],
+            'batch_sizes': [spec.get('batch_size') or DEFAULT_BATCH_SIZE for spec in specs],
+            'skus': [spec.get('sku') or sku for spec in specs],
+        }
+        arguments.update(overrides)
+        return self.lookup(**arguments)
+
+
+def estimate_model(model_type: str, parameters: float, precision: str = 'fp32',
+                   batch_size: int = DEFAULT_BATCH_SIZE, sku: str = 'generic') -> Dict:
+    """Exact cost of one model configuration, without the lookup table."""
+    step = step_costs(model_type, parameters, precision, batch_size, ACCELERATORS[sku], POWER_CURVES[sku])
+    joules_per_token = float(step['joules']) / batch_size
+    return {
+        'joules_per_token': joules_per_token,
+        'joules_per_request': joules_per_token * MODEL_TYPES[model_type]['tokens_per_request'],
+        'seconds_per_token': float(step['seconds']) / batch_size,
+        'devices': int(step['devices']),
+        'memory_bound': bool(step['memory_bound']),
+    }
+
+
+_table: Optional[InferenceCostTable] = None
+_table_lock = threading.Lock()
+
+
+def get_inference_table() -> InferenceCostTable:
+    """Return the process-wide cost table, computing it on first use."""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = InferenceCostTable()
+        return _table
+
+
+def savings(costs: Dict[str, np.ndarray], alternative: Dict[str, np.ndarray]) -> np.ndarray:
+    """Fraction of energy per request saved by ``alternative``, never negative."""
+    current = costs['joules_per_request']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        saved = 1 - alternative['joules_per_request'] / current
+    return np.clip(np.nan_to_num(saved), 0, 1)
+
+
+def bytes_per_weight(precision: str) -> float:
+    """Bytes each weight takes at ``precision``, unknown ones counted as fp32."""
+    return PRECISIONS.get(precision, PRECISIONS['fp32'])[0]
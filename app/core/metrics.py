@@ -0,0 +1,226 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+TimeLike = Union[str, np.datetime64, datetime]
+Frequency = Union[str, np.timedelta64]
+
+_FREQ_UNITS = {'s': 's', 'sec': 's', 'min': 'm', 'm': 'm', 'h': 'h', 'd': 'D', 'D': 'D', 'w': 'W'}
+
+
+def to_timedelta(freq: Frequency) -> np.timedelta64:
+    """Parse a frequency such as ``'15min'``, ``'1h'`` or ``'1D'``."""
+    if isinstance(freq, np.timedelta64):
+        return freq.astype('timedelta64[s]')
+    match = re.fullmatch(r'\s*(\d*)\s*([A-Za-z]+)\s*', freq)
+    if not match or match.group(2) not in _FREQ_UNITS:
+        raise ValueError(f'Unrecognised frequency: {freq!r}')
+    count = int(match.group(1) or 1)
+    return np.timedelta64(count, _FREQ_UNITS[match.group(2)]).astype('timedelta64[s]')
+
+
+class MetricFrame:
+    """Columnar container for hardware utilization time series.
+
+    All metrics share one sorted ``datetime64[s]`` time axis. Each metric is
+    a float32 array of shape ``(devices, samples)`` with its own device
+    labels, so per-GPU and host-level series can live side by side. Missing
+    samples are NaN and are ignored by the aggregations.
+    """
+
+    def __init__(self, timestamps, columns: Dict[str, np.ndarray] = None,
+                 devices: Dict[str, Sequence[str]] = None):
+        """Initialize the frame.
+
+        Args:
+            timestamps: Sorted sample times, anything ``np.asarray`` can turn
+                into ``datetime64[s]``
+            columns: Metric name to array of shape (samples,) or (devices, samples)
+            devices: Metric name to device labels, defaulting to '0', '1', ...
+        """
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+        if self.timestamps.ndim != 1:
+            raise ValueError('timestamps must be one-dimensional')
+        if len(self.timestamps) > 1 and (np.diff(self.timestamps) < np.timedelta64(0, 's')).any():
+            raise ValueError('timestamps must be sorted')
+        self._columns: Dict[str, np.ndarray] = {}
+        self._devices: Dict[str, List[str]] = {}
+        devices = devices or {}
+        for name, values in (columns or {}).items():
+            self.add(name, values, devices.get(name))
+
+    def add(self, name: str, values, devices: Sequence[str] = None):
+        """Add or replace a metric.
+
+        Args:
+            name: Metric name, e.g. 'gpu_utilization'
+            values: Array of shape (samples,) or (devices, samples)
+            devices: Labels for the device axis
+        """
+        values = np.asarray(values, dtype=np.float32)
+        if values.ndim == 1:
+            values = values[np.newaxis, :]
+        if values.ndim != 2 or values.shape[1] != len(self.timestamps):
+            raise ValueError(f'{name} must have {len(self.timestamps)} samples per device')
+        if devices is None:
+            devices = [str(i) for i in range(values.shape[0])]
+        if len(devices) != values.shape[0]:
+            raise ValueError(f'{name} has {values.shape[0]} devices but {len(devices)} labels')
+        self._columns[name] = values
+        self._devices[name] = list(devices)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    @property
+    def metrics(self) -> List[str]:
+        return list(self._columns)
+
+    @property
+    def start(self) -> Optional[np.datetime64]:
+        return self.timestamps[0] if len(self) else None
+
+    @property
+    def end(self) -> Optional[np.datetime64]:
+        return self.timestamps[-1] if len(self) else None
+
+    @property
+    def interval(self) -> np.timedelta64:
+        """Typical spacing between samples."""
+        if len(self) < 2:
+            return np.timedelta64(0, 's')
+        return np.median(np.diff(self.timestamps).astype(np.int64)).astype('timedelta64[s]')
+
+    @property
+    def duration_hours(self) -> float:
+        """Time covered by the samples, counting the last sample's interval."""
+        if not len(self):
+            return 0.0
+        span = (self.end - self.start) + self.interval
+        return float(span / np.timedelta64(1, 'h'))
+
+    def devices(self, name: str) -> List[str]:
+        return list(self._devices[name])
+
+    def device_count(self, name: str) -> int:
+        return self._columns[name].shape[0]
+
+    def values(self, name: str, device: str = None) -> np.ndarray:
+        """Return the (devices, samples) array for a metric, or the samples of
+        one device. The array is a view; do not modify it."""
+        values = self._columns[name]
+        if device is None:
+            return values
+        return values[self._devices[name].index(device)]
+
+    def window(self, start: TimeLike = None, end: TimeLike = None) -> 'MetricFrame':
+        """Return the samples in ``[start, end)`` as a new frame sharing memory
+        with this one."""
+        lo = 0 if start is None else np.searchsorted(self.timestamps, np.datetime64(start, 's'), 'left')
+        hi = len(self) if end is None else np.searchsorted(self.timestamps, np.datetime64(end, 's'), 'left')
+        frame = MetricFrame(self.timestamps[lo:hi])
+        for name, values in self._columns.items():
+            frame._columns[name] = values[:, lo:hi]
+            frame._devices[name] = self._devices[name]
+        return frame
+
+    def last(self, period: Frequency) -> 'MetricFrame':
+        """Return the trailing ``period`` of samples, e.g. ``last('7D')``."""
+        if not len(self):
+            return self
+        return self.window(start=self.end - to_timedelta(period) + np.timedelta64(1, 's'))
+
+    def _select(self, name: str, device: str = None) -> np.ndarray:
+        values = self.values(name, device)
+        return values if values.size else np.full(1, np.nan, dtype=np.float32)
+
+    def mean(self, name: str, device: str = None) -> float:
+        return float(np.nanmean(self._select(name, device)))
+
+    def max(self, name: str, device: str = None) -> float:
+        return float(np.nanmax(self._select(name, device)))
+
+    def percentile(self, name: str, q: float, device: str = None) -> float:
+        return float(np.nanpercentile(self._select(name, device), q))
+
+    def idle_fraction(self, name: str, threshold: float = 0.05, device: str = None) -> float:
+        """Fraction of observed samples at or below ``threshold`` utilization."""
+        values = self._select(name, device)
+        observed = np.isfinite(values)
+        if not observed.any():
+            return float('nan')
+        return float((values[observed] <= threshold).mean())
+
+    def per_device(self, name: str, how: str = 'mean') -> Dict[str, float]:
+        """Aggregate each device's series separately.
+
+        Args:
+            name: Metric name
+            how: 'mean', 'max', 'p95' or 'idle_fraction'
+        """
+        values = self.values(name)
+        if how == 'mean':
+            result = np.nanmean(values, axis=1)
+        elif how == 'max':
+            result = np.nanmax(values, axis=1)
+        elif how == 'p95':
+            result = np.nanpercentile(values, 95, axis=1)
+        elif how == 'idle_fraction':
+            observed = np.isfinite(values)
+            result = (np.where(observed, values, np.inf) <= 0.05).sum(axis=1) / np.maximum(observed.sum(axis=1), 1)
+        else:
+            raise ValueError(f'Unknown aggregation: {how}')
+        return dict(zip(self._devices[name], result.astype(float).tolist()))
+
+    def resample(self, freq: Frequency, how: str = 'mean') -> 'MetricFrame':
+        """Downsample every metric into fixed ``freq`` bins.
+
+        Bins are aligned to multiples of ``freq`` since the epoch and labelled
+        by their start; empty bins are dropped.
+
+        Args:
+            freq: Bin width, e.g. '1h' or '1D'
+            how: 'mean', 'max' or 'sum'
+        """
+        if not len(self):
+            return self
+        step = to_timedelta(freq).astype(np.int64)
+        seconds = self.timestamps.astype(np.int64)
+        bins = seconds // step
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        frame = MetricFrame((bins[starts] * step).astype('datetime64[s]'))
+        for name, values in self._columns.items():
+            observed = np.isfinite(values)
+            if how == 'max':
+                reduced = np.maximum.reduceat(np.where(observed, values, -np.inf), starts, axis=1)
+                reduced[np.isneginf(reduced)] = np.nan
+            else:
+                sums = np.add.reduceat(np.where(observed, values, 0), starts, axis=1, dtype=np.float64)
+                if how == 'sum':
+                    reduced = sums
+                elif how == 'mean':
+                    counts = np.add.reduceat(observed, starts, axis=1)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        reduced = sums / counts
+                else:
+                    raise ValueError(f'Unknown aggregation: {how}')
+            frame.add(name, reduced, self._devices[name])
+        return frame
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """JSON-friendly per-metric aggregates."""
+        return {
+            name: {
+                'mean': self.mean(name),
+                'p95': self.percentile(name, 95),
+                'max': self.max(name),
+                'idle_fraction': self.idle_fraction(name),
+                'devices': self.device_count(name),
+            }
+            for name in self._columns
+        }
@@ -0,0 +1,65 @@
+import random
+import time
+from typing import Dict
+
+PROVIDERS = ('aws', 'azure', 'gcp')
+
+# Models each stub reports, picked per deployment from these templates
+SAMPLE_MODELS = (
+    {'type': 'transformer', 'parameters': 175e9, 'precision': 'fp16'},
+    {'type': 'transformer', 'parameters': 7e9, 'precision': 'fp32'},
+    {'type': 'transformer', 'parameters': 13e9, 'precision': 'bf16'},
+    {'type': 'cnn', 'parameters': 120e6, 'precision': 'int8'},
+    {'type': 'cnn', 'parameters': 25e6, 'precision': 'fp32'},
+)
+
+
+class ProviderError(Exception):
+    """Raised when a cloud provider call fails."""
+
+
+class StubProvider:
+    """Local stand-in for a cloud provider SDK client.
+
+    Answers the calls AssessmentEngine makes after a fixed latency, failing
+    a given fraction of them, so fleet runs can be exercised and timed
+    without cloud credentials.
+    """
+
+    def __init__(self, name: str, latency: float = 0.0, failure_rate: float = 0.0,
+                 seed: int = None):
+        """Initialize the stub.
+
+        Args:
+            name: Provider it stands in for (aws, azure, gcp)
+            latency: Seconds each call takes
+            failure_rate: Probability that a call raises ProviderError
+            seed: Seed for the failures and reported models
+        """
+        if name not in PROVIDERS:
+            raise ValueError(f'Unknown cloud provider: {name}')
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def _call(self, operation: str):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            raise ProviderError(f'{self.name}: {operation} failed')
+
+    def connect(self, api_keys: Dict = None) -> bool:
+        self._call('connect')
+        return True
+
+    def describe_models(self, deployment: str = None) -> Dict:
+        """Return ``model name -> spec`` for the models of a deployment."""
+        self._call('describe_models')
+        picker = random.Random(f'{self.name}/{deployment}')
+        templates = picker.sample(SAMPLE_MODELS, picker.randint(1, 3))
+        return {f'model{i + 1}': dict(spec) for i, spec in enumerate(templates)}
+
+    def hardware_metrics(self, deployment: str, start, end, interval: str = '1h'):
+        """The stub reports no metrics, so AssessmentEngine simulates them."""
+        return None
@@ -1,18 +1,34 @@
+import copy
 from typing import Dict, List, Any, Tuple
-import pandas as pd
 import numpy as np
+from app.core.energy import get_intensity_table
+from app.core.inference import get_inference_table, savings
+from app.core.simulation import JobTrace, simulate_carbon_shift
+from app.services.cache import ResultsCache, content_hash, get_results_cache
+from app.services.instrumentation import timed
+from app.services.recommender import (DISTILLATION_SIZE, MAX_ENERGY_REDUCTION, QUANTIZATION_PRECISION,
+                                      RuleEngine, compound, get_energy_price, get_rule_engine)
 
 class RecommendationSystem:
     """Generates tailored sustainability recommendations for AI infrastructure."""
     
-    def __init__(self, assessment_data: Dict = None):
+    def __init__(self, assessment_data: Dict = None, engine: RuleEngine = None,
+                 cache: ResultsCache = None, energy_price: float = None):
         """Initialize the recommendation system.
         
         Args:
             assessment_data: Data from the assessment engine
+            engine: Rule engine to evaluate, defaulting to the built-in rules
+            cache: Results cache shared across instances, defaulting to the process-wide one
+            energy_price: Electricity cost in USD/kWh, defaulting to the configured price
         """
         self.assessment_data = assessment_data
+        self.engine = engine or get_rule_engine()
+        self.cache = cache or get_results_cache()
+        self.energy_price = energy_price
         self.recommendations = []
+        self._generated_for = None
+        self._deployment = None
         
         # Define recommendation categories
         self.categories = [
@@ -31,6 +47,82 @@ class RecommendationSystem:
             assessment_data: Data from the assessment engine
         """
         self.assessment_data = assessment_data
+        self._generated_for = None
+        self._deployment = None
+        
+    def _monthly_carbon_kg(self) -> float:
+        return self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0)
+    
+    def _model_table(self) -> Dict[str, np.ndarray]:
+        """Build one row per deployed model for the model-scoped rules.
+
+        Distillation and quantization savings are each model's estimated
+        energy per request as a smaller or lower-precision model, relative
+        to its energy now, looked up in the inference cost table.
+        """
+        models = self.assessment_data.get('models') or {}
+        names = list(models)
+        parameters = np.array([models[name].get('parameters') or 0 for name in names], dtype=np.float64)
+        sku = self.assessment_data.get('deployment', {}).get('sku', 'generic')
+        table = get_inference_table()
+        costs = table.models(models, sku)
+        distillation = savings(costs, table.models(models, sku, parameters=parameters * DISTILLATION_SIZE))
+        quantization = savings(costs, table.models(models, sku, precisions=QUANTIZATION_PRECISION))
+        return {
+            'model_name': np.array(names, dtype=object),
+            'parameters': parameters,
+            'parameters_b': parameters / 1e9,
+            'precision': np.array([models[name].get('precision') for name in names], dtype=object),
+            'joules_per_request': costs['joules_per_request'],
+            'distillation_savings': distillation,
+            'distillation_energy_percent': distillation * 100,
+            'quantization_savings': quantization,
+            'quantization_energy_percent': quantization * 100,
+            'monthly_carbon_kg': np.full(len(names), self._monthly_carbon_kg()),
+        }
+    
+    def _scheduling_features(self) -> Dict[str, float]:
+        """Simulate time-shifting the deferrable share of the deployment's
+        load against the region's hourly carbon intensity."""
+        energy_data = self.assessment_data.get('energy_data', {})
+        metrics = self.assessment_data.get('hardware_metrics')
+        if not energy_data or metrics is None:
+            return {}
+        
+        options = self.assessment_data.get('scheduling', {})
+        deferrable_fraction = options.get('deferrable_fraction', 0.5)
+        flexibility_hours = options.get('flexibility_hours', 12)
+        region = self.assessment_data.get('deployment', {}).get('region')
+        
+        intensity = get_intensity_table()
+        trace = self.assessment_data.get('job_trace')
+        if trace is None:
+            trace = JobTrace.from_utilization(metrics, energy_data['total_power_watts'] / 1000,
+                                              deferrable_fraction, flexibility_hours,
+                                              origin=intensity.origin(metrics.start))
+            shifted_share = deferrable_fraction
+        else:
+            shifted_share = options.get('trace_share', 1.0)
+        result = simulate_carbon_shift(intensity.curve(region), trace,
+                                       options.get('capacity_kw'))
+        return {
+            'shifted_share': shifted_share,
+            'flexibility_hours': flexibility_hours,
+            'shift_savings_fraction': result.savings_fraction,
+            'shift_carbon_factor': shifted_share * result.savings_fraction,
+        }
+    
+    def _deployment_table(self) -> Dict[str, np.ndarray]:
+        """Build the single-row feature table for the deployment-scoped rules."""
+        if self._deployment is None:
+            row = {'monthly_carbon_kg': self._monthly_carbon_kg()}
+            metrics = self.assessment_data.get('hardware_metrics')
+            if metrics is not None and 'gpu_utilization' in metrics:
+                row['gpu_util'] = metrics.mean('gpu_utilization')
+                row['gpu_util_p95'] = metrics.percentile('gpu_utilization', 95)
+            row.update(self._scheduling_features())
+            self._deployment = {key: np.array([value], dtype=np.float64) for key, value in row.items()}
+        return self._deployment
         
     def _get_model_recommendations(self) -> List[Dict]:
         """Generate recommendations related to model selection.
@@ -38,46 +130,9 @@ class RecommendationSystem:
         Returns:
             List of recommendation dictionaries
         """
-        recommendations = []
-        
-        # Check if large models can be downsized
-        if self.assessment_data and 'models' in self.assessment_data:
-            models = self.assessment_data['models']
-            
-            for model_name, specs in models.items():
-                # If model is large (>10B params), recommend distillation
-                if specs.get('parameters', 0) > 10e9:
-                    recommendations.append({
-                        'id': 'model-01',
-                        'title': f'Consider model distillation for {model_name}',
-                        'description': f'Model {model_name} has {specs["parameters"]/1e9:.1f}B parameters. ' 
-                                      f'Consider using knowledge distillation to create a smaller model that maintains accuracy.',
-                        'impact': 'high',
-                        'effort': 'medium',
-                        'category': 'Model Selection',
-                        'estimated_savings': {
-                            'energy_percent': 40,
-                            'carbon_kg_per_month': self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0) * 0.4
-                        }
-                    })
-                
-                # If model using FP32, recommend quantization
-                if specs.get('precision') == 'fp32':
-                    recommendations.append({
-                        'id': 'model-02',
-                        'title': f'Quantize {model_name} from FP32 to FP16 or INT8',
-                        'description': f'Model {model_name} is using FP32 precision. Quantizing to FP16 could reduce '
-                                      f'memory usage and computation with minimal accuracy impact.',
-                        'impact': 'medium',
-                        'effort': 'low',
-                        'category': 'Model Optimization',
-                        'estimated_savings': {
-                            'energy_percent': 25,
-                            'carbon_kg_per_month': self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0) * 0.25
-                        }
-                    })
-        
-        return recommendations
+        if not self.assessment_data or 'models' not in self.assessment_data:
+            return []
+        return self.engine.recommendations(self._model_table(), scope='model')
     
     def _get_hardware_recommendations(self) -> List[Dict]:
         """Generate recommendations related to hardware configuration.
@@ -85,46 +140,8 @@ class RecommendationSystem:
         Returns:
             List of recommendation dictionaries
         """
-        recommendations = []
-        
-        if self.assessment_data and 'hardware_metrics' in self.assessment_data:
-            metrics = self.assessment_data['hardware_metrics']
-            
-            # Check GPU utilization
-            gpu_util_values = list(metrics['gpu_utilization'].values())
-            avg_gpu_util = np.mean(gpu_util_values)
-            
-            if avg_gpu_util < 0.5:
-                recommendations.append({
-                    'id': 'hw-01',
-                    'title': 'Low GPU utilization detected',
-                    'description': f'Average GPU utilization is {avg_gpu_util:.1%}, which suggests potential ' 
-                                  f'over-provisioning. Consider consolidating workloads or downsizing GPU resources.',
-                    'impact': 'high',
-                    'effort': 'medium',
-                    'category': 'Hardware Configuration',
-                    'estimated_savings': {
-                        'energy_percent': 30,
-                        'carbon_kg_per_month': self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0) * 0.3
-                    }
-                })
-                
-            # Recommend more energy-efficient GPUs
-            recommendations.append({
-                'id': 'hw-02',
-                'title': 'Evaluate newer GPU generations for inference',
-                'description': 'Newer GPU architectures often provide better energy efficiency. '
-                              'Consider using purpose-built inference hardware like NVIDIA T4 or AWS Inferentia.',
-                'impact': 'medium',
-                'effort': 'high',
-                'category': 'Hardware Configuration',
-                'estimated_savings': {
-                    'energy_percent': 35,
-                    'carbon_kg_per_month': self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0) * 0.35
-                }
-            })
-        
-        return recommendations
+        return self.engine.recommendations(self._deployment_table(), scope='deployment',
+                                           category='Hardware Configuration')
     
     def _get_scheduling_recommendations(self) -> List[Dict]:
         """Generate recommendations related to workload scheduling.
@@ -132,23 +149,8 @@ class RecommendationSystem:
         Returns:
             List of recommendation dictionaries
         """
-        recommendations = []
-        
-        recommendations.append({
-            'id': 'sched-01',
-            'title': 'Implement carbon-aware scheduling',
-            'description': 'Schedule non-urgent batch processing jobs during times when the grid has '
-                          'higher renewable energy mix or lower carbon intensity.',
-            'impact': 'medium',
-            'effort': 'medium',
-            'category': 'Scheduling & Workload',
-            'estimated_savings': {
-                'energy_percent': 0, # Energy use is the same, but carbon impact is lower
-                'carbon_kg_per_month': self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0) * 0.2
-            }
-        })
-        
-        return recommendations
+        return self.engine.recommendations(self._deployment_table(), scope='deployment',
+                                           category='Scheduling & Workload')
     
     def _get_location_recommendations(self) -> List[Dict]:
         """Generate recommendations related to infrastructure location.
@@ -156,72 +158,83 @@ class RecommendationSystem:
         Returns:
             List of recommendation dictionaries
         """
+        return self.engine.recommendations(self._deployment_table(), scope='deployment',
+                                           category='Infrastructure Location')
+    
+    def _evaluate_rules(self) -> List[Dict]:
+        self._deployment = None
         recommendations = []
         
-        recommendations.append({
-            'id': 'loc-01',
-            'title': 'Consider region with lower carbon intensity',
-            'description': 'Moving compute to regions with cleaner energy grids can reduce carbon footprint. '
-                          'Cloud regions in Nordics, Canada, and certain US states have lower carbon intensity.',
-            'impact': 'high',
-            'effort': 'high',
-            'category': 'Infrastructure Location',
-            'estimated_savings': {
-                'energy_percent': 0, # Energy use is the same, but carbon impact is lower
-                'carbon_kg_per_month': self.assessment_data.get('energy_data', {}).get('monthly_carbon_kg', 0) * 0.6
-            }
-        })
+        # Collect recommendations from different categories
+        recommendations.extend(self._get_model_recommendations())
+        recommendations.extend(self._get_hardware_recommendations())
+        recommendations.extend(self._get_scheduling_recommendations())
+        recommendations.extend(self._get_location_recommendations())
         
+        # Sort recommendations by impact
+        impact_order = {'high': 0, 'medium': 1, 'low': 2}
+        recommendations.sort(key=lambda x: impact_order.get(x.get('impact'), 99))
         return recommendations
     
+    def _recommendations_for(self, digest: str) -> List[Dict]:
+        """Return recommendations for assessment data with content hash
+        ``digest``, evaluating the rules only on a cache miss."""
+        if self._generated_for != digest:
+            key = ('recommendations', self.engine.version, digest)
+            cached = self.cache.get_or_compute(key, self._evaluate_rules, tags=('rules',))
+            # Callers may edit the returned dicts; keep the cached copy intact
+            self.recommendations = copy.deepcopy(cached)
+            self._generated_for = digest
+        return self.recommendations
+    
+    @timed('recommendations.generate')
     def generate_recommendations(self) -> List[Dict]:
         """Generate all recommendations based on assessment data.
         
+        Results are cached by the content of the assessment data, so
+        repeated calls for the same assessment are cheap.
+        
         Returns:
             List of recommendation dictionaries
         """
         if not self.assessment_data:
             return []
-            
-        self.recommendations = []
-        
-        # Collect recommendations from different categories
-        self.recommendations.extend(self._get_model_recommendations())
-        self.recommendations.extend(self._get_hardware_recommendations())
-        self.recommendations.extend(self._get_scheduling_recommendations())
-        self.recommendations.extend(self._get_location_recommendations())
-        
-        # Sort recommendations by impact
-        impact_order = {'high': 0, 'medium': 1, 'low': 2}
-        self.recommendations.sort(key=lambda x: impact_order.get(x.get('impact'), 99))
-        
-        return self.recommendations
+        self._generated_for = None
+        return self._recommendations_for(content_hash(self.assessment_data))
     
+    @timed('recommendations.roi')
     def get_roi_estimates(self) -> Dict:
         """Calculate return on investment for implementing recommendations.
         
         Returns:
             Dictionary with ROI information
         """
-        if not self.recommendations:
-            self.generate_recommendations()
-            
-        total_carbon_savings = sum(rec.get('estimated_savings', {}).get('carbon_kg_per_month', 0) 
-                                 for rec in self.recommendations)
+        digest = content_hash(self.assessment_data)
+        energy_cost_per_kwh = self.energy_price if self.energy_price is not None else get_energy_price()
+        key = ('roi', self.engine.version, energy_cost_per_kwh, digest)
+        roi = self.cache.get_or_compute(key, lambda: self._compute_roi(digest, energy_cost_per_kwh),
+                                        tags=('rules', 'prices'))
+        return dict(roi)
+    
+    def _compute_roi(self, digest: str, energy_cost_per_kwh: float) -> Dict:
+        recommendations = self._recommendations_for(digest)
+        savings = [rec.get('estimated_savings', {}) for rec in recommendations]
+        rows = np.zeros(len(savings), dtype=np.int64)
         
-        # Estimate cost savings based on energy reduction
-        # Assuming $0.15 per kWh average electricity cost
-        energy_cost_per_kwh = 0.15
+        # Each recommendation saves a share of what the others leave
+        monthly_carbon = self._monthly_carbon_kg()
+        if monthly_carbon:
+            carbon_factors = np.array([s.get('carbon_kg_per_month', 0) / monthly_carbon for s in savings])
+            total_carbon_savings = float(monthly_carbon * compound(rows, carbon_factors, 1)[0])
+        else:
+            total_carbon_savings = sum(s.get('carbon_kg_per_month', 0) for s in savings)
         
         if 'energy_data' in self.assessment_data:
             monthly_energy_kwh = self.assessment_data['energy_data'].get('monthly_energy_kwh', 0)
             
-            # Calculate total percentage energy reduction from all recommendations
-            total_energy_percent_reduction = min(
-                sum(rec.get('estimated_savings', {}).get('energy_percent', 0) / 100 
-                    for rec in self.recommendations),
-                0.9  # Cap at 90% to be realistic
-            )
+            energy_fractions = np.array([s.get('energy_percent', 0) / 100 for s in savings])
+            total_energy_percent_reduction = min(float(compound(rows, energy_fractions, 1)[0]),
+                                                 MAX_ENERGY_REDUCTION)
             
             energy_savings_kwh = monthly_energy_kwh * total_energy_percent_reduction
             cost_savings_monthly = energy_savings_kwh * energy_cost_per_kwh
@@ -241,4 +254,3 @@ class RecommendationSystem:
             'monthly_carbon_savings_kg': total_carbon_savings,
             'yearly_carbon_savings_kg': total_carbon_savings * 12
         }
-
@@ -0,0 +1,633 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.energy import CarbonIntensityTable, DeviceInventory, get_intensity_table, sample_hours
+from app.core.inference import PRECISIONS, bytes_per_weight, get_inference_table, savings
+from app.core.metrics import MetricFrame, to_timedelta
+from app.services.cache import content_hash
+from app.services.instrumentation import timed
+
+# Jobs per block when evaluating candidate start times, bounding the
+# (jobs, candidate starts) cost matrix
+JOB_BLOCK = 8192
+
+
+class JobTrace:
+    """Batch jobs as parallel arrays.
+
+    Times are in hours from the start of the intensity curve they are
+    scheduled against (hour 0 is midnight UTC for hour-of-day curves).
+    """
+
+    def __init__(self, arrival, duration, power_kw, deadline=None):
+        """Initialize the trace.
+
+        Args:
+            arrival: Hour each job becomes runnable
+            duration: Run time of each job in hours
+            power_kw: Average power draw of each job while running
+            deadline: Hour each job must finish by; defaults to no flexibility
+        """
+        self.arrival = np.asarray(arrival, dtype=np.float64)
+        self.duration = np.asarray(duration, dtype=np.float64)
+        self.power_kw = np.asarray(power_kw, dtype=np.float64)
+        if deadline is None:
+            deadline = self.arrival + self.duration
+        self.deadline = np.asarray(deadline, dtype=np.float64)
+        if not (len(self.arrival) == len(self.duration) == len(self.power_kw) == len(self.deadline)):
+            raise ValueError('arrival, duration, power_kw and deadline must have the same length')
+        if (self.duration <= 0).any():
+            raise ValueError('durations must be positive')
+
+    def __len__(self) -> int:
+        return len(self.arrival)
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'JobTrace':
+        """Build a trace from dicts with arrival, duration, power_kw and
+        optional deadline keys."""
+        return cls(
+            [r['arrival'] for r in records],
+            [r['duration'] for r in records],
+            [r['power_kw'] for r in records],
+            [r.get('deadline', r['arrival'] + r['duration']) for r in records],
+        )
+
+    @classmethod
+    def from_utilization(cls, frame: MetricFrame, average_power_kw: float,
+                         deferrable_fraction: float = 0.5, flexibility_hours: float = 12,
+                         metric: str = 'gpu_utilization', origin=None) -> 'JobTrace':
+        """Model the deferrable share of a deployment's load as hourly jobs.
+
+        Each hour of ``frame`` becomes a one-hour job whose power follows that
+        hour's utilization relative to the mean, scaled so the trace averages
+        ``deferrable_fraction`` of ``average_power_kw``. Arrivals count from
+        ``origin``, the time hour 0 of the intensity curve stands for (see
+        ``CarbonIntensityTable.origin``), by default midnight UTC of the
+        frame's first day.
+        """
+        hourly = frame.resample('1h')
+        utilization = np.nan_to_num(np.nanmean(hourly.values(metric), axis=0))
+        mean = utilization.mean() if len(utilization) else 0.0
+        weights = utilization / mean if mean > 0 else np.ones_like(utilization)
+        if origin is None and len(hourly):
+            origin = hourly.timestamps[0].astype('datetime64[D]')
+        arrival = ((hourly.timestamps - origin) / np.timedelta64(1, 'h')) if len(hourly) else []
+        power = average_power_kw * deferrable_fraction * weights
+        return cls(arrival, np.ones(len(hourly)), power, np.asarray(arrival) + 1 + flexibility_hours)
+
+
+@dataclass
+class ScheduleResult:
+    """Outcome of scheduling a trace against an intensity curve."""
+    start: np.ndarray
+    energy_kwh: float
+    baseline_carbon_kg: float
+    scheduled_carbon_kg: float
+    delayed_jobs: int
+    late_jobs: int
+    mean_delay_hours: float
+
+    @property
+    def savings_kg(self) -> float:
+        return self.baseline_carbon_kg - self.scheduled_carbon_kg
+
+    @property
+    def savings_fraction(self) -> float:
+        if self.baseline_carbon_kg <= 0:
+            return 0.0
+        return self.savings_kg / self.baseline_carbon_kg
+
+    def to_dict(self) -> Dict:
+        return {
+            'jobs': len(self.start),
+            'energy_kwh': self.energy_kwh,
+            'baseline_carbon_kg': self.baseline_carbon_kg,
+            'scheduled_carbon_kg': self.scheduled_carbon_kg,
+            'savings_kg': self.savings_kg,
+            'savings_fraction': self.savings_fraction,
+            'delayed_jobs': self.delayed_jobs,
+            'late_jobs': self.late_jobs,
+            'mean_delay_hours': self.mean_delay_hours,
+        }
+
+
+class CarbonAwareScheduler:
+    """Time-shifts batch jobs towards low-carbon hours.
+
+    Jobs start on hour boundaries. A job that arrives mid-hour can start at
+    the top of its arrival hour at the earliest, and must start no later than
+    its deadline minus its duration. Without a capacity limit every job
+    independently takes its cheapest start, evaluated for all jobs at once.
+    With a limit, jobs are placed greedily, least slack first, into the
+    cheapest start whose hours all have power to spare.
+    """
+
+    def __init__(self, intensity: np.ndarray, capacity_kw: Optional[float] = None):
+        """Initialize the scheduler.
+
+        Args:
+            intensity: Hourly carbon intensity (gCO2/kWh) from hour 0; it is
+                repeated as needed, so a 24-hour curve stands for every day
+            capacity_kw: Maximum total power of concurrently running jobs
+        """
+        self.intensity = np.asarray(intensity, dtype=np.float64)
+        if self.intensity.ndim != 1 or not len(self.intensity):
+            raise ValueError('intensity must be a non-empty hourly curve')
+        self.capacity_kw = capacity_kw
+
+    def _curve(self, hours: int):
+        """Return the intensity over ``hours`` hours and its prefix sums."""
+        repeats = -(-hours // len(self.intensity))
+        curve = np.tile(self.intensity, repeats)[:hours]
+        return curve, np.concatenate(([0.0], np.cumsum(curve)))
+
+    @staticmethod
+    def _window_carbon(starts, full_hours, fraction, power_kw, curve, cumulative):
+        """Carbon (kg) of jobs running from hour ``starts``: full hours plus
+        the fractional last hour."""
+        end = starts + full_hours
+        grams = cumulative[end] - cumulative[starts] + fraction * curve[end]
+        return power_kw * grams / 1000
+
+    def schedule(self, trace: JobTrace) -> ScheduleResult:
+        """Schedule ``trace`` and compare it to running every job on arrival."""
+        if not len(trace):
+            return ScheduleResult(np.empty(0), 0.0, 0.0, 0.0, 0, 0, 0.0)
+        earliest = np.floor(trace.arrival).astype(np.int64)
+        latest = np.maximum(earliest, np.floor(trace.deadline - trace.duration).astype(np.int64))
+        full_hours = np.floor(trace.duration).astype(np.int64)
+        fraction = trace.duration - full_hours
+        slots = np.ceil(trace.duration).astype(np.int64)
+
+        horizon = int((latest + slots).max()) + 1
+        if self.capacity_kw is not None:
+            # Room for jobs pushed past their deadline by the capacity limit
+            horizon += int(slots.sum())
+        curve, cumulative = self._curve(horizon + 1)
+
+        baseline = self._window_carbon(earliest, full_hours, fraction, trace.power_kw, curve, cumulative)
+        if self.capacity_kw is None:
+            starts = self._cheapest_starts(earliest, latest, full_hours, fraction,
+                                           trace.power_kw, curve, cumulative)
+            late = 0
+        else:
+            starts, late = self._capacity_starts(trace, earliest, latest, full_hours, fraction,
+                                                 slots, curve, cumulative)
+        scheduled = self._window_carbon(starts, full_hours, fraction, trace.power_kw, curve, cumulative)
+
+        delay = starts - earliest
+        return ScheduleResult(
+            start=starts.astype(np.float64),
+            energy_kwh=float((trace.power_kw * trace.duration).sum()),
+            baseline_carbon_kg=float(baseline.sum()),
+            scheduled_carbon_kg=float(scheduled.sum()),
+            delayed_jobs=int((delay > 0).sum()),
+            late_jobs=late,
+            mean_delay_hours=float(delay.mean()),
+        )
+
+    def _candidate_costs(self, lo, hi, earliest, latest, full_hours, fraction, power_kw,
+                         curve, cumulative):
+        """Cost matrix of jobs ``lo:hi`` over their candidate start offsets,
+        with offsets past each job's latest start set to infinity."""
+        span = int((latest[lo:hi] - earliest[lo:hi]).max()) + 1
+        offsets = np.arange(span)
+        starts = earliest[lo:hi, np.newaxis] + offsets
+        # The block's span is its largest slack; jobs with less are costed at
+        # their latest start past it, so the curve only has to reach that
+        past_latest = starts > latest[lo:hi, np.newaxis]
+        starts = np.minimum(starts, latest[lo:hi, np.newaxis])
+        costs = self._window_carbon(starts, full_hours[lo:hi, np.newaxis], fraction[lo:hi, np.newaxis],
+                                    power_kw[lo:hi, np.newaxis], curve, cumulative)
+        costs[past_latest] = np.inf
+        return costs
+
+    def _cheapest_starts(self, earliest, latest, full_hours, fraction, power_kw, curve, cumulative):
+        starts = np.empty_like(earliest)
+        for lo in range(0, len(earliest), JOB_BLOCK):
+            hi = min(lo + JOB_BLOCK, len(earliest))
+            costs = self._candidate_costs(lo, hi, earliest, latest, full_hours, fraction,
+                                          power_kw, curve, cumulative)
+            starts[lo:hi] = earliest[lo:hi] + np.argmin(costs, axis=1)
+        return starts
+
+    def _capacity_starts(self, trace, earliest, latest, full_hours, fraction, slots, curve, cumulative):
+        if (trace.power_kw > self.capacity_kw).any():
+            raise ValueError('A job draws more power than the capacity limit')
+        usage = np.zeros(len(curve))
+        starts = np.empty_like(earliest)
+        late = 0
+        order = np.lexsort((earliest, latest))
+        capacity = self.capacity_kw
+        for lo in range(0, len(order), JOB_BLOCK):
+            block = order[lo:lo + JOB_BLOCK]
+            costs = self._candidate_costs(0, len(block), earliest[block], latest[block],
+                                          full_hours[block], fraction[block], trace.power_kw[block],
+                                          curve, cumulative)
+            for row, job in enumerate(block):
+                limit = capacity - trace.power_kw[job]
+                n = slots[job]
+                first, last = earliest[job], latest[job]
+                fits = self._free_starts(usage, first, last + n, n, limit)
+                if fits.any():
+                    start = first + int(np.argmin(np.where(fits, costs[row, :len(fits)], np.inf)))
+                else:
+                    # No room before the deadline: take the first hours with
+                    # room, or run on arrival if there are none
+                    start = self._first_fit(usage, last + 1, n, limit)
+                    if start is None:
+                        start = first
+                    else:
+                        late += 1
+                usage[start:start + n] += trace.power_kw[job]
+                starts[job] = start
+        return starts, late
+
+    @staticmethod
+    def _free_starts(usage, start, stop, n, limit):
+        """Flag each hour in ``start:stop - n + 1`` that begins ``n``
+        consecutive hours with usage at or below ``limit``."""
+        blocked = np.concatenate(([0], np.cumsum(usage[start:stop] > limit)))
+        return blocked[n:] == blocked[:-n]
+
+    @classmethod
+    def _first_fit(cls, usage, start, n, limit):
+        """Return the first hour from ``start`` that begins ``n`` consecutive
+        hours with usage at or below ``limit``, searching in growing windows,
+        or None if there is no such hour."""
+        window = 64
+        while True:
+            stop = min(len(usage), start + window + n)
+            free = np.flatnonzero(cls._free_starts(usage, start, stop, n, limit))
+            if len(free):
+                return start + int(free[0])
+            if stop == len(usage):
+                return None
+            window *= 4
+
+
+def simulate_carbon_shift(intensity: np.ndarray, trace: JobTrace,
+                          capacity_kw: Optional[float] = None) -> ScheduleResult:
+    """Schedule ``trace`` against an hourly intensity curve."""
+    return CarbonAwareScheduler(intensity, capacity_kw).schedule(trace)
+
+
+# Inference throughput of each SKU relative to the generic device, used to
+# convert work between SKUs when a deployment is downsized
+SKU_THROUGHPUT = {
+    'generic': 1.0, 'v100': 1.0, 'a100': 2.5, 'h100': 5.0,
+    'a10g': 0.8, 't4': 0.4, 'l4': 0.7, 'inferentia2': 1.2,
+}
+
+ACTIONS = ('quantize', 'downsize', 'move_region', 'shift_schedule')
+
+# Bounds on simulated inputs; each device is a row of the series and each
+# hour of flexibility a column of the scheduler's cost matrix
+MAX_DEVICES = 1024
+MAX_FLEXIBILITY_HOURS = 7 * 24
+MAX_PUE = 3.0
+
+
+def bounded_number(options: Dict, name: str, default, lo: float, hi: float, kind=float):
+    """``options[name]``, or ``default`` when it is missing, as a finite
+    ``kind`` between ``lo`` and ``hi``.
+
+    Raises:
+        ValueError: naming the field, for strings, booleans, fractional
+            integers and values out of range
+    """
+    value = options.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) \
+            or (kind is int and value != int(value)):
+        raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+    if not lo <= value <= hi:
+        raise ValueError(f'{name} must be between {lo} and {hi}')
+    return kind(value)
+
+
+class DependencyGraph:
+    """Intermediate results computed from named inputs and each other.
+
+    A node's cache key is derived from the keys of the nodes and inputs it
+    depends on, and an input's key is the content hash of its value. So
+    changing one input recomputes only the nodes downstream of it, and
+    returning to earlier input values finds their results still cached.
+    """
+
+    def __init__(self, cache_size: int = 64):
+        self._nodes: Dict[str, tuple] = {}
+        self._cache: 'OrderedDict[str, object]' = OrderedDict()
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+
+    def node(self, name: str, depends: Sequence[str], compute: Callable):
+        """Add node ``name`` computed as ``compute(*values of depends)``."""
+        self._nodes[name] = (tuple(depends), compute)
+
+    def _key(self, name: str, keys: Dict[str, str]) -> str:
+        if name not in keys:
+            if name not in self._nodes:
+                raise KeyError(f'No input or node named {name}')
+            depends = self._nodes[name][0]
+            keys[name] = content_hash((name, [self._key(dep, keys) for dep in depends]))
+        return keys[name]
+
+    def evaluate(self, name: str, inputs: Dict[str, object], keys: Dict[str, str] = None):
+        """Return the value of node ``name`` for ``inputs``.
+
+        Args:
+            name: Node to evaluate
+            inputs: Value of every input the node depends on
+            keys: Precomputed content hashes of some inputs, e.g. of a large
+                series that does not change between evaluations
+
+        Returns:
+            The value, and the names of the nodes that had to be computed
+        """
+        keys = dict(keys or {})
+        for input_name, value in inputs.items():
+            if input_name not in keys:
+                keys[input_name] = content_hash(value)
+        computed: List[str] = []
+        with self._lock:
+            value = self._get(name, inputs, keys, computed)
+        return value, computed
+
+    def _get(self, name, inputs, keys, computed):
+        if name in inputs:
+            return inputs[name]
+        key = self._key(name, keys)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        depends, compute = self._nodes[name]
+        value = compute(*[self._get(dep, inputs, keys, computed) for dep in depends])
+        computed.append(name)
+        self._cache[key] = value
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return value
+
+
+def _model_shares(models: Dict) -> Dict[str, float]:
+    """Share of the GPU work each model accounts for: its ``share`` when
+    given, otherwise in proportion to parameter count."""
+    if not models:
+        return {}
+    if all('share' in spec for spec in models.values()):
+        return {name: float(spec['share']) for name, spec in models.items()}
+    parameters = {name: float(spec.get('parameters') or 0) for name, spec in models.items()}
+    total = sum(parameters.values())
+    if total <= 0:
+        return {name: 1 / len(models) for name in models}
+    return {name: value / total for name, value in parameters.items()}
+
+
+class WhatIfSimulator:
+    """Energy and carbon of a deployment with recommendations applied.
+
+    The pipeline runs from utilization to power, energy and carbon as a
+    DependencyGraph, so each change recomputes only its own stage and those
+    after it: moving region reuses the power series, changing the schedule
+    reuses both power and intensity. Because every action acts on a
+    different stage of one pipeline, their effects compound: quantizing
+    shrinks the work that downsizing then consolidates, and the schedule is
+    shifted against the intensity curve of the new region.
+
+    Actions, with the recommendations they implement:
+
+    - ``{'type': 'quantize', 'model': name, 'precision': 'int8'}`` (model-02):
+      the model's share of the work shrinks by its estimated energy saving
+      per request at ``precision`` on the deployment's SKU, from
+      app.core.inference
+    - ``{'type': 'downsize', 'gpus': n, 'sku': 't4'}`` (hw-01, hw-02): the work
+      is consolidated onto ``n`` devices of ``sku`` (default: the current
+      SKU), converted by SKU_THROUGHPUT; work beyond full utilization is
+      queued into later samples, which are reported as saturated, and a
+      fleet that cannot finish the work within the window is rejected
+    - ``{'type': 'move_region', 'region': name}`` (loc-01): the energy is
+      weighted by the new region's intensity; without a region, the lowest
+      average intensity region in the table is used
+    - ``{'type': 'shift_schedule', 'deferrable_fraction': 0.5,
+      'flexibility_hours': 12, 'capacity_kw': None}`` (sched-01): that share of
+      each hour's energy is time-shifted with CarbonAwareScheduler
+    """
+
+    def __init__(self, frame: MetricFrame, region: Optional[str], models: Dict = None,
+                 inventory: DeviceInventory = None, intensity: CarbonIntensityTable = None,
+                 pue: float = 1.0, metric: str = 'gpu_utilization', cache_size: int = 64):
+        """Initialize the simulator.
+
+        Args:
+            frame: Utilization series of the deployment as assessed
+            region: Region the deployment runs in
+            models: Model specs as collected by AssessmentEngine, optionally
+                with the ``share`` of the work each model accounts for
+            inventory: SKU of each device, defaulting to the generic curve
+            intensity: Hourly carbon intensity table, defaulting to the bundled one
+            pue: Data center power usage effectiveness applied to device power
+            metric: Utilization metric of ``frame`` to simulate
+            cache_size: Intermediate results kept across simulations
+        """
+        if metric not in frame or not len(frame):
+            raise ValueError(f'No {metric} samples to simulate')
+        self.frame = frame
+        self.region = region
+        self.models = dict(models or {})
+        self.inventory = inventory or DeviceInventory()
+        self.intensity = intensity or get_intensity_table()
+        self.pue = pue
+        self.metric = metric
+
+        timestamps = frame.timestamps
+        self._step_hours = sample_hours(frame).astype(np.float64)
+        # Hours from the time the intensity curve's hour 0 stands for
+        origin = self.intensity.origin(timestamps[0])
+        self._hour = ((timestamps - origin) // np.timedelta64(1, 'h')).astype(np.int64)
+
+        utilization = frame.values(metric)
+        device_means = np.nan_to_num(np.nanmean(utilization, axis=1), nan=0.0)[:, np.newaxis]
+        self._utilization = np.where(np.isnan(utilization), device_means, np.clip(utilization, 0, 1))
+        self._devices = frame.devices(metric)
+        # The series never changes for this simulator, so it is hashed once
+        self._keys = {'series': content_hash(self._utilization)}
+
+        self.graph = DependencyGraph(cache_size)
+        self.graph.node('load_factor', ('models', 'quantize'), self._load_factor)
+        self.graph.node('utilization', ('series', 'load_factor'), lambda series, factor: series * factor)
+        self.graph.node('fleet', ('utilization', 'downsize'), self._fleet)
+        self.graph.node('power', ('fleet', 'pue'), self._power)
+        self.graph.node('energy', ('power',), lambda watts: watts * self._step_hours / 1000)
+        self.graph.node('intensity', ('region',), lambda region: self.intensity.lookup(region, self.frame.timestamps))
+        self.graph.node('carbon', ('energy', 'intensity'), lambda kwh, grams: float(np.dot(kwh, grams) / 1000))
+        self.graph.node('shift', ('energy', 'region', 'schedule'), self._shift)
+        self.graph.node('summary', ('fleet', 'power', 'energy', 'carbon', 'shift', 'region'), self._summary)
+
+    def _load_factor(self, models: Dict, quantize: Dict) -> float:
+        if not quantize:
+            return 1.0
+        shares = _model_shares(models)
+        quantized = {name: models[name] for name in quantize}
+        table = get_inference_table()
+        sku = self.inventory.default_sku
+        fractions = savings(table.models(quantized, sku),
+                            table.models(quantized, sku, precisions=list(quantize.values())))
+        saved = sum(shares[name] * fraction for name, fraction in zip(quantized, fractions))
+        return max(0.0, 1 - float(saved))
+
+    def _fleet(self, utilization: np.ndarray, downsize: Optional[Dict]) -> Dict:
+        if not downsize:
+            return {'utilization': utilization, 'skus': [self.inventory.sku(d) for d in self._devices],
+                    'saturated_samples': 0, 'peak_backlog_device_hours': 0.0}
+        current = np.array([SKU_THROUGHPUT[self.inventory.sku(d)] for d in self._devices])[:, np.newaxis]
+        sku = downsize.get('sku') or self.inventory.default_sku
+        gpus = int(downsize['gpus'])
+        # Work in generic-device units, spread evenly over the new devices
+        demand = (utilization * current).sum(axis=0) / (SKU_THROUGHPUT[sku] * gpus)
+        # Work a sample cannot serve waits for the next: the queue after each
+        # sample is the running excess of work over capacity, less its lowest
+        # point so far (Lindley's recursion), in hours of full utilization
+        excess = np.cumsum((demand - 1) * self._step_hours)
+        backlog = excess - np.minimum(np.minimum.accumulate(excess), 0)
+        # Ignore float32 rounding of a fleet sized exactly to the load
+        backlog[backlog < 1e-6 * self._step_hours.sum()] = 0
+        if backlog[-1] > 0:
+            raise ValueError(f'{gpus} {sku} device(s) cannot serve the load: '
+                             f'{backlog[-1] * gpus:.1f} device-hours of work would be left unserved')
+        served = demand + (np.concatenate(([0.0], backlog[:-1])) - backlog) / self._step_hours
+        return {
+            'utilization': np.broadcast_to(np.clip(served, 0, 1), (gpus, len(served))),
+            'skus': [sku] * gpus,
+            'saturated_samples': int((backlog > 0).sum()),
+            'peak_backlog_device_hours': float(backlog.max() * gpus),
+        }
+
+    def _power(self, fleet: Dict, pue: float) -> np.ndarray:
+        curves = [self.inventory.curves[sku] for sku in fleet['skus']]
+        idle = np.array([c.idle_watts for c in curves])[:, np.newaxis]
+        span = np.array([c.max_watts - c.idle_watts for c in curves])[:, np.newaxis]
+        exponent = np.array([c.exponent for c in curves])[:, np.newaxis]
+        return (idle + span * fleet['utilization'] ** exponent).sum(axis=0) * pue
+
+    def _shift(self, energy: np.ndarray, region: Optional[str], schedule: Optional[Dict]) -> Optional[Dict]:
+        if not schedule:
+            return None
+        fraction = float(schedule.get('deferrable_fraction', 0.5))
+        flexibility = float(schedule.get('flexibility_hours', 12))
+        hourly_kwh = np.bincount(self._hour, weights=energy)
+        arrival = np.flatnonzero(hourly_kwh > 0).astype(np.float64)
+        # One-hour jobs, so each job's power in kW equals its hour's kWh
+        trace = JobTrace(arrival, np.ones(len(arrival)), hourly_kwh[arrival.astype(np.int64)] * fraction,
+                         arrival + 1 + flexibility)
+        result = simulate_carbon_shift(self.intensity.curve(region), trace, schedule.get('capacity_kw'))
+        return dict(result.to_dict(), deferrable_fraction=fraction, flexibility_hours=flexibility)
+
+    def _summary(self, fleet, watts, energy, carbon, shift, region) -> Dict:
+        hours = float(self._step_hours.sum())
+        energy_kwh = float(energy.sum())
+        carbon_kg = carbon - (shift['savings_kg'] if shift else 0.0)
+        return {
+            'region': region,
+            'devices': len(fleet['skus']),
+            'skus': sorted(set(fleet['skus'])),
+            'saturated_samples': fleet['saturated_samples'],
+            'peak_backlog_device_hours': fleet['peak_backlog_device_hours'],
+            'duration_hours': hours,
+            'total_power_watts': energy_kwh * 1000 / hours,
+            'peak_power_watts': float(watts.max()),
+            'total_energy_kwh': energy_kwh,
+            'total_carbon_kg': carbon_kg,
+            'carbon_intensity_g_per_kwh': carbon_kg * 1000 / energy_kwh if energy_kwh else 0.0,
+            'monthly_energy_kwh': energy_kwh / hours * 24 * 30,
+            'monthly_carbon_kg': carbon_kg / hours * 24 * 30,
+            'shift': shift,
+        }
+
+    def _inputs(self, actions: Sequence[Dict]) -> Dict:
+        inputs = {'series': self._utilization, 'models': self.models, 'quantize': {}, 'downsize': None,
+                  'region': self.region, 'schedule': None, 'pue': self.pue}
+        for action in actions:
+            kind = action.get('type')
+            if kind == 'quantize':
+                model, precision = action.get('model'), action.get('precision', 'fp16')
+                if model not in self.models:
+                    raise ValueError(f'Unknown model: {model}')
+                if precision not in PRECISIONS:
+                    raise ValueError(f'Unknown precision: {precision}')
+                current = self.models[model].get('precision') or 'fp32'
+                if bytes_per_weight(current) < bytes_per_weight(precision):
+                    raise ValueError(f'{model} is already {current}, smaller than {precision}')
+                inputs['quantize'] = dict(inputs['quantize'], **{model: precision})
+            elif kind == 'downsize':
+                gpus = bounded_number(action, 'gpus', len(self._devices), 1, MAX_DEVICES, int)
+                sku = action.get('sku')
+                if sku is not None and (sku not in SKU_THROUGHPUT or sku not in self.inventory.curves):
+                    raise ValueError(f'Unknown SKU: {sku}')
+                inputs['downsize'] = {'gpus': gpus, 'sku': sku}
+            elif kind == 'move_region':
+                region = action.get('region') or self.cleanest_region()
+                if region not in self.intensity:
+                    raise ValueError(f'No carbon intensity for region: {region}')
+                inputs['region'] = region
+            elif kind == 'shift_schedule':
+                capacity = action.get('capacity_kw')
+                inputs['schedule'] = {
+                    'deferrable_fraction': bounded_number(action, 'deferrable_fraction', 0.5, 0, 1),
+                    'flexibility_hours': bounded_number(action, 'flexibility_hours', 12, 0, MAX_FLEXIBILITY_HOURS),
+                    'capacity_kw': None if capacity is None else bounded_number(action, 'capacity_kw', None, 0, 10 ** 9),
+                }
+            else:
+                raise ValueError(f'Unknown action {kind!r}; use one of {", ".join(ACTIONS)}')
+        return inputs
+
+    def cleanest_region(self) -> str:
+        means = self.intensity.values.mean(axis=1)
+        return self.intensity.regions[int(np.argmin(means))]
+
+    def run(self, actions: Sequence[Dict] = ()) -> Dict:
+        """Energy and carbon with ``actions`` applied.
+
+        Returns:
+            Totals as EnergyModel.estimate reports them, plus the devices,
+            region and schedule they assume
+        """
+        summary, _ = self.graph.evaluate('summary', self._inputs(actions), self._keys)
+        return summary
+
+    @timed('simulation.simulate')
+    def simulate(self, actions: Sequence[Dict]) -> Dict:
+        """Compare the deployment with and without ``actions`` applied.
+
+        Returns:
+            ``baseline`` and ``scenario`` totals, the ``savings`` between
+            them, and the pipeline stages this call had to ``recompute``
+        """
+        baseline, computed = self.graph.evaluate('summary', self._inputs(()), self._keys)
+        scenario, scenario_computed = self.graph.evaluate('summary', self._inputs(actions), self._keys)
+        savings = {}
+        for name in ('total_energy_kwh', 'total_carbon_kg', 'monthly_energy_kwh', 'monthly_carbon_kg'):
+            savings[name] = baseline[name] - scenario[name]
+        savings['energy_fraction'] = (savings['total_energy_kwh'] / baseline['total_energy_kwh']
+                                      if baseline['total_energy_kwh'] else 0.0)
+        savings['carbon_fraction'] = (savings['total_carbon_kg'] / baseline['total_carbon_kg']
+                                      if baseline['total_carbon_kg'] else 0.0)
+        return {'baseline': baseline, 'scenario': scenario, 'savings': savings,
+                'recomputed': computed + scenario_computed}
+
+
+def flat_series(utilization: float, end: np.datetime64, days: int = 7, interval: str = '1h',
+                num_gpus: int = 4, metric: str = 'gpu_utilization') -> MetricFrame:
+    """A constant utilization series for deployments known only by their
+    mean utilization, such as stored assessments without telemetry."""
+    step = to_timedelta(interval)
+    end = np.datetime64(end, 's')
+    timestamps = np.arange(end - np.timedelta64(days, 'D'), end, step)
+    frame = MetricFrame(timestamps)
+    frame.add(metric, np.full((num_gpus, len(timestamps)), utilization, dtype=np.float32),
+              [f'gpu{i}' for i in range(num_gpus)])
+    return frame
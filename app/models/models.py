@@ -9,12 +9,99 @@ class Assessment(db.Model):
     cpu_util = db.Column(db.Float)
     gpu_util = db.Column(db.Float)
     emissions = db.Column(db.Float)
-    recommendations = db.relationship('Recommendation', backref='assessment', lazy='dynamic')
+    # Set on insert and on every ORM or Core update; lets derived tables
+    # pick up edited rows without rescanning the table
+    updated_at = db.Column(db.DateTime, index=True, default=db.func.now(), onupdate=db.func.now())
+    recommendations = db.relationship('Recommendation', backref='assessment', lazy='select',
+                                      order_by='Recommendation.id')
+    
+    # Keyset pagination walks (timestamp, id) newest first, optionally
+    # within one provider, region or instance type
+    __table_args__ = (
+        db.Index('ix_assessment_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_assessment_provider_timestamp_id', 'cloud_provider', 'timestamp', 'id'),
+        db.Index('ix_assessment_region_timestamp_id', 'region', 'timestamp', 'id'),
+        db.Index('ix_assessment_instance_type_timestamp_id', 'instance_type', 'timestamp', 'id'),
+    )
 
 class Recommendation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'))
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), index=True)
     text = db.Column(db.String(256))
     impact = db.Column(db.Float)
     effort = db.Column(db.String(64))
-    implemented = db.Column(db.Boolean, default=False)
\ No newline at end of file
+    implemented = db.Column(db.Boolean, default=False)
+
+class AssessmentROI(db.Model):
+    """Savings from applying the current rules to one stored assessment.
+    
+    Rows are recomputed when the assessment's content hash, the rule set
+    version or the energy price they were computed with changes.
+    """
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), primary_key=True)
+    content_hash = db.Column(db.String(32))
+    rules_version = db.Column(db.String(16))
+    energy_price = db.Column(db.Float)
+    recommendations = db.Column(db.Integer)
+    carbon_savings_kg = db.Column(db.Float)
+    energy_savings_kwh = db.Column(db.Float)
+    cost_savings_usd = db.Column(db.Float)
+    computed_at = db.Column(db.DateTime, default=db.func.now())
+
+class FleetReportState(db.Model):
+    """How far FleetReport has brought AssessmentROI up to date: assessments
+    up to ``last_assessment_id`` and edits up to ``updated_through``, for one
+    rule set version and energy price. A single row."""
+    id = db.Column(db.Integer, primary_key=True)
+    rules_version = db.Column(db.String(16))
+    energy_price = db.Column(db.Float)
+    last_assessment_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_through = db.Column(db.DateTime)
+    refreshed_at = db.Column(db.DateTime)
+
+class EmissionsRollupMixin:
+    """Assessment totals per time bucket, provider, region and instance type.
+    
+    Sums and counts rather than averages are stored so buckets can be
+    combined and updated incrementally.
+    """
+    bucket = db.Column(db.DateTime, primary_key=True)
+    cloud_provider = db.Column(db.String(64), primary_key=True)
+    region = db.Column(db.String(64), primary_key=True)
+    instance_type = db.Column(db.String(128), primary_key=True)
+    assessments = db.Column(db.Integer, nullable=False, default=0)
+    emissions = db.Column(db.Float, nullable=False, default=0)
+    cpu_util_sum = db.Column(db.Float, nullable=False, default=0)
+    cpu_util_count = db.Column(db.Integer, nullable=False, default=0)
+    gpu_util_sum = db.Column(db.Float, nullable=False, default=0)
+    gpu_util_count = db.Column(db.Integer, nullable=False, default=0)
+
+class HourlyEmissions(EmissionsRollupMixin, db.Model):
+    __tablename__ = 'emissions_hourly'
+
+class DailyEmissions(EmissionsRollupMixin, db.Model):
+    __tablename__ = 'emissions_daily'
+
+def create_missing_columns(engine):
+    """Add nullable columns added to existing tables since they were
+    created; ``create_all`` only creates whole tables."""
+    inspector = db.inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            with engine.begin() as connection:
+                connection.execute(db.text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} '
+                    f'{column.type.compile(engine.dialect)}'
+                ))
+
+def create_missing_indexes(engine):
+    """Create indexes added to existing tables since they were created;
+    ``create_all`` only creates indexes along with new tables."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
\ No newline at end of file
@@ -1,44 +1,308 @@
-from flask import Blueprint, jsonify, request
+import json
+import math
+import os
+import time
+import numpy as np
+from flask import Blueprint, Response, current_app, jsonify, request
+from app import db, jobs
+from app.core.energy import DeviceInventory
+from app.core.metrics import to_timedelta
+from app.core.simulation import MAX_DEVICES, MAX_PUE, WhatIfSimulator, bounded_number, flat_series
 from app.models.models import Assessment, Recommendation
-from app.services.analyzer import WorkloadAnalyzer
+from app.services.cache import content_hash, get_results_cache
+from app.services.history import AssessmentHistory, serialize_assessment
+from app.services.ingest import BulkIngestor, iter_json_array, iter_ndjson
+from app.services.jobs import QueueFull
 from app.services.recommender import RecommendationEngine
+from app.services.reports import FleetReport
+from app.services.telemetry import TelemetryError, decode_msgpack, decode_packed, get_telemetry_store
 
 bp = Blueprint('api', __name__)
 
-@bp.route('/analyze', methods=['POST'])
-def analyze_workload():
-    data = request.json
+ANALYZE_FIELDS = ('cloud_provider', 'instance_type', 'region')
+
+@jobs.handler('analyze')
+def run_analysis(data):
+    # Imported here so loading the blueprint does not pull in the profiler
+    from app.services.analyzer import WorkloadAnalyzer
     analyzer = WorkloadAnalyzer(data.get('cloud_provider', 'aws'))
-    results = analyzer.analyze_workload()
+    started = time.time()
+    if data.get('pid'):
+        # Checked again here, as the job may run in another worker process
+        if not _may_profile(data['pid']):
+            raise ValueError(f"pid {data['pid']} is not this server process or one of its children")
+        results = analyzer.profile_pid(data['pid'], data['duration'], data['interval'])
+    else:
+        results = analyzer.analyze_workload(data['duration'])
+    
+    # GPU utilization comes from telemetry the source reported meanwhile
+    if data.get('telemetry_source'):
+        frame = get_telemetry_store().frame(data['telemetry_source'], np.datetime64(int(started * 1000), 'ms'),
+                                            np.datetime64(int(time.time() * 1000) + 1, 'ms'), interval='1s',
+                                            metrics=['gpu_utilization'])
+        if frame is not None:
+            results['gpu_util'] = frame.mean('gpu_utilization')
+            results['gpu_util_p95'] = frame.percentile('gpu_utilization', 95)
     
     assessment = Assessment(
         cloud_provider=data['cloud_provider'],
         instance_type=data['instance_type'],
         region=data['region'],
         cpu_util=results['cpu_util'],
-        gpu_util=0,  # Placeholder for GPU monitoring
+        gpu_util=results.get('gpu_util'),
         emissions=results['emissions']
     )
     
-    db.session.add(assessment)
-    db.session.commit()
-    
     recommender = RecommendationEngine()
     recommendations = recommender.generate(results)
     
-    for rec in recommendations:
-        recommendation = Recommendation(
-            assessment_id=assessment.id,
+    db.session.add(assessment)
+    db.session.add_all([
+        Recommendation(
+            assessment=assessment,
             text=rec['text'],
             impact=rec['impact'],
             effort=rec['effort']
         )
-        db.session.add(recommendation)
-    
+        for rec in recommendations
+    ])
     db.session.commit()
     
-    return jsonify({
+    return {
         'assessment_id': assessment.id,
         'emissions': results['emissions'],
         'recommendations': recommendations
-    })
\ No newline at end of file
+    }
+
+def _may_profile(pid):
+    from app.services.profiler import is_descendant
+    return current_app.config['PROFILE_ANY_PID'] or is_descendant(pid, os.getpid())
+
+@bp.route('/analyze', methods=['POST'])
+def analyze_workload():
+    data = request.get_json(silent=True) or {}
+    missing = [field for field in ANALYZE_FIELDS if not data.get(field)]
+    if missing:
+        return jsonify({'error': f'Missing fields: {", ".join(missing)}'}), 400
+    
+    payload = {field: data[field] for field in ANALYZE_FIELDS}
+    try:
+        payload['duration'] = bounded_number(data, 'duration', current_app.config['ANALYZE_DURATION'],
+                                             0, current_app.config['ANALYZE_MAX_DURATION'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('pid') is not None:
+        try:
+            payload['pid'] = int(data['pid'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'pid must be an integer'}), 400
+        try:
+            payload['interval'] = bounded_number(data, 'interval', 0.5, current_app.config['PROFILE_MIN_INTERVAL'],
+                                                 current_app.config['PROFILE_MAX_INTERVAL'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not _may_profile(payload['pid']):
+            return jsonify({'error': 'pid must be this server process or one of its children'}), 403
+    if data.get('telemetry_source'):
+        payload['telemetry_source'] = str(data['telemetry_source'])
+    
+    try:
+        job = jobs.submit('analyze', payload)
+    except QueueFull as exc:
+        response = jsonify({'error': str(exc)})
+        response.headers['Retry-After'] = str(max(1, math.ceil(payload['duration'])))
+        return response, 429
+    
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = f'{request.script_root}/api/jobs/{job.id}'
+    return response, 202
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/jobs/<job_id>/wait', methods=['GET'])
+def wait_for_job(job_id):
+    timeout = min(request.args.get('timeout', 30, type=float), 120)
+    job = jobs.wait(job_id, timeout=timeout)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def stream(job):
+        yield f'event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n'
+        while not job.done:
+            status = job.status
+            job = jobs.wait(job_id, timeout=15, since_status=status)
+            if job is None:
+                return
+            if job.status == status:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n'
+    
+    return Response(stream(job), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@bp.route('/assessments', methods=['GET'])
+def list_assessments():
+    limit = request.args.get('limit', current_app.config['HISTORY_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['HISTORY_MAX_PAGE_SIZE']))
+    try:
+        history = AssessmentHistory.from_args(request.args)
+        page = history.page(limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'items': [serialize_assessment(assessment) for assessment in page['items']],
+        'next_cursor': page['next_cursor'],
+    })
+
+@bp.route('/assessments/rollup', methods=['GET'])
+def rollup_assessments():
+    group_by = [name for name in request.args.get('group_by', 'day').split(',') if name]
+    source = request.args.get('source', 'auto')
+    if source not in ('auto', 'rollup', 'raw'):
+        return jsonify({'error': 'source must be auto, rollup or raw'}), 400
+    try:
+        history = AssessmentHistory.from_args(request.args)
+        rows = history.rollup(group_by, current_app.config['HISTORY_ROLLUP_DAYS'], source)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'group_by': group_by, 'rows': rows})
+
+@bp.route('/assessments/bulk', methods=['POST'])
+def bulk_ingest_assessments():
+    chunk_size = request.args.get('chunk_size', current_app.config['BULK_CHUNK_SIZE'], type=int)
+    chunk_size = max(1, min(chunk_size, current_app.config['BULK_MAX_CHUNK_SIZE']))
+    
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/ndjson'):
+        records = iter_ndjson(request.stream)
+    else:
+        records = iter_json_array(request.stream)
+    
+    ingestor = BulkIngestor(chunk_size, current_app.config['BULK_MAX_ERRORS'])
+    summary = ingestor.ingest(records)
+    # A cut-off body is a client error even if the records before it were stored
+    status = 200 if summary['complete'] and (summary['accepted'] or not summary['rejected']) else 400
+    return jsonify(summary), status
+
+@bp.route('/reports/fleet', methods=['GET'])
+def fleet_report():
+    # Reads serve the last refresh; `flask reports refresh` keeps it current
+    refresh = request.args.get('refresh', '0') == '1'
+    return jsonify(FleetReport().generate(refresh=refresh))
+
+def _read_body(limit):
+    """Read the request body, or return None once it exceeds ``limit`` bytes."""
+    chunks = []
+    size = 0
+    while size <= limit:
+        chunk = request.stream.read(min(limit + 1 - size, 1 << 20))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks) if size <= limit else None
+
+@bp.route('/telemetry', methods=['POST'])
+def ingest_telemetry():
+    limit = current_app.config['TELEMETRY_MAX_BATCH_BYTES']
+    if (request.content_length or 0) > limit:
+        return jsonify({'error': 'Telemetry batch too large'}), 413
+    # Chunked uploads carry no Content-Length, so the limit is enforced on
+    # the bytes actually read as well
+    body = _read_body(limit)
+    if body is None:
+        return jsonify({'error': 'Telemetry batch too large'}), 413
+    try:
+        if request.mimetype in ('application/msgpack', 'application/x-msgpack'):
+            batches = decode_msgpack(body)
+        elif request.mimetype == 'application/octet-stream':
+            devices = [device for device in request.args.get('devices', '').split(',') if device]
+            batches = decode_packed(body, request.args.get('source'), request.args.get('metric'), devices)
+        else:
+            return jsonify({'error': 'Send application/msgpack or application/octet-stream'}), 415
+        store = get_telemetry_store()
+        for batch in batches:
+            store.append(batch)
+    except TelemetryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'batches': len(batches),
+        'samples': sum(len(batch.timestamps) * len(batch.devices) for batch in batches),
+    })
+
+def _simulator_for(assessment, data):
+    """What-if simulator for a stored assessment, kept in the results cache
+    so repeated simulations reuse its intermediate results."""
+    config = current_app.config
+    options = {
+        'telemetry_source': data.get('telemetry_source'),
+        'days': bounded_number(data, 'days', 7, 1, config['SIMULATION_MAX_DAYS'], int),
+        'interval': str(data.get('interval', '1h')),
+        'num_gpus': bounded_number(data, 'num_gpus', 4, 1, MAX_DEVICES, int),
+        'skus': data.get('skus') or {},
+        'default_sku': data.get('default_sku', 'generic'),
+        'models': data.get('models') or {},
+        'pue': bounded_number(data, 'pue', 1.0, 1, MAX_PUE),
+    }
+    step = to_timedelta(options['interval']) / np.timedelta64(1, 's')
+    if not 60 <= step <= 86400:
+        raise ValueError('interval must be between 1min and 1D')
+    if options['days'] * 86400 // step * options['num_gpus'] > config['SIMULATION_MAX_SAMPLES']:
+        raise ValueError(f"days / interval * num_gpus must be at most {config['SIMULATION_MAX_SAMPLES']} samples")
+    if not isinstance(options['models'], dict) or not isinstance(options['skus'], dict) \
+            or not all(isinstance(spec, dict) for spec in options['models'].values()):
+        raise ValueError('models and skus must be objects')
+    row = (assessment.timestamp, assessment.region, assessment.gpu_util)
+    key = ('simulator', assessment.id, content_hash([str(value) for value in row]), content_hash(options))
+    
+    def build():
+        end = np.datetime64(assessment.timestamp, 's')
+        frame, series = None, 'stored_mean'
+        if options['telemetry_source']:
+            frame = get_telemetry_store().frame(options['telemetry_source'], end - np.timedelta64(options['days'], 'D'),
+                                                end + np.timedelta64(1, 's'), options['interval'],
+                                                metrics=['gpu_utilization'])
+            series = 'telemetry'
+        if frame is None:
+            # Stored assessments keep only mean utilization
+            if assessment.gpu_util is None:
+                raise ValueError('Assessment has no GPU utilization to simulate from')
+            frame = flat_series(assessment.gpu_util, end, options['days'], options['interval'], options['num_gpus'])
+            series = 'stored_mean'
+        simulator = WhatIfSimulator(frame, assessment.region, options['models'],
+                                    DeviceInventory(options['skus'], options['default_sku']),
+                                    pue=options['pue'], cache_size=config['SIMULATION_GRAPH_CACHE_SIZE'])
+        return simulator, series
+    
+    return get_results_cache().get_or_compute(key, build, tags=('simulation',))
+
+@bp.route('/simulate', methods=['POST'])
+def simulate():
+    data = request.get_json(silent=True) or {}
+    assessment_id = data.get('assessment_id')
+    if not isinstance(assessment_id, int):
+        return jsonify({'error': 'assessment_id must be an integer'}), 400
+    actions = data.get('actions', [])
+    if not isinstance(actions, list) or not all(isinstance(action, dict) for action in actions):
+        return jsonify({'error': 'actions must be a list of objects'}), 400
+    assessment = db.session.get(Assessment, assessment_id)
+    if assessment is None:
+        return jsonify({'error': 'Assessment not found'}), 404
+    try:
+        simulator, series = _simulator_for(assessment, data)
+        result = simulator.simulate(actions)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(result, assessment_id=assessment.id, series=series, actions=actions))
@@ -1,5 +1,5 @@
-from flask import Blueprint, render_template
-from app.models.models import Assessment
+from flask import Blueprint, abort, current_app, render_template, request
+from app.services.history import AssessmentHistory
 
 bp = Blueprint('main', __name__)
 
@@ -9,5 +9,22 @@ def index():
 
 @bp.route('/dashboard')
 def dashboard():
-    assessments = Assessment.query.order_by(Assessment.timestamp.desc()).limit(5).all()
-    return render_template('dashboard.html', assessments=assessments)
\ No newline at end of file
+    try:
+        history = AssessmentHistory.from_args(request.args)
+        page = history.page(20, request.args.get('cursor'))
+        daily = history.rollup(['day'], current_app.config['HISTORY_ROLLUP_DAYS'])
+    except ValueError:
+        abort(400)
+    assessments = page['items']
+    # Recommendations were loaded with the page, so this issues no queries
+    recommendations = sorted((rec for assessment in assessments for rec in assessment.recommendations
+                              if not rec.implemented),
+                             key=lambda rec: -(rec.impact or 0))[:10]
+    filters = {name: value for name, value in request.args.items() if name != 'cursor' and value}
+    return render_template('dashboard.html',
+                           assessments=assessments,
+                           recommendations=recommendations,
+                           next_cursor=page['next_cursor'],
+                           filters=filters,
+                           timestamps=[row['day'] for row in daily],
+                           emissions_data=[row['emissions'] for row in daily])
\ No newline at end of file
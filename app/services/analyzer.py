@@ -1,15 +1,21 @@
-from codecarbon import EmissionsTracker
+import os
+import threading
 import time
+import numpy as np
+from app.services.instrumentation import timed
+from app.services.profiler import ProcessSampler, summarize_samples
+from app.services.tracking import get_tracker_manager
 
 class WorkloadAnalyzer:
-    def __init__(self, cloud_provider='aws'):
-        self.tracker = EmissionsTracker(
-            log_level='error',
-            cloud_provider=cloud_provider
-        )
+    def __init__(self, cloud_provider='aws', carbon_intensity=None, tracker_manager=None):
+        self.cloud_provider = cloud_provider
+        self.tracker_manager = tracker_manager or get_tracker_manager()
+        # gCO2/kWh, used to convert measured energy when profiling a target
+        self.carbon_intensity = carbon_intensity or self.tracker_manager.carbon_intensity
         
+    @timed('analyzer.analyze_workload')
     def analyze_workload(self, duration=60):
-        self.tracker.start()
+        session = self.tracker_manager.start('analyze_workload')
         
         # Simulate workload
         start_time = time.time()
@@ -17,10 +23,75 @@ class WorkloadAnalyzer:
             # Simulate processing
             _ = [x*x for x in range(1000000)]
             
-        emissions = self.tracker.stop()
+        measurement = session.stop()
         return {
             'duration': duration,
-            'emissions': emissions,
-            'energy_consumed': self.tracker._total_energy.kWh,
-            'cpu_util': self.tracker._cpu_power.usage
+            'emissions': measurement.emissions_kg,
+            'energy_consumed': measurement.energy_kwh,
+            'cpu_util': measurement.cpu_util
+        }
+    
+    @timed('analyzer.profile_callable')
+    def profile_callable(self, fn, inputs, batch_size=None, interval=0.1):
+        """Measure a real workload by calling ``fn`` over ``inputs``.
+        
+        With ``batch_size`` set, ``fn`` receives slices of ``inputs`` instead
+        of single items. Energy is sampled from the calling thread while the
+        calls run, so work on other threads of the process is not billed to
+        ``fn``, then reported per call and per item along with latency
+        percentiles and throughput.
+        """
+        items = list(inputs)
+        if batch_size:
+            calls = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        else:
+            calls = items
+        latencies = np.empty(len(calls))
+        
+        sampler = ProcessSampler(os.getpid(), interval=interval, tid=threading.get_native_id())
+        sampler.start()
+        try:
+            for i, arg in enumerate(calls):
+                start = time.perf_counter()
+                fn(arg)
+                latencies[i] = time.perf_counter() - start
+        finally:
+            samples = sampler.stop()
+        
+        results = summarize_samples(samples, sampler.rapl_available, self.carbon_intensity)
+        energy_j = results['energy_kwh'] * 3.6e6
+        results.update({
+            'mode': 'callable',
+            'calls': len(calls),
+            'items': len(items),
+            'energy_j_per_call': energy_j / len(calls) if calls else 0.0,
+            'energy_j_per_item': energy_j / len(items) if items else 0.0,
+            'throughput_items_per_s': len(items) / float(latencies.sum()) if latencies.sum() > 0 else 0.0,
+            'latency_ms': self._latency_percentiles(latencies),
+        })
+        return results
+    
+    @timed('analyzer.profile_pid')
+    def profile_pid(self, pid, duration=60, interval=0.5):
+        """Measure an already running process by sampling /proc for ``duration`` seconds."""
+        sampler = ProcessSampler(pid, interval=interval)
+        sampler.start()
+        sampler.join(duration)
+        samples = sampler.stop()
+        
+        results = summarize_samples(samples, sampler.rapl_available, self.carbon_intensity)
+        results.update({'mode': 'pid', 'pid': pid})
+        return results
+    
+    @staticmethod
+    def _latency_percentiles(latencies):
+        if not len(latencies):
+            return {}
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+        return {
+            'mean': float(latencies.mean() * 1000),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(latencies.max() * 1000),
         }
\ No newline at end of file
@@ -0,0 +1,208 @@
+import fcntl
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.metrics import Frequency, MetricFrame, TimeLike
+
+SECONDS_PER_DAY = 86400
+
+DTYPE = np.dtype('<f4')
+
+
+def _to_ms(value: Optional[TimeLike]) -> Optional[int]:
+    return None if value is None else int(np.datetime64(value, 'ms').astype(np.int64))
+
+
+class MetricArchive:
+    """Day-partitioned, memory-mapped archive of metric series.
+
+    Each day of a (source, metric) pair is a directory holding one
+    fixed-width float32 file per device, with one slot every
+    ``resolution`` seconds from midnight UTC and NaN for slots without
+    data. A timestamp maps straight to a file offset, so range queries
+    open the overlapping days with ``np.memmap`` and touch only the pages
+    they read; nothing is loaded whole.
+    """
+
+    def __init__(self, root: str, resolution: int = 10):
+        """Initialize the archive.
+
+        Args:
+            root: Directory holding one subdirectory per source
+            resolution: Seconds per slot; must divide a day. An existing
+                archive keeps the resolution it was created with.
+        """
+        if SECONDS_PER_DAY % resolution:
+            raise ValueError('resolution must divide 86400 seconds')
+        self.root = root
+        self.resolution = resolution
+        settings = os.path.join(root, 'archive.json')
+        if os.path.exists(settings):
+            with open(settings) as f:
+                self.resolution = json.load(f)['resolution']
+
+    @property
+    def slots(self) -> int:
+        return SECONDS_PER_DAY // self.resolution
+
+    def _ensure_root(self):
+        settings = os.path.join(self.root, 'archive.json')
+        if not os.path.exists(settings):
+            os.makedirs(self.root, exist_ok=True)
+            with open(settings, 'w') as f:
+                json.dump({'resolution': self.resolution}, f)
+
+    def _metric_directory(self, source: str, metric: str) -> str:
+        return os.path.join(self.root, source, metric)
+
+    def metrics(self, source: str) -> List[str]:
+        directory = os.path.join(self.root, source)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.listdir(directory))
+
+    def days(self, source: str, metric: str, start: int = None, end: int = None) -> List[np.datetime64]:
+        """Archived days overlapping ``[start, end)`` epoch milliseconds."""
+        directory = self._metric_directory(source, metric)
+        if not os.path.isdir(directory):
+            return []
+        first = None if start is None else np.datetime64(start, 'ms').astype('datetime64[D]')
+        last = None if end is None else np.datetime64(end - 1, 'ms').astype('datetime64[D]')
+        found = []
+        for name in os.listdir(directory):
+            try:
+                day = np.datetime64(name, 'D')
+            except ValueError:
+                continue
+            if (first is None or day >= first) and (last is None or day <= last):
+                found.append(day)
+        return sorted(found)
+
+    def devices(self, source: str, metric: str, day: np.datetime64) -> List[str]:
+        directory = os.path.join(self._metric_directory(source, metric), str(day))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(directory) if name.endswith('.f4'))
+
+    def open(self, source: str, metric: str, day: np.datetime64, device: str, mode: str = 'r') -> np.memmap:
+        path = os.path.join(self._metric_directory(source, metric), str(day), f'{device}.f4')
+        return np.memmap(path, dtype=DTYPE, mode=mode, shape=(self.slots,))
+
+    def write(self, source: str, metric: str, timestamps: np.ndarray, values: np.ndarray,
+              devices: Sequence[str]) -> int:
+        """Store samples into their slots.
+
+        Samples of one write that fall into the same slot are averaged; a
+        later write to a slot replaces it.
+
+        Args:
+            timestamps: Epoch milliseconds
+            values: Array of shape (devices, samples)
+            devices: Device labels
+
+        Returns:
+            Number of slots written across all devices
+        """
+        self._ensure_root()
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        seconds = timestamps // 1000
+        day_index = seconds // SECONDS_PER_DAY
+        slot_index = (seconds % SECONDS_PER_DAY) // self.resolution
+        written = 0
+        for day in np.unique(day_index):
+            in_day = day_index == day
+            slots, inverse = np.unique(slot_index[in_day], return_inverse=True)
+            directory = os.path.join(self._metric_directory(source, metric),
+                                     str(np.datetime64(int(day), 'D')))
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, '.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                for row, device in enumerate(devices):
+                    samples = values[row, in_day]
+                    observed = np.isfinite(samples)
+                    if not observed.any():
+                        continue
+                    sums = np.bincount(inverse, weights=np.where(observed, samples, 0), minlength=len(slots))
+                    counts = np.bincount(inverse, weights=observed, minlength=len(slots))
+                    keep = counts > 0
+                    path = os.path.join(directory, f'{device}.f4')
+                    if not os.path.exists(path):
+                        np.full(self.slots, np.nan, dtype=DTYPE).tofile(path)
+                    column = np.memmap(path, dtype=DTYPE, mode='r+', shape=(self.slots,))
+                    column[slots[keep]] = sums[keep] / counts[keep]
+                    column.flush()
+                    del column
+                    written += int(keep.sum())
+        return written
+
+    def _day_slices(self, source: str, metric: str, start: int = None,
+                    end: int = None) -> Iterator[Tuple[np.datetime64, int, int, List[str]]]:
+        """Yield (day, first slot, end slot, devices) covering ``[start, end)``."""
+        step_ms = self.resolution * 1000
+        for day in self.days(source, metric, start, end):
+            day_ms = int(day.astype('datetime64[ms]').astype(np.int64))
+            lo = 0 if start is None else max(0, -(-(start - day_ms) // step_ms))
+            hi = self.slots if end is None else min(self.slots, -(-(end - day_ms) // step_ms))
+            devices = self.devices(source, metric, day)
+            if lo < hi and devices:
+                yield day, lo, hi, devices
+
+    def summary(self, source: str, metric: str, start: TimeLike = None,
+                end: TimeLike = None) -> Dict[str, Dict[str, float]]:
+        """Per-device mean, max and sample count over ``[start, end)``, read
+        one day at a time straight from the mapped files."""
+        totals: Dict[str, List[float]] = {}
+        for day, lo, hi, devices in self._day_slices(source, metric, _to_ms(start), _to_ms(end)):
+            for device in devices:
+                window = self.open(source, metric, day, device)[lo:hi]
+                observed = np.isfinite(window)
+                count = int(observed.sum())
+                if not count:
+                    continue
+                total = totals.setdefault(device, [0.0, -np.inf, 0])
+                total[0] += float(np.sum(window, where=observed, dtype=np.float64))
+                total[1] = max(total[1], float(np.max(window, where=observed, initial=-np.inf)))
+                total[2] += count
+        return {
+            device: {'mean': total[0] / total[2], 'max': total[1], 'samples': total[2]}
+            for device, total in sorted(totals.items())
+        }
+
+    def frame(self, source: str, metric: str, start: TimeLike = None, end: TimeLike = None,
+              interval: Frequency = None) -> Optional[MetricFrame]:
+        """Read ``[start, end)`` into a MetricFrame, averaged into ``interval``
+        bins one day at a time so only the binned result is held in memory.
+        Bins without any data are dropped.
+
+        Returns:
+            The frame, or None if nothing is archived in the window
+        """
+        step = np.timedelta64(self.resolution, 's')
+        parts = []
+        all_devices: List[str] = []
+        for day, lo, hi, devices in self._day_slices(source, metric, _to_ms(start), _to_ms(end)):
+            timestamps = day.astype('datetime64[s]') + np.arange(lo, hi) * step
+            values = np.stack([self.open(source, metric, day, device)[lo:hi] for device in devices])
+            day_frame = MetricFrame(timestamps, {metric: values}, {metric: devices})
+            if interval is not None:
+                day_frame = day_frame.resample(interval)
+            values = day_frame.values(metric)
+            present = np.isfinite(values).any(axis=0)
+            if present.any():
+                parts.append((day_frame.timestamps[present], values[:, present], devices))
+                all_devices.extend(device for device in devices if device not in all_devices)
+        if not parts:
+            return None
+
+        timestamps = np.concatenate([part[0] for part in parts])
+        values = np.full((len(all_devices), len(timestamps)), np.nan, dtype=np.float32)
+        offset = 0
+        for part_timestamps, part_values, devices in parts:
+            rows = [all_devices.index(device) for device in devices]
+            values[rows, offset:offset + len(part_timestamps)] = part_values
+            offset += len(part_timestamps)
+        return MetricFrame(timestamps, {metric: values}, {metric: all_devices})
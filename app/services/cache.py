@@ -0,0 +1,166 @@
+import hashlib
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+import numpy as np
+
+_MISSING = object()
+
+
+def _feed(h, value):
+    """Feed a canonical byte encoding of ``value`` into hash ``h``."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        h.update(type(value).__name__.encode())
+        h.update(repr(value).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(b'ndarray')
+        h.update(str(value.dtype).encode())
+        h.update(struct.pack(f'{value.ndim}q', *value.shape))
+        if value.dtype.hasobject:
+            for item in value.ravel():
+                _feed(h, item)
+        else:
+            h.update(np.ascontiguousarray(value).view(np.uint8).data)
+    elif isinstance(value, np.generic):
+        _feed(h, value.item())
+    elif isinstance(value, dict):
+        h.update(b'dict%d' % len(value))
+        for key in sorted(value, key=repr):
+            _feed(h, key)
+            _feed(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b'seq%d' % len(value))
+        for item in value:
+            _feed(h, item)
+    elif hasattr(value, '__dict__'):
+        # Plain data holders such as MetricFrame and JobTrace hash by state
+        h.update(type(value).__qualname__.encode())
+        _feed(h, vars(value))
+    else:
+        raise TypeError(f'Cannot hash {type(value).__name__} values')
+
+
+def content_hash(value: Any) -> str:
+    """Stable digest of nested dicts, sequences, scalars and numpy arrays.
+
+    Equal content gives equal digests across processes, so the digest can key
+    caches and be stored alongside derived results to detect changed inputs.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    _feed(h, value)
+    return h.hexdigest()
+
+
+class ResultsCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Entries can carry tags, e.g. 'rules' or 'prices', naming the inputs they
+    were derived from, so changing one input drops only the entries that
+    depend on it. ``tag_limits`` caps the entries kept per tag, for values
+    far larger than the rest such as whole simulators.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid, or None to never expire
+            clock: Monotonic time source
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.tag_limits: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires, _ = entry
+                if expires is None or expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()):
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            for tag in tags:
+                limit = self.tag_limits.get(tag)
+                if limit is None:
+                    continue
+                tagged = [name for name, (_, _, entry_tags) in self._entries.items() if tag in entry_tags]
+                for name in tagged[:max(0, len(tagged) - limit)]:
+                    del self._entries[name]
+                    self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """Return the cached value for ``key``, computing and storing it on a
+        miss. Concurrent misses may compute the value more than once."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value, tags)
+        return value
+
+    def invalidate(self, tag: str = None) -> int:
+        """Drop every entry carrying ``tag``, or every entry if no tag is given.
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            if tag is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            stale = [key for key, (_, _, tags) in self._entries.items() if tag in tags]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._entries), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_results_cache() -> ResultsCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultsCache()
+        return _cache
+
+
+def init_results_cache(app) -> ResultsCache:
+    cache = get_results_cache()
+    cache.maxsize = app.config.get('RESULTS_CACHE_SIZE', 1024)
+    cache.ttl = app.config.get('RESULTS_CACHE_TTL', 3600)
+    cache.tag_limits['simulation'] = app.config.get('SIMULATION_CACHE_SIZE', 16)
+    app.extensions['results_cache'] = cache
+    return cache
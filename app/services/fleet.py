@@ -0,0 +1,452 @@
+import functools
+import json
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.core.assessment import AssessmentEngine
+from app.core.energy import DeviceInventory
+from app.core.providers import PROVIDERS, StubProvider
+from app.services.ingest import BulkIngestor, iter_json_array, iter_ndjson
+from app.services.jobs import FAILED, FINISHED
+from app.services.recommender import RecommendationEngine
+
+
+@dataclass
+class Deployment:
+    """One deployment of a fleet run, as listed in the deployments file."""
+    name: str
+    cloud_provider: str
+    region: str
+    instance_type: str = None
+    telemetry_source: str = None
+    days: int = 7
+    interval: str = '1h'
+    num_gpus: int = 4
+    skus: Dict[str, str] = field(default_factory=dict)
+    default_sku: str = 'generic'
+
+    @classmethod
+    def from_dict(cls, record: Any) -> 'Deployment':
+        """Build from a deployments file entry; raises ValueError if invalid."""
+        if not isinstance(record, dict):
+            raise ValueError('Deployment must be a JSON object')
+        unknown = set(record) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f'Unknown deployment fields: {", ".join(sorted(unknown))}')
+        for name in ('name', 'cloud_provider', 'region'):
+            if not isinstance(record.get(name), str) or not record[name]:
+                raise ValueError(f'{name} is required and must be a string')
+        if record['cloud_provider'] not in PROVIDERS:
+            raise ValueError(f'cloud_provider must be one of {", ".join(PROVIDERS)}')
+        deployment = cls(**record)
+        for name in ('days', 'num_gpus'):
+            value = getattr(deployment, name)
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                raise ValueError(f'{name} must be a positive integer')
+        return deployment
+
+
+@dataclass
+class TaskResult:
+    """Outcome of one deployment after its last attempt."""
+    index: int
+    deployment: Deployment
+    status: str
+    attempts: int
+    seconds: float
+    result: Dict = None
+    error: str = None
+    assessment_id: int = None
+
+    def to_dict(self) -> Dict:
+        return dict(asdict(self), deployment=self.deployment.name)
+
+
+def load_deployments(path: str) -> List[Deployment]:
+    """Read deployments from a JSON array or NDJSON file.
+
+    Raises:
+        ValueError: naming the first invalid entry
+    """
+    with open(path, 'rb') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        records = iter_json_array(f) if first == b'[' else iter_ndjson(f)
+        deployments = []
+        for index, record in records:
+            if isinstance(record, Exception):
+                raise ValueError(f'Deployment {index}: invalid JSON: {record}')
+            try:
+                deployments.append(Deployment.from_dict(record))
+            except ValueError as exc:
+                raise ValueError(f'Deployment {index}: {exc}')
+    names = [deployment.name for deployment in deployments]
+    if len(set(names)) != len(names):
+        raise ValueError('Deployment names must be unique')
+    return deployments
+
+
+def assess_deployment(deployment: Deployment, credentials: Dict = None,
+                      stub: Dict = None, collector: Dict = None) -> Dict:
+    """Run a full assessment of one deployment and summarize it.
+
+    This is the task fleet workers run, so it takes and returns only
+    picklable values.
+
+    Args:
+        deployment: Deployment to assess
+        credentials: API keys by cloud provider
+        stub: StubProvider options to use instead of the cloud SDKs
+        collector: CollectorProvider options, with the API root of each
+            provider under 'endpoints', to collect through instead
+
+    Returns:
+        Utilization, energy and emissions totals with recommendations
+    """
+    provider = None
+    if stub is not None:
+        provider = StubProvider(deployment.cloud_provider, **stub)
+    elif collector is not None:
+        # asyncio and the HTTP client are only needed for --collect runs
+        from app.core.collectors import CollectorProvider
+        options = dict(collector)
+        endpoint = options.pop('endpoints').get(deployment.cloud_provider)
+        if not endpoint:
+            raise ValueError(f'No collector endpoint configured for {deployment.cloud_provider}')
+        provider = CollectorProvider(deployment.cloud_provider, endpoint, **options)
+    engine = AssessmentEngine(
+        deployment.cloud_provider, (credentials or {}).get(deployment.cloud_provider),
+        region=deployment.region,
+        inventory=DeviceInventory(deployment.skus, deployment.default_sku),
+        telemetry_source=deployment.telemetry_source,
+        provider=provider, deployment=deployment.name,
+    )
+    try:
+        data = engine.run_full_assessment(deployment.days, deployment.interval, deployment.num_gpus)
+    finally:
+        if collector is not None and provider is not None:
+            provider.close()
+    metrics, energy = data['hardware_metrics'], data['energy_data']
+    results = {
+        'cpu_util': metrics.mean('cpu_utilization') if 'cpu_utilization' in metrics else None,
+        'gpu_util': metrics.mean('gpu_utilization'),
+        'gpu_util_p95': metrics.percentile('gpu_utilization', 95),
+        'emissions': energy['total_carbon_kg'],
+        'duration': energy['duration_hours'] * 3600,
+    }
+    return dict(results, models=data['models'], energy=energy,
+                recommendations=RecommendationEngine().generate(results))
+
+
+def store_result(task: TaskResult) -> Optional[int]:
+    """Write a finished deployment's assessment and recommendations in its
+    own transaction, returning the new assessment id."""
+    if task.status != FINISHED:
+        return None
+    result = task.result
+    row = {
+        'timestamp': datetime.now(timezone.utc).replace(tzinfo=None),
+        'cloud_provider': task.deployment.cloud_provider,
+        'instance_type': task.deployment.instance_type,
+        'region': task.deployment.region,
+        'cpu_util': result['cpu_util'],
+        'gpu_util': result['gpu_util'],
+        'emissions': result['emissions'],
+    }
+    recommendations = [
+        {'text': rec['text'][:256], 'impact': rec['impact'], 'effort': rec['effort'], 'implemented': False}
+        for rec in result['recommendations']
+    ]
+    try:
+        [assessment_id] = BulkIngestor.write_rows([row], [recommendations])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return assessment_id
+
+
+def _work(conn, task: Callable):
+    """Worker process loop: run each task received on ``conn`` and send
+    back ``(ok, result or error)`` until told to stop."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Forked workers share the parent's random state, which simulated
+    # metrics would otherwise repeat across deployments
+    np.random.seed()
+    while True:
+        try:
+            item = conn.recv()
+        except EOFError:
+            return
+        if item is None:
+            return
+        try:
+            conn.send((True, task(item)))
+        except Exception as exc:
+            conn.send((False, f'{type(exc).__name__}: {exc}'))
+
+
+class _Worker:
+    def __init__(self, context, task: Callable):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_work, args=(child, task), daemon=True)
+        self.process.start()
+        child.close()
+        self.index = None
+        self.attempt = 0
+        self.started = 0.0
+        self.deadline = None
+
+    @property
+    def busy(self) -> bool:
+        return self.index is not None
+
+    def submit(self, index: int, attempt: int, item: Any, timeout: Optional[float]):
+        self.index, self.attempt, self.started = index, attempt, time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.conn.send(item)
+
+    def release(self):
+        self.index = self.deadline = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self, timeout: float = 5.0):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class FleetRunner:
+    """Assesses many deployments in parallel across worker processes.
+
+    Each deployment runs in a worker process with a deadline. A worker
+    that overruns it is killed and replaced, and failed or timed-out
+    deployments are retried with exponential backoff. Results are handed
+    to ``on_result`` in the parent process as each deployment completes,
+    so they can be stored while the rest of the fleet is still running.
+    """
+
+    def __init__(self, workers: int = None, timeout: float = 600.0, retries: int = 2,
+                 retry_delay: float = 1.0, task: Callable = assess_deployment,
+                 mp_context=None):
+        """Initialize the runner.
+
+        Args:
+            workers: Worker processes, defaulting to the number of CPUs
+            timeout: Seconds a single attempt may take, or None for no limit
+            retries: Further attempts after a failure or timeout
+            retry_delay: Seconds before the first retry, doubling after each
+            task: Picklable callable run on each deployment in a worker
+            mp_context: multiprocessing context, defaulting to the platform's
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.task = task
+        self.context = mp_context or multiprocessing.get_context()
+
+    def run(self, deployments: Iterable[Deployment],
+            on_result: Callable[[TaskResult], Any] = None,
+            on_progress: Callable[[int, int, TaskResult], Any] = None) -> Dict:
+        """Assess every deployment.
+
+        Args:
+            deployments: Deployments to assess
+            on_result: Called with each TaskResult as it completes; its
+                return value is kept as the result's ``assessment_id``
+            on_progress: Called with (completed, total, result) after each
+
+        Returns:
+            Counts of finished and failed deployments, wall time and the
+            failed deployments' errors
+        """
+        deployments = list(deployments)
+        total = len(deployments)
+        summary = {'total': total, 'finished': 0, 'failed': 0, 'retried': 0,
+                   'workers': min(self.workers, total), 'errors': []}
+        started = time.monotonic()
+        pending = deque((index, 1, 0.0) for index in range(total))
+        first_started = {}
+        workers: List[_Worker] = []
+        completed = 0
+
+        def finish(index, attempt, status, result=None, error=None):
+            nonlocal completed
+            outcome = TaskResult(index, deployments[index], status, attempt,
+                                 time.monotonic() - first_started[index], result, error)
+            if on_result is not None:
+                try:
+                    outcome.assessment_id = on_result(outcome)
+                except Exception as exc:
+                    outcome.status = FAILED
+                    outcome.error = f'Storing result failed: {type(exc).__name__}: {exc}'
+            completed += 1
+            summary[outcome.status] += 1
+            if outcome.status == FAILED:
+                summary['errors'].append({'deployment': outcome.deployment.name,
+                                          'attempts': attempt, 'error': outcome.error})
+            if on_progress is not None:
+                on_progress(completed, total, outcome)
+
+        def fail(index, attempt, error):
+            if attempt <= self.retries:
+                summary['retried'] += 1
+                pending.append((index, attempt + 1,
+                                time.monotonic() + self.retry_delay * 2 ** (attempt - 1)))
+            else:
+                finish(index, attempt, FAILED, error=error)
+
+        try:
+            while completed < total:
+                now = time.monotonic()
+                # Hand out tasks whose backoff has elapsed to idle workers
+                for _ in range(len(pending)):
+                    index, attempt, not_before = pending.popleft()
+                    worker = next((w for w in workers if not w.busy), None)
+                    if worker is None and len(workers) < self.workers:
+                        worker = _Worker(self.context, self.task)
+                        workers.append(worker)
+                    if worker is None or not_before > now:
+                        pending.append((index, attempt, not_before))
+                        continue
+                    first_started.setdefault(index, now)
+                    worker.submit(index, attempt, deployments[index], self.timeout)
+
+                busy = [w for w in workers if w.busy]
+                wakeups = [w.deadline for w in busy if w.deadline is not None]
+                wakeups += [not_before for _, _, not_before in pending if not_before > now]
+                timeout = max(0.0, min(wakeups) - now) if wakeups else None
+                ready = wait([w.conn for w in busy], timeout) if busy else []
+                if not busy and timeout:
+                    time.sleep(timeout)
+
+                now = time.monotonic()
+                for worker in busy:
+                    index, attempt = worker.index, worker.attempt
+                    if worker.conn in ready:
+                        try:
+                            ok, payload = worker.conn.recv()
+                        except (EOFError, OSError):
+                            ok, payload = None, f'Worker exited with code {worker.process.exitcode}'
+                        if ok is not None:
+                            worker.release()
+                            if ok:
+                                finish(index, attempt, FINISHED, result=payload)
+                            else:
+                                fail(index, attempt, payload)
+                            continue
+                        error = payload
+                    elif worker.deadline is not None and now >= worker.deadline:
+                        error = f'Timed out after {self.timeout:g}s'
+                    else:
+                        continue
+                    # Replace a worker that died or overran its deadline
+                    worker.kill()
+                    workers[workers.index(worker)] = _Worker(self.context, self.task)
+                    fail(index, attempt, error)
+        finally:
+            for worker in workers:
+                if worker.busy:
+                    worker.kill()
+                else:
+                    worker.stop()
+
+        summary['seconds'] = time.monotonic() - started
+        return summary
+
+
+fleet_cli = AppGroup('fleet', help='Assess fleets of deployments.')
+
+
+@fleet_cli.command('run')
+@click.argument('deployments_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--workers', type=int, help='Worker processes (default: FLEET_WORKERS).')
+@click.option('--timeout', type=float, help='Seconds per attempt (default: FLEET_TASK_TIMEOUT).')
+@click.option('--retries', type=int, help='Retries after a failure (default: FLEET_RETRIES).')
+@click.option('--stub', is_flag=True, help='Use local stub providers instead of the cloud SDKs.')
+@click.option('--stub-latency', type=float, default=0.0, help='Seconds each stub call takes.')
+@click.option('--stub-failure-rate', type=float, default=0.0, help='Fraction of stub calls that fail.')
+@click.option('--collect', is_flag=True, help='Collect through the COLLECTOR_ENDPOINTS APIs.')
+@click.option('--dry-run', is_flag=True, help='Assess without storing the results.')
+def run_command(deployments_file, workers, timeout, retries, stub, stub_latency, stub_failure_rate,
+                collect, dry_run):
+    """Assess every deployment in DEPLOYMENTS_FILE (JSON array or NDJSON)."""
+    if stub and collect:
+        raise click.UsageError('--stub and --collect are mutually exclusive')
+    try:
+        deployments = load_deployments(deployments_file)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    config = current_app.config
+    collector = None
+    if collect:
+        from app.core.collectors import RetryPolicy
+        endpoints = config.get('COLLECTOR_ENDPOINTS') or {}
+        missing = sorted({d.cloud_provider for d in deployments} - {p for p, url in endpoints.items() if url})
+        if missing:
+            raise click.ClickException(f'No collector endpoint configured for {", ".join(missing)}')
+        collector = {
+            'endpoints': endpoints,
+            'connections': config.get('COLLECTOR_CONNECTIONS', 8),
+            'rate_limit': config.get('COLLECTOR_RATE_LIMIT', 20.0),
+            'retry': RetryPolicy(retries=config.get('COLLECTOR_RETRIES', 4)),
+            'timeout': config.get('COLLECTOR_TIMEOUT', 30.0),
+            'max_response_bytes': config.get('COLLECTOR_MAX_RESPONSE_BYTES', 64 * 1024 * 1024),
+            'cache_path': config.get('COLLECTOR_CACHE_PATH'),
+            'cache_ttl': config.get('COLLECTOR_CACHE_TTL', 86400),
+        }
+    task = functools.partial(
+        assess_deployment, credentials=config.get('CLOUD_CREDENTIALS'),
+        stub={'latency': stub_latency, 'failure_rate': stub_failure_rate} if stub else None,
+        collector=collector,
+    )
+    runner = FleetRunner(
+        workers=workers or config.get('FLEET_WORKERS'),
+        timeout=timeout if timeout is not None else config.get('FLEET_TASK_TIMEOUT', 600),
+        retries=retries if retries is not None else config.get('FLEET_RETRIES', 2),
+        retry_delay=config.get('FLEET_RETRY_DELAY', 1.0),
+        task=task,
+    )
+
+    def progress(completed, total, result):
+        if result.status == FINISHED:
+            detail = f"{result.result['emissions']:.2f} kg CO2e"
+        else:
+            detail = result.error
+        click.echo(f'[{completed}/{total}] {result.deployment.name}: {result.status} '
+                   f'after {result.attempts} attempt(s) in {result.seconds:.1f}s ({detail})')
+
+    summary = runner.run(deployments, on_result=None if dry_run else store_result, on_progress=progress)
+    click.echo(json.dumps(summary, indent=2))
+    if summary['failed']:
+        raise SystemExit(1)
+
+
+def init_fleet(app):
+    app.cli.add_command(fleet_cli)
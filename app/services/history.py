@@ -0,0 +1,225 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models.models import Assessment
+from app.services.rollups import GRAINS, truncate, truncate_column
+
+# Query parameter to the column it filters on
+FILTERS = {
+    'provider': Assessment.cloud_provider,
+    'region': Assessment.region,
+    'instance_type': Assessment.instance_type,
+}
+
+ROLLUP_GROUPS = ('hour', 'day', 'region', 'provider', 'instance_type')
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp to the naive UTC datetimes stored in the
+    assessments table."""
+    if value is None or value == '':
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid timestamp: {value!r}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def encode_cursor(timestamp: datetime, assessment_id: int) -> str:
+    raw = f'{timestamp.isoformat()}|{assessment_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, assessment_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(assessment_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def serialize_assessment(assessment: Assessment) -> Dict:
+    return {
+        'id': assessment.id,
+        'timestamp': assessment.timestamp.isoformat() if assessment.timestamp else None,
+        'cloud_provider': assessment.cloud_provider,
+        'instance_type': assessment.instance_type,
+        'region': assessment.region,
+        'cpu_util': assessment.cpu_util,
+        'gpu_util': assessment.gpu_util,
+        'emissions': assessment.emissions,
+        'recommendations': [
+            {'id': rec.id, 'text': rec.text, 'impact': rec.impact,
+             'effort': rec.effort, 'implemented': rec.implemented}
+            for rec in assessment.recommendations
+        ],
+    }
+
+
+class AssessmentHistory:
+    """Filtered, newest-first views of the assessments table.
+
+    Pages are keyset paginated on (timestamp, id), so fetching any page is
+    an index range scan of the page size no matter how deep it is.
+    Rollups are aggregated in SQL over a bounded time window, from the
+    pre-aggregated rollup tables where the window allows.
+    """
+
+    def __init__(self, provider: str = None, region: str = None, instance_type: str = None,
+                 since: datetime = None, until: datetime = None):
+        self.filters = {'provider': provider, 'region': region, 'instance_type': instance_type}
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def from_args(cls, args) -> 'AssessmentHistory':
+        """Build from request arguments; raises ValueError on bad timestamps."""
+        return cls(since=parse_time(args.get('since')), until=parse_time(args.get('until')),
+                   **{name: args.get(name) or None for name in FILTERS})
+
+    def _where(self) -> List:
+        clauses = [FILTERS[name] == value for name, value in self.filters.items() if value is not None]
+        if self.since is not None:
+            clauses.append(Assessment.timestamp >= self.since)
+        if self.until is not None:
+            clauses.append(Assessment.timestamp < self.until)
+        return clauses
+
+    def page(self, limit: int = 50, cursor: str = None) -> Dict:
+        """Return up to ``limit`` assessments older than ``cursor`` with their
+        recommendations, loaded in one extra query for the whole page.
+
+        Returns:
+            Dictionary with ``items`` (Assessment objects) and ``next_cursor``
+        """
+        query = (
+            select(Assessment)
+            .where(*self._where())
+            .order_by(Assessment.timestamp.desc(), Assessment.id.desc())
+            .options(selectinload(Assessment.recommendations))
+            .limit(limit + 1)
+        )
+        if cursor:
+            timestamp, assessment_id = decode_cursor(cursor)
+            query = query.where(tuple_(Assessment.timestamp, Assessment.id) < tuple_(timestamp, assessment_id))
+        items = db.session.execute(query).scalars().all()
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1].timestamp, items[-1].id)
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def _window(self, default_days: int):
+        """Return the rollup time window; without ``since`` it starts at
+        midnight ``default_days - 1`` days ago."""
+        since = self.since
+        if since is None:
+            until = self.until or datetime.now(timezone.utc).replace(tzinfo=None)
+            since = truncate(until, 'day') - timedelta(days=default_days - 1)
+        return since, self.until
+
+    def rollup(self, group_by: Sequence[str] = ('day',), default_days: int = 30,
+               source: str = 'auto') -> List[Dict]:
+        """Aggregate emissions per group.
+
+        Reads the daily or hourly rollup tables when the window is aligned
+        to their buckets, and scans the assessments table otherwise.
+
+        Args:
+            group_by: Any of 'hour', 'day', 'region', 'provider' and 'instance_type'
+            default_days: Window length in days when no start time is set
+            source: 'auto', 'rollup' or 'raw'
+        """
+        unknown = set(group_by) - set(ROLLUP_GROUPS)
+        if unknown or not group_by:
+            raise ValueError(f'group_by must be one or more of {", ".join(ROLLUP_GROUPS)}')
+        since, until = self._window(default_days)
+
+        grain = None
+        for candidate in ('day', 'hour'):
+            if candidate == 'day' and 'hour' in group_by:
+                continue
+            if all(bound is None or truncate(bound, candidate) == bound for bound in (since, until)):
+                grain = candidate
+                break
+        if source == 'rollup' and grain is None:
+            raise ValueError('since and until must fall on hour boundaries to read the rollups')
+        if source == 'raw' or grain is None:
+            return self._raw_rollup(group_by, since, until)
+        return self._table_rollup(group_by, since, until, GRAINS[grain])
+
+    def _table_rollup(self, group_by, since, until, model) -> List[Dict]:
+        columns = []
+        for name in group_by:
+            if name in ('day', 'hour'):
+                columns.append(model.bucket.label(name))
+            else:
+                columns.append(getattr(model, FILTERS[name].key).label(name))
+        where = [getattr(model, FILTERS[name].key) == value
+                 for name, value in self.filters.items() if value is not None]
+        if since is not None:
+            where.append(model.bucket >= since)
+        if until is not None:
+            where.append(model.bucket < until)
+        query = (
+            select(*columns,
+                   func.sum(model.assessments).label('assessments'),
+                   func.sum(model.emissions).label('emissions'),
+                   (func.sum(model.cpu_util_sum) / func.nullif(func.sum(model.cpu_util_count), 0))
+                   .label('avg_cpu_util'),
+                   (func.sum(model.gpu_util_sum) / func.nullif(func.sum(model.gpu_util_count), 0))
+                   .label('avg_gpu_util'))
+            .where(*where)
+            .group_by(*columns)
+            .order_by(*columns)
+        )
+        return self._rows(query)
+
+    def _raw_rollup(self, group_by, since, until) -> List[Dict]:
+        dialect = db.session.connection().dialect.name
+        columns = []
+        for name in group_by:
+            if name in ('day', 'hour'):
+                columns.append(truncate_column(Assessment.timestamp, name, dialect).label(name))
+            else:
+                columns.append(FILTERS[name].label(name))
+        where = [FILTERS[name] == value for name, value in self.filters.items() if value is not None]
+        if since is not None:
+            where.append(Assessment.timestamp >= since)
+        if until is not None:
+            where.append(Assessment.timestamp < until)
+        query = (
+            select(*columns,
+                   func.count().label('assessments'),
+                   func.coalesce(func.sum(Assessment.emissions), 0).label('emissions'),
+                   func.avg(Assessment.cpu_util).label('avg_cpu_util'),
+                   func.avg(Assessment.gpu_util).label('avg_gpu_util'))
+            .where(*where)
+            .group_by(*columns)
+            .order_by(*columns)
+        )
+        return self._rows(query)
+
+    @staticmethod
+    def _rows(query) -> List[Dict]:
+        rows = []
+        for row in db.session.execute(query).mappings():
+            row = dict(row)
+            for name in ('day', 'hour'):
+                value = row.get(name)
+                if isinstance(value, str):
+                    value = datetime.fromisoformat(value)
+                if isinstance(value, datetime):
+                    row[name] = value.date().isoformat() if name == 'day' else value.isoformat()
+            rows.append(row)
+        return rows
@@ -0,0 +1,238 @@
+import codecs
+import json
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models.models import Assessment, Recommendation
+from app.services.rollups import record_assessments
+
+READ_SIZE = 64 * 1024
+# A decode error this far from the end of the buffer is in the element
+# itself; nearer, it may be a literal or escape cut by the read boundary
+LOOKAHEAD = 16
+
+ASSESSMENT_FIELDS = ('cloud_provider', 'instance_type', 'region')
+NUMERIC_FIELDS = ('cpu_util', 'gpu_util', 'emissions')
+# Fields stored as NULL when a record leaves them out
+OPTIONAL_FIELDS = ('gpu_util',)
+
+
+class TruncatedArray(ValueError):
+    """The body ended before the JSON array was closed."""
+
+
+def iter_ndjson(stream: IO[bytes]) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(index, record)`` for each non-blank line of an NDJSON stream.
+
+    Lines that fail to parse are yielded as the ``ValueError`` instead of a
+    record so the caller can report them and carry on.
+    """
+    index = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as exc:
+            yield index, exc
+        index += 1
+
+
+def iter_json_array(stream: IO[bytes]) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(index, record)`` for each element of a top-level JSON array,
+    decoding elements as they arrive instead of loading the whole body.
+
+    A malformed element ends the stream, since the position of the next
+    element can no longer be trusted; it is yielded as the ``ValueError``.
+    A body that ends before the closing bracket yields ``TruncatedArray``.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    index = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators, reading more when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = stream.read(READ_SIZE)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + utf8.decode(chunk or b'', final=not chunk)
+            pos = 0
+        if pos >= len(buffer):
+            if not started:
+                yield index, ValueError('Expected a JSON array')
+            else:
+                yield index, TruncatedArray('JSON array is missing its closing ]')
+            return
+        if not started:
+            if buffer[pos] != '[':
+                yield index, ValueError('Expected a JSON array')
+                return
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as exc:
+            if exc.pos < len(buffer) - LOOKAHEAD and not exc.msg.startswith('Unterminated string'):
+                yield index, exc
+                return
+            if eof:
+                yield index, TruncatedArray(str(exc))
+                return
+            # The element may continue past the end of the buffer
+            chunk = stream.read(READ_SIZE)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + utf8.decode(chunk or b'', final=not chunk)
+            pos = 0
+            continue
+        yield index, record
+        index += 1
+        pos = end
+
+
+def validate_record(record: Any) -> Tuple[Dict, List[Dict]]:
+    """Check one incoming assessment and split it into table rows.
+
+    Returns:
+        The assessment row and its recommendation rows
+
+    Raises:
+        ValueError: describing the first problem found
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Record must be a JSON object')
+    row = {}
+    for field in ASSESSMENT_FIELDS:
+        value = record.get(field)
+        if not isinstance(value, str) or not value:
+            raise ValueError(f'{field} is required and must be a string')
+        row[field] = value
+    for field in NUMERIC_FIELDS:
+        value = record.get(field)
+        if value is None and field in OPTIONAL_FIELDS:
+            row[field] = None
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'{field} is required and must be a number')
+        if not math.isfinite(value):
+            raise ValueError(f'{field} must be a finite number')
+        row[field] = float(value)
+    timestamp = record.get('timestamp')
+    if timestamp is None:
+        row['timestamp'] = datetime.now(timezone.utc).replace(tzinfo=None)
+    else:
+        try:
+            row['timestamp'] = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('timestamp must be an ISO 8601 string')
+        if row['timestamp'].tzinfo is not None:
+            row['timestamp'] = row['timestamp'].astimezone(timezone.utc).replace(tzinfo=None)
+
+    recommendations = []
+    for rec in record.get('recommendations') or []:
+        if not isinstance(rec, dict) or not isinstance(rec.get('text'), str):
+            raise ValueError('recommendations must be objects with a text field')
+        impact = rec.get('impact')
+        if impact is not None and (isinstance(impact, bool) or not isinstance(impact, (int, float))
+                                   or not math.isfinite(impact)):
+            raise ValueError('recommendation impact must be a finite number')
+        recommendations.append({
+            'text': rec['text'][:256],
+            'impact': impact,
+            'effort': rec.get('effort'),
+            'implemented': bool(rec.get('implemented', False)),
+        })
+    return row, recommendations
+
+
+class BulkIngestor:
+    """Writes validated assessments in chunks, one transaction per chunk.
+
+    Each chunk is two multi-row INSERTs: the assessments, with their new ids
+    returned in parameter order, then all of their recommendations.
+    """
+
+    def __init__(self, chunk_size: int = 1000, max_errors: int = 1000):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    def ingest(self, records: Iterable[Tuple[int, Any]]) -> Dict:
+        """Validate and store ``(index, record)`` pairs.
+
+        Returns:
+            Counts of accepted and rejected records, the per-record errors
+            and whether the body was complete
+        """
+        summary = {'accepted': 0, 'rejected': 0, 'chunks': 0, 'errors': [], 'complete': True}
+        chunk = []
+        for index, record in records:
+            if isinstance(record, TruncatedArray):
+                summary['complete'] = False
+            if isinstance(record, Exception):
+                self._reject(summary, index, f'Invalid JSON: {record}')
+                continue
+            try:
+                chunk.append((index,) + validate_record(record))
+            except ValueError as exc:
+                self._reject(summary, index, str(exc))
+                continue
+            if len(chunk) >= self.chunk_size:
+                self._write_chunk(chunk, summary)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk, summary)
+        return summary
+
+    def _reject(self, summary: Dict, index: int, error: str):
+        summary['rejected'] += 1
+        if len(summary['errors']) < self.max_errors:
+            summary['errors'].append({'index': index, 'error': error})
+
+    def _write_chunk(self, chunk: List[Tuple[int, Dict, List[Dict]]], summary: Dict):
+        summary['chunks'] += 1
+        try:
+            self.write_rows([row for _, row, _ in chunk], [recs for _, _, recs in chunk])
+            db.session.commit()
+        except SQLAlchemyError as exc:
+            db.session.rollback()
+            for index, _, _ in chunk:
+                self._reject(summary, index, f'Database error: {exc.__class__.__name__}')
+            return
+        summary['accepted'] += len(chunk)
+
+    @staticmethod
+    def write_rows(assessments: List[Dict], recommendations: List[List[Dict]]) -> List[int]:
+        """Insert assessment rows and their recommendations in the current
+        transaction, updating the emissions rollups, and return the new
+        assessment ids."""
+        result = db.session.execute(
+            insert(Assessment).returning(Assessment.id, sort_by_parameter_order=True),
+            assessments
+        )
+        ids = [row[0] for row in result]
+        rec_rows = [
+            dict(rec, assessment_id=assessment_id)
+            for assessment_id, recs in zip(ids, recommendations)
+            for rec in recs
+        ]
+        if rec_rows:
+            db.session.execute(insert(Recommendation), rec_rows)
+        record_assessments(assessments)
+        return ids
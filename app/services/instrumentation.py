@@ -0,0 +1,335 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self._samples())
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing total per label combination."""
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._label_text(labels)} {_format(value)}' for labels, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. requests in progress."""
+    kind = 'gauge'
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Observation counts in cumulative ``le`` buckets, with their sum."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (the last is +Inf), then the sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return sum(state[:-1]) if state else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = []
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _format(bound)
+                lines.append(f'{self.name}_bucket{self._label_text(labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(labels)} {_format(state[-1])}')
+            lines.append(f'{self.name}_count{self._label_text(labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """The metrics of one process, rendered together in Prometheus text
+    exposition format.
+
+    Every gunicorn worker has its own registry, so a scrape of /metrics
+    reports the worker that answered it; scrape each worker, or run one
+    worker per container, to see them all.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f'Metric {metric.name} is already registered differently')
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+    def clear(self):
+        """Reset every metric's values, keeping the metrics registered."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+REQUESTS = registry.counter('greeninfer_http_requests_total', 'HTTP requests handled.',
+                            ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram('greeninfer_http_request_duration_seconds',
+                                     'Time to handle an HTTP request.', ('endpoint', 'method'))
+IN_PROGRESS = registry.gauge('greeninfer_http_requests_in_progress', 'HTTP requests being handled.')
+SLOW_REQUESTS = registry.counter('greeninfer_http_slow_requests_total',
+                                 'Requests slower than SLOW_REQUEST_SECONDS.', ('endpoint',))
+REQUEST_QUERIES = registry.histogram('greeninfer_http_request_db_queries', 'Database queries per HTTP request.',
+                                     ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = registry.histogram('greeninfer_http_request_db_seconds',
+                                        'Time spent in database queries per HTTP request.', ('endpoint',))
+QUERIES = registry.counter('greeninfer_db_queries_total', 'Database queries executed.', ('context',))
+QUERY_SECONDS = registry.counter('greeninfer_db_query_seconds_total', 'Time spent in database queries.',
+                                 ('context',))
+STAGE_SECONDS = registry.histogram('greeninfer_stage_duration_seconds',
+                                   'Time spent in an assessment, recommendation or measurement stage.',
+                                   ('stage',))
+
+
+class RequestTrace:
+    """Database and stage timings of the request being handled."""
+    __slots__ = ('queries', 'query_seconds', 'tracing', 'statements', 'stages')
+
+    def __init__(self, tracing: bool = False):
+        self.queries = 0
+        self.query_seconds = 0.0
+        # Statements and stages are only kept when slow-request tracing is on
+        self.tracing = tracing
+        self.statements: List[Tuple[float, str]] = []
+        self.stages: List[Tuple[str, float]] = []
+
+
+_trace = contextvars.ContextVar('request_trace', default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _trace.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as stage ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        trace = _trace.get()
+        if trace is not None and trace.tracing:
+            trace.stages.append((name, elapsed))
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of the function as stage ``name``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    trace = _trace.get()
+    context_label = 'request' if trace is not None else 'background'
+    QUERIES.inc(context_label)
+    QUERY_SECONDS.inc(context_label, amount=elapsed)
+    if trace is not None:
+        trace.queries += 1
+        trace.query_seconds += elapsed
+        if trace.tracing:
+            trace.statements.append((elapsed, statement))
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def _endpoint() -> str:
+    # Route names rather than paths keep label values bounded
+    return request.endpoint or 'unmatched'
+
+
+def _start_request(tracing: bool):
+    g.instrumentation = (time.perf_counter(), _trace.set(RequestTrace(tracing)))
+    IN_PROGRESS.inc()
+
+
+def _finish_request(status: int, threshold: Optional[float]):
+    started, token = g.pop('instrumentation', (None, None))
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    trace = _trace.get()
+    _trace.reset(token)
+    IN_PROGRESS.dec()
+    endpoint = _endpoint()
+    REQUESTS.inc(endpoint, request.method, str(status))
+    REQUEST_SECONDS.observe(elapsed, endpoint, request.method)
+    REQUEST_QUERIES.observe(trace.queries, endpoint)
+    REQUEST_DB_SECONDS.observe(trace.query_seconds, endpoint)
+    if threshold is not None and elapsed >= threshold:
+        SLOW_REQUESTS.inc(endpoint)
+        slowest = sorted(trace.statements, key=lambda item: item[0], reverse=True)[:5]
+        logger.warning(
+            'Slow request: %s %s -> %s in %.3fs; %d queries in %.3fs; stages: %s; slowest queries: %s',
+            request.method, request.full_path.rstrip('?'), status, elapsed, trace.queries, trace.query_seconds,
+            ', '.join(f'{name} {seconds:.3f}s' for name, seconds in trace.stages) or 'none',
+            ' | '.join(f'{seconds:.3f}s {" ".join(statement.split())[:200]}' for seconds, statement in slowest)
+            or 'none',
+        )
+
+
+def metrics_view():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def init_instrumentation(app):
+    """Record request, database and stage metrics for ``app`` and serve
+    them at ``METRICS_PATH``.
+
+    Off when METRICS_ENABLED is false. Requests slower than
+    SLOW_REQUEST_SECONDS are logged with their query and stage timings.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    threshold = app.config.get('SLOW_REQUEST_SECONDS') or None
+
+    @app.before_request
+    def before_request():
+        _start_request(threshold is not None)
+
+    @app.after_request
+    def after_request(response):
+        _finish_request(response.status_code, threshold)
+        return response
+
+    @app.teardown_request
+    def teardown_request(exc):
+        # Only requests that raised are still open here
+        _finish_request(500, threshold)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+    app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics_view)
+    app.extensions['metrics_registry'] = registry
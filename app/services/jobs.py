@@ -0,0 +1,401 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from app.services.instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+TERMINAL_STATES = (FINISHED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its limit."""
+
+
+class Job:
+    """A unit of background work and its outcome."""
+
+    def __init__(self, kind: str, payload: Dict = None, id: str = None,
+                 status: str = QUEUED, result: Any = None, error: str = None,
+                 created_at: float = None, started_at: float = None,
+                 finished_at: float = None, attempts: int = 0):
+        self.id = id or uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload or {}
+        self.status = status
+        self.result = result
+        self.error = error
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.attempts = attempts
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'attempts': self.attempts,
+        }
+
+
+class MemoryJobStore:
+    """Keeps jobs in process memory. Jobs are only visible to this process."""
+
+    def __init__(self, max_finished: int = 1000):
+        self._jobs = {}
+        self._pending = deque()
+        self._finished = deque()
+        self._max_finished = max_finished
+        self._lock = threading.Lock()
+
+    def add(self, job: Job):
+        with self._lock:
+            self._jobs[job.id] = job
+            self._pending.append(job.id)
+
+    def claim(self) -> Optional[Job]:
+        with self._lock:
+            if not self._pending:
+                return None
+            job = self._jobs[self._pending.popleft()]
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.attempts += 1
+            return job
+
+    def heartbeat(self, job_ids):
+        # Jobs die with the process that holds them, so there is no lease
+        pass
+
+    def update(self, job: Job):
+        with self._lock:
+            self._jobs[job.id] = job
+            if job.done:
+                self._finished.append(job.id)
+                while len(self._finished) > self._max_finished:
+                    self._jobs.pop(self._finished.popleft(), None)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+class SQLiteJobStore:
+    """Keeps jobs in a SQLite file so that every gunicorn worker sharing the
+    file can report on, and pick up, the same jobs.
+
+    A running job is leased to its worker, which renews the lease with
+    ``heartbeat``. If the worker is killed the lease runs out, and the next
+    ``claim`` by any process requeues the job, or fails it once it has
+    been attempted ``max_attempts`` times.
+    """
+
+    def __init__(self, path: str, max_finished: int = 1000, lease_seconds: float = 60.0,
+                 max_attempts: int = 2):
+        self.path = path
+        self._max_finished = max_finished
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT,'
+                ' status TEXT NOT NULL, result TEXT, error TEXT,'
+                ' created_at REAL, started_at REAL, finished_at REAL,'
+                ' heartbeat_at REAL, attempts INTEGER NOT NULL DEFAULT 0)'
+            )
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            # Job files created before leases
+            if 'heartbeat_at' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+            if 'attempts' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status_created '
+                         'ON jobs (status, created_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _from_row(row) -> Job:
+        return Job(
+            id=row[0], kind=row[1], payload=json.loads(row[2] or '{}'),
+            status=row[3], result=json.loads(row[4]) if row[4] else None,
+            error=row[5], created_at=row[6], started_at=row[7],
+            finished_at=row[8], attempts=row[10]
+        )
+
+    def add(self, job: Job):
+        self._connect().execute(
+            'INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job.id, job.kind, json.dumps(job.payload), job.status, job.created_at)
+        )
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float):
+        """Requeue or fail running jobs whose worker stopped renewing them."""
+        expired = now - self.lease_seconds
+        conn.execute(
+            'UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL'
+            ' WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ? AND attempts < ?',
+            (QUEUED, RUNNING, expired, self.max_attempts)
+        )
+        conn.execute(
+            'UPDATE jobs SET status = ?, error = ?, finished_at = ?'
+            ' WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?',
+            (FAILED, f'Worker stopped while running the job ({self.max_attempts} attempts)', now,
+             RUNNING, expired)
+        )
+
+    def claim(self) -> Optional[Job]:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1',
+                (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            job = self._from_row(row)
+            job.status = RUNNING
+            job.started_at = now
+            job.attempts += 1
+            conn.execute('UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, attempts = ?'
+                         ' WHERE id = ?', (job.status, now, now, job.attempts, job.id))
+            conn.execute('COMMIT')
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def heartbeat(self, job_ids):
+        """Renew the leases of running jobs this process holds."""
+        if not job_ids:
+            return
+        self._connect().execute(
+            f'UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND id IN ({", ".join("?" * len(job_ids))})',
+            (time.time(), RUNNING, *job_ids)
+        )
+
+    def update(self, job: Job):
+        conn = self._connect()
+        # Matching the attempt ignores a worker whose lease expired and whose
+        # job was requeued, or failed, in the meantime
+        conn.execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, started_at = ?,'
+            ' finished_at = ? WHERE id = ? AND attempts = ? AND status = ?',
+            (job.status, json.dumps(job.result) if job.result is not None else None,
+             job.error, job.started_at, job.finished_at, job.id, job.attempts, RUNNING)
+        )
+        if job.done:
+            conn.execute(
+                'DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?)'
+                ' ORDER BY finished_at DESC LIMIT -1 OFFSET ?)',
+                (FINISHED, FAILED, self._max_finished)
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?',
+                                      (job_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def count_pending(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM jobs WHERE status = ?',
+                                       (QUEUED,)).fetchone()[0]
+
+
+class JobQueue:
+    """Bounded background worker pool for long-running measurements.
+
+    Handlers are registered per job kind and run inside the application
+    context. Worker threads are started lazily on first submit so that the
+    queue survives a fork (gunicorn preload) without carrying dead threads.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.store = None
+        self.workers = 2
+        self.max_queued = 32
+        self.poll_interval = 1.0
+        self.lease_seconds = 60.0
+        self._handlers = {}
+        self._threads = []
+        self._heartbeat_thread = None
+        self._running = set()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', 2)
+        self.max_queued = app.config.get('JOB_QUEUE_SIZE', 32)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 1.0)
+        self.lease_seconds = app.config.get('JOB_LEASE_SECONDS', 60.0)
+        backend = app.config.get('JOB_BACKEND', 'memory')
+        if backend == 'sqlite':
+            self.store = SQLiteJobStore(app.config.get('JOB_DB_PATH', 'greeninfer_jobs.db'),
+                                        lease_seconds=self.lease_seconds,
+                                        max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 2))
+        elif backend == 'memory':
+            self.store = MemoryJobStore()
+        else:
+            raise ValueError(f'Unknown job backend: {backend}')
+        self.check_processes(app.config.get('WORKER_PROCESSES', 1))
+        app.extensions['job_queue'] = self
+
+    def check_processes(self, processes: int):
+        """Refuse a per-process store when several processes serve requests.
+
+        A job submitted to one worker would be unknown to the others, so
+        polling it would fail whenever another worker answers.
+
+        Raises:
+            ValueError: if ``processes`` is above 1 with the memory backend
+        """
+        if processes > 1 and isinstance(self.store, MemoryJobStore):
+            raise ValueError(f'JOB_BACKEND=memory keeps jobs per process but {processes} worker '
+                             'processes serve requests; use JOB_BACKEND=sqlite')
+
+    def handler(self, kind: str) -> Callable:
+        """Decorator registering the function that runs jobs of ``kind``."""
+        def decorator(fn):
+            self._handlers[kind] = fn
+            return fn
+        return decorator
+
+    def submit(self, kind: str, payload: Dict = None) -> Job:
+        """Queue a job and return it immediately.
+
+        Raises:
+            QueueFull: if ``max_queued`` jobs are already waiting
+        """
+        if kind not in self._handlers:
+            raise ValueError(f'No handler registered for job kind: {kind}')
+        self._ensure_workers()
+        with self._lock:
+            if self.store.count_pending() >= self.max_queued:
+                raise QueueFull(f'{self.max_queued} jobs already queued')
+            job = Job(kind, payload)
+            self.store.add(job)
+        self._notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def wait(self, job_id: str, timeout: float = 30.0,
+             since_status: str = None) -> Optional[Job]:
+        """Block until the job finishes, or until its status differs from
+        ``since_status`` when given, or until ``timeout`` expires.
+
+        Returns:
+            The latest state of the job, or None if it does not exist
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job.done:
+                return job
+            if since_status is not None and job.status != since_status:
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads) \
+                    and self._heartbeat_thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Jobs the parent was running are not ours to renew
+                self._running = set()
+            self._pid = os.getpid()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat',
+                                                          daemon=True)
+                self._heartbeat_thread.start()
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}',
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                running = list(self._running)
+            try:
+                self.store.heartbeat(running)
+            except Exception:
+                logger.exception('Failed to renew job leases')
+
+    def _work(self):
+        while True:
+            job = self.store.claim()
+            if job is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            self._notify()
+            with self._lock:
+                self._running.add(job.id)
+            try:
+                with self.app.app_context(), stage(f'job.{job.kind}'):
+                    job.result = self._handlers[job.kind](job.payload)
+                job.status = FINISHED
+            except Exception as exc:
+                job.error = f'{type(exc).__name__}: {exc}'
+                job.status = FAILED
+            job.finished_at = time.time()
+            self.store.update(job)
+            with self._lock:
+                self._running.discard(job.id)
+            self._notify()
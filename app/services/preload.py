@@ -0,0 +1,84 @@
+"""Sharing read-only state between gunicorn workers.
+
+With ``preload_app`` gunicorn imports the application once in the master
+and forks the workers from it. Anything built before the fork - the rule,
+carbon intensity and inference cost tables here - is then shared by
+every worker through copy-on-write instead of being rebuilt, and held,
+once per worker. Anything that must not cross a fork (database connections, the
+emissions meter and its threads) is left to ``after_fork``.
+"""
+import gc
+import logging
+import os
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.core.energy import get_intensity_table
+from app.core.inference import get_inference_table
+from app.services.recommender import get_rule_engine
+from app.services.tracking import get_tracker_manager
+
+logger = logging.getLogger(__name__)
+
+_loaders: List[Callable[[], object]] = [get_intensity_table, get_inference_table, get_rule_engine]
+
+
+def register_shared(loader: Callable[[], object]) -> Callable[[], object]:
+    """Build ``loader``'s result before workers fork; usable as a decorator.
+
+    The loader must cache what it returns process-wide, like
+    ``get_intensity_table`` does, so that workers find it already built.
+    """
+    if loader not in _loaders:
+        _loaders.append(loader)
+    return loader
+
+
+def warm_shared_state() -> Dict[str, float]:
+    """Build every registered table now.
+
+    Returns:
+        Seconds spent per loader
+    """
+    timings = {}
+    for loader in _loaders:
+        start = time.perf_counter()
+        loader()
+        timings[loader.__name__] = time.perf_counter() - start
+    return timings
+
+
+def prepare_for_fork(app) -> Dict[str, float]:
+    """Build the shared tables in the master and leave nothing behind that
+    workers must not inherit."""
+    timings = warm_shared_state()
+    with app.app_context():
+        # Forked children must not reuse the master's database connections
+        for engine in app.extensions['sqlalchemy'].engines.values():
+            engine.dispose()
+    # Keep the collector from writing to, and so copying, every inherited page
+    gc.collect()
+    gc.freeze()
+    logger.info('Preloaded shared state in %.3fs: %s', sum(timings.values()),
+                ', '.join(f'{name} {seconds:.3f}s' for name, seconds in timings.items()))
+    return timings
+
+
+def after_fork(app, workers: int = 1):
+    """Per-worker setup once forked from a preloaded master.
+
+    Args:
+        app: The preloaded application
+        workers: Worker processes the master runs
+    """
+    app.extensions['job_queue'].check_processes(workers)
+    with app.app_context():
+        # close=False leaves the master's connections open; the pool forgets them
+        for engine in app.extensions['sqlalchemy'].engines.values():
+            engine.dispose(close=False)
+    # Otherwise every worker simulates the same "random" metrics
+    np.random.seed(int.from_bytes(os.urandom(4), 'little'))
+    if app.config.get('TRACKER_WARM_UP', True):
+        get_tracker_manager().warm_up()
@@ -0,0 +1,222 @@
+import glob
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RAPL_ROOT = '/sys/class/powercap'
+
+# Used to estimate CPU energy from process CPU time when RAPL is unavailable
+CPU_WATTS_PER_CORE = 12.0
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def _read(fd: int) -> str:
+    return os.pread(fd, 4096, 0).decode()
+
+
+def _open(path: str) -> Optional[int]:
+    try:
+        return os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+
+def busy_cpu_seconds() -> float:
+    """Return CPU seconds spent not idle across all cores since boot."""
+    with open('/proc/stat') as f:
+        cpu = [int(v) for v in f.readline().split()[1:]]
+    # idle and iowait are the 4th and 5th columns
+    return (sum(cpu[:8]) - cpu[3] - cpu[4]) / CLOCK_TICKS
+
+
+class RaplReader:
+    """Reads cumulative package energy from the Linux powercap RAPL interface.
+
+    The counters are kept open and re-read with ``pread`` so a sample costs a
+    single syscall per package. Counter wraparound is handled using each
+    domain's ``max_energy_range_uj``.
+    """
+
+    def __init__(self, root: str = RAPL_ROOT):
+        self._domains = []
+        for path in sorted(glob.glob(os.path.join(root, 'intel-rapl:*'))):
+            # Sub-domains (intel-rapl:0:0 ...) are already counted in their package
+            if os.path.basename(path).count(':') != 1:
+                continue
+            fd = _open(os.path.join(path, 'energy_uj'))
+            if fd is None:
+                continue
+            try:
+                with open(os.path.join(path, 'max_energy_range_uj')) as f:
+                    max_range = int(f.read())
+                int(_read(fd))
+            except (OSError, ValueError):
+                os.close(fd)
+                continue
+            self._domains.append({'fd': fd, 'max_range': max_range, 'last': None, 'total': 0})
+
+    @property
+    def available(self) -> bool:
+        return bool(self._domains)
+
+    def read_joules(self) -> float:
+        """Return energy consumed by all packages since the reader was created."""
+        total_uj = 0
+        for domain in self._domains:
+            value = int(_read(domain['fd']))
+            if domain['last'] is not None:
+                delta = value - domain['last']
+                if delta < 0:
+                    delta += domain['max_range']
+                domain['total'] += delta
+            domain['last'] = value
+            total_uj += domain['total']
+        return total_uj / 1e6
+
+    def close(self):
+        for domain in self._domains:
+            os.close(domain['fd'])
+        self._domains = []
+
+
+def is_descendant(pid: int, ancestor: int) -> bool:
+    """Return whether ``pid`` is ``ancestor`` or one of its descendants."""
+    while pid > 1:
+        if pid == ancestor:
+            return True
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                pid = next(int(line.split()[1]) for line in f if line.startswith('PPid:'))
+        except (OSError, StopIteration, ValueError):
+            return False
+    return pid == ancestor
+
+
+class ProcessSampler:
+    """Samples CPU time, I/O and RAPL energy of a process from /proc.
+
+    Runs on a background thread that wakes once per ``interval`` seconds; the
+    files are opened once and re-read in place to keep the overhead low.
+    With ``tid`` set, CPU time and I/O are those of that one thread of the
+    process, so other threads' work is not attributed to it.
+    """
+
+    FIELDS = ('time', 'proc_cpu_s', 'busy_cpu_s', 'read_bytes', 'write_bytes', 'rapl_j')
+
+    def __init__(self, pid: int, interval: float = 0.5, rapl: RaplReader = None,
+                 tid: Optional[int] = None):
+        if not interval > 0:
+            raise ValueError('interval must be a positive number of seconds')
+        self.pid = pid
+        self.tid = tid
+        self.interval = interval
+        self._owns_rapl = rapl is None
+        self.rapl = rapl if rapl is not None else RaplReader()
+        self.rapl_available = self.rapl.available
+        root = f'/proc/{pid}/task/{tid}' if tid is not None else f'/proc/{pid}'
+        self._stat_fd = _open(f'{root}/stat')
+        if self._stat_fd is None:
+            raise ProcessLookupError(f'No such process: {pid}')
+        self._io_fd = _open(f'{root}/io')
+        self._cpu_fd = _open('/proc/stat')
+        self._samples: List[tuple] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> tuple:
+        stat = _read(self._stat_fd)
+        fields = stat[stat.rfind(')') + 2:].split()
+        proc_cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+        busy_cpu = 0.0
+        if self._cpu_fd is not None:
+            cpu = [int(v) for v in _read(self._cpu_fd).split('\n', 1)[0].split()[1:]]
+            # idle and iowait are the 4th and 5th columns
+            busy_cpu = (sum(cpu[:8]) - cpu[3] - cpu[4]) / CLOCK_TICKS
+
+        read_bytes = write_bytes = 0
+        if self._io_fd is not None:
+            try:
+                io = dict(line.split(': ') for line in _read(self._io_fd).splitlines())
+                read_bytes = int(io.get('read_bytes', 0))
+                write_bytes = int(io.get('write_bytes', 0))
+            except OSError:
+                self._io_fd = None
+
+        rapl = self.rapl.read_joules() if self.rapl_available else 0.0
+        return (time.perf_counter(), proc_cpu, busy_cpu, read_bytes, write_bytes, rapl)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._samples.append(self._sample())
+            except (OSError, ValueError):
+                # The process exited
+                break
+
+    def start(self):
+        self._samples = [self._sample()]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'sampler-{self.pid}',
+                                        daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: float = None):
+        """Wait up to ``timeout`` seconds, returning early if the process exits."""
+        self._thread.join(timeout)
+
+    def stop(self) -> Dict[str, np.ndarray]:
+        """Stop sampling and return the samples as columns."""
+        self._stop.set()
+        self._thread.join()
+        try:
+            self._samples.append(self._sample())
+        except (OSError, ValueError):
+            pass
+        for fd in (self._stat_fd, self._io_fd, self._cpu_fd):
+            if fd is not None:
+                os.close(fd)
+        if self._owns_rapl:
+            self.rapl.close()
+        samples = np.array(self._samples, dtype=np.float64)
+        return {name: samples[:, i] for i, name in enumerate(self.FIELDS)}
+
+
+def summarize_samples(samples: Dict[str, np.ndarray], rapl_available: bool,
+                      carbon_intensity: float) -> Dict:
+    """Turn raw sampler columns into energy, utilization and I/O figures.
+
+    With RAPL, package energy is attributed to the process by its share of
+    busy CPU time over the run. Without it, energy is estimated from the
+    process CPU time at ``CPU_WATTS_PER_CORE``.
+    """
+    wall = float(samples['time'][-1] - samples['time'][0])
+    proc_cpu = float(samples['proc_cpu_s'][-1] - samples['proc_cpu_s'][0])
+    busy_cpu = float(samples['busy_cpu_s'][-1] - samples['busy_cpu_s'][0])
+
+    if rapl_available:
+        share = min(proc_cpu / busy_cpu, 1.0) if busy_cpu > 0 else 0.0
+        energy_j = float(samples['rapl_j'][-1] - samples['rapl_j'][0]) * share
+        source = 'rapl'
+    else:
+        energy_j = proc_cpu * CPU_WATTS_PER_CORE
+        source = 'cpu-time-estimate'
+
+    interval_cpu = np.diff(samples['proc_cpu_s']) / np.maximum(np.diff(samples['time']), 1e-9)
+    energy_kwh = energy_j / 3.6e6
+    return {
+        'duration': wall,
+        'samples': len(samples['time']),
+        'energy_source': source,
+        'energy_kwh': energy_kwh,
+        'emissions': energy_kwh * carbon_intensity / 1000,  # kg CO2
+        'cpu_seconds': proc_cpu,
+        'cpu_util': proc_cpu / (wall * (os.cpu_count() or 1)) if wall > 0 else 0.0,
+        'cpu_cores_p95': float(np.percentile(interval_cpu, 95)) if len(interval_cpu) else 0.0,
+        'io_read_bytes': int(samples['read_bytes'][-1] - samples['read_bytes'][0]),
+        'io_write_bytes': int(samples['write_bytes'][-1] - samples['write_bytes'][0]),
+    }
@@ -0,0 +1,425 @@
+import hashlib
+import json
+import operator
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from app.services.cache import get_results_cache
+from app.services.instrumentation import timed
+
+# Rules are data: which rows they match, how they are described, and how
+# their savings are derived. ``when`` conditions are (column, op, value)
+# triples that must all hold. Savings factors are either constants or the
+# name of a column holding a per-row factor; carbon savings are the row's
+# ``monthly_carbon_kg`` times ``carbon_factor``.
+RULES: List[Dict[str, Any]] = [
+    {
+        'id': 'model-01',
+        'scope': 'model',
+        'category': 'Model Selection',
+        'when': [('parameters', '>', 10e9)],
+        'title': 'Consider model distillation for {model_name}',
+        'description': 'Model {model_name} has {parameters_b:.1f}B parameters. '
+                       'Consider using knowledge distillation to create a smaller model that maintains accuracy; '
+                       'a student half its size is estimated to use {distillation_savings:.0%} less energy '
+                       'per request.',
+        'impact': 'high',
+        'effort': 'medium',
+        # Estimated from the model's type, size, precision, batch and SKU
+        'savings': {'energy_percent': 'distillation_energy_percent', 'carbon_factor': 'distillation_savings'},
+    },
+    {
+        'id': 'model-02',
+        'scope': 'model',
+        'category': 'Model Optimization',
+        'when': [('precision', '==', 'fp32')],
+        'title': 'Quantize {model_name} from FP32 to FP16 or INT8',
+        'description': 'Model {model_name} is using FP32 precision. Quantizing to FP16 could reduce '
+                       'memory usage and computation with minimal accuracy impact, using an estimated '
+                       '{quantization_savings:.0%} less energy per request.',
+        'impact': 'medium',
+        'effort': 'low',
+        'savings': {'energy_percent': 'quantization_energy_percent', 'carbon_factor': 'quantization_savings'},
+    },
+    {
+        'id': 'hw-01',
+        'scope': 'deployment',
+        'category': 'Hardware Configuration',
+        'when': [('gpu_util', '<', 0.5)],
+        'title': 'Low GPU utilization detected',
+        'description': 'Average GPU utilization is {gpu_util:.1%} (p95 {gpu_util_p95:.1%}), which suggests potential '
+                       'over-provisioning. Consider consolidating workloads or downsizing GPU resources.',
+        'impact': 'high',
+        'effort': 'medium',
+        'savings': {'energy_percent': 30, 'carbon_factor': 0.3},
+    },
+    {
+        'id': 'hw-02',
+        'scope': 'deployment',
+        'category': 'Hardware Configuration',
+        'when': [('gpu_util', 'notnull', None)],
+        'title': 'Evaluate newer GPU generations for inference',
+        'description': 'Newer GPU architectures often provide better energy efficiency. '
+                       'Consider using purpose-built inference hardware like NVIDIA T4 or AWS Inferentia.',
+        'impact': 'medium',
+        'effort': 'high',
+        'savings': {'energy_percent': 35, 'carbon_factor': 0.35},
+    },
+    {
+        'id': 'sched-01',
+        'scope': 'deployment',
+        'category': 'Scheduling & Workload',
+        'when': [('shift_savings_fraction', '>', 0.01)],
+        'title': 'Implement carbon-aware scheduling',
+        'description': 'Schedule non-urgent batch processing jobs during times when the grid has '
+                       'higher renewable energy mix or lower carbon intensity. '
+                       'Shifting {shifted_share:.0%} of the load by up to {flexibility_hours:g} hours '
+                       'cuts its emissions by {shift_savings_fraction:.1%} in simulation.',
+        'impact': 'medium',
+        'effort': 'medium',
+        # Energy use is the same, but carbon impact is lower
+        'savings': {'energy_percent': 0, 'carbon_factor': 'shift_carbon_factor'},
+    },
+    {
+        'id': 'loc-01',
+        'scope': 'deployment',
+        'category': 'Infrastructure Location',
+        'when': [],
+        'title': 'Consider region with lower carbon intensity',
+        'description': 'Moving compute to regions with cleaner energy grids can reduce carbon footprint. '
+                       'Cloud regions in Nordics, Canada, and certain US states have lower carbon intensity.',
+        'impact': 'high',
+        'effort': 'high',
+        # Energy use is the same, but carbon impact is lower
+        'savings': {'energy_percent': 0, 'carbon_factor': 0.6},
+    },
+]
+
+IMPACT_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+
+# Average electricity cost used for ROI unless configured otherwise
+DEFAULT_ENERGY_PRICE = 0.15
+
+# Combined energy reduction of all matched rules is capped to stay realistic
+MAX_ENERGY_REDUCTION = 0.9
+
+# How savings of several matched rules combine; part of the engine version,
+# so ROI cached or stored under another method is recomputed
+SAVINGS_METHOD = 'compound'
+
+# Size of a distilled student relative to its teacher, and the precision
+# fp32 models are quantized to, when estimating those rules' savings; also
+# part of the engine version
+DISTILLATION_SIZE = 0.5
+QUANTIZATION_PRECISION = 'fp16'
+
+_OPS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+Table = Mapping[str, Any]
+
+
+def compound(rows: np.ndarray, fractions: np.ndarray, n: int) -> np.ndarray:
+    """Combined reduction per row of independent ``fractions``.
+
+    Each saving applies to what the others leave, so 30% and 40% combine
+    to 1 - 0.7 * 0.6 = 58% rather than 70%, and never exceed 100%.
+    """
+    remaining = np.log1p(-np.clip(np.asarray(fractions, dtype=np.float64), 0, 1 - 1e-12))
+    return 1 - np.exp(np.bincount(rows, weights=remaining, minlength=n))
+
+
+def as_table(data) -> Dict[str, np.ndarray]:
+    """Turn a DataFrame, a dict of columns or a list of row dicts into a
+    dict of equal-length NumPy columns."""
+    if hasattr(data, 'columns') and hasattr(data, 'to_numpy'):
+        return {str(column): data[column].to_numpy() for column in data.columns}
+    if isinstance(data, Mapping):
+        return {key: np.asarray(values) for key, values in data.items()}
+    rows = list(data)
+    keys = {key for row in rows for key in row}
+    return {key: np.asarray([row.get(key) for row in rows]) for key in keys}
+
+
+def table_length(table: Table) -> int:
+    for values in table.values():
+        return len(values)
+    return 0
+
+
+class CompiledRule:
+    """A rule with its conditions resolved to vectorized predicates."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self.id = spec['id']
+        self.scope = spec.get('scope', 'deployment')
+        self.category = spec['category']
+        self.impact = spec['impact']
+        self.effort = spec['effort']
+        self.conditions = []
+        for column, op, value in spec.get('when', []):
+            if op not in _OPS and op not in ('in', 'notnull'):
+                raise ValueError(f'Rule {self.id}: unknown operator {op!r}')
+            self.conditions.append((column, op, value))
+        savings = spec.get('savings', {})
+        self.energy_percent = savings.get('energy_percent', 0)
+        self.carbon_factor = savings.get('carbon_factor', 0)
+
+    @staticmethod
+    def _column(table: Table, value, n: int) -> np.ndarray:
+        """Resolve a constant or a column name to a float array of length ``n``."""
+        if isinstance(value, str):
+            if value not in table:
+                return np.zeros(n)
+            return np.nan_to_num(np.asarray(table[value], dtype=np.float64))
+        return np.full(n, float(value))
+
+    def mask(self, table: Table) -> np.ndarray:
+        """Return which rows of ``table`` the rule applies to. A condition on
+        a missing column or a null value does not hold."""
+        n = table_length(table)
+        mask = np.ones(n, dtype=bool)
+        for column, op, value in self.conditions:
+            if column not in table:
+                return np.zeros(n, dtype=bool)
+            values = np.asarray(table[column])
+            if values.dtype.kind in 'fc':
+                present = ~np.isnan(values)
+            elif values.dtype.kind == 'O':
+                present = np.array([v is not None for v in values], dtype=bool)
+            else:
+                present = np.ones(n, dtype=bool)
+            if op == 'notnull':
+                mask &= present
+                continue
+            holds = np.zeros(n, dtype=bool)
+            if op == 'in':
+                holds[present] = np.isin(values[present], list(value))
+            else:
+                holds[present] = _OPS[op](values[present], value)
+            mask &= holds
+        return mask
+
+    def savings(self, table: Table) -> Dict[str, np.ndarray]:
+        """Return per-row energy percent and monthly carbon savings."""
+        n = table_length(table)
+        monthly_carbon = self._column(table, 'monthly_carbon_kg', n)
+        return {
+            'energy_percent': self._column(table, self.energy_percent, n),
+            'carbon_factor': self._column(table, self.carbon_factor, n),
+            'carbon_kg_per_month': monthly_carbon * self._column(table, self.carbon_factor, n),
+        }
+
+    def render(self, row: Dict[str, Any], energy_percent: float, carbon_kg: float) -> Dict:
+        return {
+            'id': self.id,
+            'title': self.spec['title'].format(**row),
+            'description': self.spec['description'].format(**row),
+            'impact': self.impact,
+            'effort': self.effort,
+            'category': self.category,
+            'estimated_savings': {
+                'energy_percent': energy_percent,
+                'carbon_kg_per_month': carbon_kg,
+            },
+        }
+
+
+class RuleEngine:
+    """Evaluates a compiled rule set over tables of assessments or models."""
+
+    def __init__(self, rules: Sequence[Dict[str, Any]] = None):
+        self.rules = [CompiledRule(spec) for spec in (rules if rules is not None else RULES)]
+        self.version = hashlib.sha1(
+            json.dumps([SAVINGS_METHOD, DISTILLATION_SIZE, QUANTIZATION_PRECISION,
+                        list(rules if rules is not None else RULES)],
+                       sort_keys=True, default=str).encode()
+        ).hexdigest()[:12]
+
+    def _select(self, scope: str = None, category: str = None) -> List[CompiledRule]:
+        return [rule for rule in self.rules
+                if (scope is None or rule.scope == scope)
+                and (category is None or rule.category == category)]
+
+    def evaluate(self, table: Table, scope: str = None, category: str = None) -> Dict[str, np.ndarray]:
+        """Match every selected rule against every row in one pass per rule.
+
+        Returns:
+            Long-format columns: ``row``, ``rule`` (index into ``self.rules``),
+            ``energy_percent``, ``carbon_factor`` and ``carbon_kg_per_month``,
+            one entry per match
+        """
+        rows, rule_ids, energy, factors, carbon = [], [], [], [], []
+        for rule in self._select(scope, category):
+            matched = np.flatnonzero(rule.mask(table))
+            if not len(matched):
+                continue
+            savings = rule.savings(table)
+            rows.append(matched)
+            rule_ids.append(np.full(len(matched), self.rules.index(rule)))
+            energy.append(savings['energy_percent'][matched])
+            factors.append(savings['carbon_factor'][matched])
+            carbon.append(savings['carbon_kg_per_month'][matched])
+        if not rows:
+            empty = np.empty(0)
+            return {'row': empty.astype(np.int64), 'rule': empty.astype(np.int64),
+                    'energy_percent': empty, 'carbon_factor': empty, 'carbon_kg_per_month': empty}
+        return {
+            'row': np.concatenate(rows),
+            'rule': np.concatenate(rule_ids),
+            'energy_percent': np.concatenate(energy),
+            'carbon_factor': np.concatenate(factors),
+            'carbon_kg_per_month': np.concatenate(carbon),
+        }
+
+    def roi(self, table: Table, energy_kwh, energy_price: float, scope: str = None) -> Dict[str, np.ndarray]:
+        """Per-row savings from applying every matching rule, compounded.
+
+        Args:
+            table: Feature table, one row per assessment
+            energy_kwh: Energy each row's carbon was produced by, over the same period
+            energy_price: Electricity cost in USD per kWh
+
+        Returns:
+            Columns ``recommendations``, ``carbon_savings_kg``,
+            ``energy_savings_kwh`` and ``cost_savings_usd``
+        """
+        n = table_length(table)
+        matches = self.evaluate(table, scope)
+        reduction = compound(matches['row'], matches['energy_percent'] / 100, n)
+        energy = np.asarray(energy_kwh, dtype=np.float64) * np.minimum(reduction, MAX_ENERGY_REDUCTION)
+        monthly_carbon = CompiledRule._column(table, 'monthly_carbon_kg', n)
+        return {
+            'recommendations': np.bincount(matches['row'], minlength=n),
+            'carbon_savings_kg': monthly_carbon * compound(matches['row'], matches['carbon_factor'], n),
+            'energy_savings_kwh': energy,
+            'cost_savings_usd': energy * energy_price,
+        }
+
+    def recommendations(self, table: Table, scope: str = None, category: str = None) -> List[Dict]:
+        """Render the matches for a small table as recommendation dicts."""
+        matches = self.evaluate(table, scope, category)
+        results = []
+        for row, rule, energy, carbon in zip(matches['row'], matches['rule'],
+                                             matches['energy_percent'], matches['carbon_kg_per_month']):
+            values = {key: column[row] for key, column in table.items()}
+            results.append(self.rules[rule].render(values, float(energy), float(carbon)))
+        return results
+
+    def summarize(self, table: Table) -> Dict:
+        """Fleet-wide totals per rule over all rows of ``table``."""
+        matches = self.evaluate(table)
+        n_rules = len(self.rules)
+        counts = np.bincount(matches['rule'], minlength=n_rules)
+        carbon = np.bincount(matches['rule'], weights=matches['carbon_kg_per_month'], minlength=n_rules)
+        return {
+            'assessments': table_length(table),
+            'rules_version': self.version,
+            'rules': [
+                {
+                    'id': rule.id,
+                    'category': rule.category,
+                    'impact': rule.impact,
+                    'effort': rule.effort,
+                    'matches': int(counts[i]),
+                    'carbon_kg_per_month': float(carbon[i]),
+                }
+                for i, rule in enumerate(self.rules)
+            ],
+            'total_carbon_kg_per_month': float(carbon.sum()),
+        }
+
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+_energy_price = DEFAULT_ENERGY_PRICE
+
+
+def get_rule_engine() -> RuleEngine:
+    """Return the process-wide engine for the built-in rules, compiling it
+    on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RuleEngine()
+        return _engine
+
+
+def set_rules(rules: Sequence[Dict[str, Any]] = None) -> RuleEngine:
+    """Replace the process-wide rule set and drop results derived from the
+    old one."""
+    global _engine
+    engine = RuleEngine(rules)
+    with _engine_lock:
+        _engine = engine
+    get_results_cache().invalidate('rules')
+    return engine
+
+
+def get_energy_price() -> float:
+    return _energy_price
+
+
+def set_energy_price(price: float):
+    """Set the electricity cost (USD/kWh) used for ROI and drop results
+    priced at the old rate."""
+    global _energy_price
+    if price != _energy_price:
+        _energy_price = price
+        get_results_cache().invalidate('prices')
+
+
+def init_recommender(app):
+    set_energy_price(app.config.get('ENERGY_PRICE_USD_PER_KWH', DEFAULT_ENERGY_PRICE))
+
+
+class RecommendationEngine:
+    """Recommendations for WorkloadAnalyzer results, as stored by the API."""
+
+    def __init__(self, engine: RuleEngine = None):
+        self.engine = engine or get_rule_engine()
+
+    @staticmethod
+    def features(results: Dict) -> Dict[str, np.ndarray]:
+        """One-row deployment table from an analyzer result."""
+        duration = results.get('duration') or 0
+        emissions = results.get('emissions') or 0.0
+        monthly_carbon = emissions * 30 * 24 * 3600 / duration if duration else emissions
+        gpu_util = results.get('gpu_util')
+        return {
+            'cpu_util': np.array([results.get('cpu_util', np.nan)], dtype=np.float64),
+            'gpu_util': np.array([np.nan if gpu_util is None else gpu_util], dtype=np.float64),
+            'gpu_util_p95': np.array([results.get('gpu_util_p95', np.nan)], dtype=np.float64),
+            'monthly_carbon_kg': np.array([monthly_carbon], dtype=np.float64),
+        }
+
+    @timed('recommender.generate')
+    def generate(self, results: Dict) -> List[Dict]:
+        """Return recommendations as ``text``/``impact``/``effort`` dicts, with
+        impact expressed as the percentage of carbon saved."""
+        table = self.features(results)
+        row = {key: values[0] for key, values in table.items()}
+        matches = self.engine.evaluate(table, scope='deployment')
+        recommendations = []
+        for rule_index, carbon in zip(matches['rule'], matches['carbon_kg_per_month']):
+            rule = self.engine.rules[rule_index]
+            factor = rule.savings(table)['carbon_factor'][0]
+            recommendations.append({
+                'id': rule.id,
+                'text': rule.spec['title'].format(**row),
+                'impact': float(factor * 100),
+                'effort': rule.effort,
+                'carbon_kg_per_month': float(carbon),
+            })
+        recommendations.sort(key=lambda rec: -rec['impact'])
+        return recommendations
+
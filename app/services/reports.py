@@ -0,0 +1,210 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import click
+import numpy as np
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.core.energy import get_intensity_table
+from app.models.models import Assessment, AssessmentROI, FleetReportState
+from app.services.recommender import RuleEngine, get_energy_price, get_rule_engine
+
+# Assessment columns the per-assessment ROI is derived from
+INPUT_COLUMNS = ('cloud_provider', 'instance_type', 'region', 'cpu_util', 'gpu_util', 'emissions')
+
+ROI_COLUMNS = ('recommendations', 'carbon_savings_kg', 'energy_savings_kwh', 'cost_savings_usd')
+
+# Edits are looked for from this long before the previous refresh began,
+# covering transactions that were still open while it ran; rows rescanned
+# this way are skipped by their content hash
+EDIT_OVERLAP = timedelta(minutes=5)
+
+
+def row_hash(values) -> str:
+    return hashlib.blake2b(repr(tuple(values)).encode(), digest_size=16).hexdigest()
+
+
+class FleetReport:
+    """ROI aggregates across every stored assessment.
+
+    Per-assessment savings are kept in the AssessmentROI table, and
+    FleetReportState records how far they are up to date. A refresh reads
+    only assessments added since (by id) or edited since (by
+    ``updated_at``), and recomputes those whose inputs changed. A new rule
+    set or energy price, or ``full=True``, walks the whole table instead
+    and also drops the rows of deleted assessments. The aggregates are
+    summed in SQL.
+
+    Stored assessments have no duration, so savings cover the period each
+    assessment's emissions were measured over.
+    """
+
+    def __init__(self, engine: RuleEngine = None, energy_price: float = None, chunk_size: int = 5000):
+        self.engine = engine or get_rule_engine()
+        self.energy_price = energy_price if energy_price is not None else get_energy_price()
+        self.chunk_size = chunk_size
+
+    def features(self, rows: List) -> Dict[str, np.ndarray]:
+        """Deployment feature table for stored assessment rows."""
+        def column(name):
+            return np.array([np.nan if getattr(row, name) is None else getattr(row, name) for row in rows],
+                            dtype=np.float64)
+        emissions = np.nan_to_num(column('emissions'))
+        return {
+            'cpu_util': column('cpu_util'),
+            'gpu_util': column('gpu_util'),
+            'monthly_carbon_kg': emissions,
+        }
+
+    def energy_kwh(self, rows: List, emissions: np.ndarray) -> np.ndarray:
+        """Back out energy from emissions with each region's mean intensity."""
+        intensity = get_intensity_table()
+        regions = [row.region for row in rows]
+        means = {region: intensity.mean(region) for region in set(regions)}
+        grams_per_kwh = np.array([means[region] for region in regions], dtype=np.float64)
+        return emissions * 1000 / grams_per_kwh
+
+    def _compute(self, rows: List, hashes: List[str]) -> List[Dict]:
+        table = self.features(rows)
+        roi = self.engine.roi(table, self.energy_kwh(rows, table['monthly_carbon_kg']), self.energy_price,
+                              scope='deployment')
+        columns = {name: roi[name].tolist() for name in ROI_COLUMNS}
+        return [
+            dict({name: columns[name][i] for name in ROI_COLUMNS},
+                 assessment_id=row.id, content_hash=hashes[i],
+                 rules_version=self.engine.version, energy_price=self.energy_price)
+            for i, row in enumerate(rows)
+        ]
+
+    def _update(self, *criteria) -> Dict[str, int]:
+        """Recompute stale ROI rows of the assessments matching ``criteria``,
+        walking them in id order one chunk per transaction."""
+        query = (
+            select(Assessment.id, *[getattr(Assessment, name) for name in INPUT_COLUMNS],
+                   AssessmentROI.content_hash, AssessmentROI.rules_version, AssessmentROI.energy_price)
+            .outerjoin(AssessmentROI, AssessmentROI.assessment_id == Assessment.id)
+            .where(*criteria)
+            .order_by(Assessment.id)
+            .limit(self.chunk_size)
+        )
+        scanned = updated = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(query.where(Assessment.id > last_id)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            scanned += len(rows)
+
+            stale, hashes = [], []
+            for row in rows:
+                digest = row_hash(row[1:len(INPUT_COLUMNS) + 1])
+                if (row.content_hash != digest or row.rules_version != self.engine.version
+                        or row.energy_price != self.energy_price):
+                    stale.append(row)
+                    hashes.append(digest)
+            if not stale:
+                continue
+            ids = [row.id for row in stale]
+            db.session.execute(delete(AssessmentROI).where(AssessmentROI.assessment_id.in_(ids)))
+            db.session.execute(insert(AssessmentROI), self._compute(stale, hashes))
+            db.session.commit()
+            updated += len(stale)
+        return {'scanned': scanned, 'updated': updated}
+
+    def refresh(self, full: bool = False) -> Dict[str, int]:
+        """Bring AssessmentROI up to date with the assessments table.
+
+        Args:
+            full: Walk every assessment even if the state says it is current
+
+        Returns:
+            Counts of ``scanned`` assessments, ``updated`` ROI rows and
+            ``removed`` rows of deleted assessments, and whether the refresh
+            was ``full``
+        """
+        try:
+            # Edits committed after this instant are found by the next refresh
+            started = db.session.execute(select(func.now())).scalar()
+            state = db.session.get(FleetReportState, 1) or FleetReportState(id=1, last_assessment_id=0)
+            full = (full or state.rules_version != self.engine.version
+                    or state.energy_price != self.energy_price)
+            last_id = db.session.execute(select(func.max(Assessment.id))).scalar() or 0
+            removed = 0
+            if full:
+                counts = self._update(Assessment.id <= last_id)
+                removed = db.session.execute(
+                    delete(AssessmentROI).where(~AssessmentROI.assessment_id.in_(select(Assessment.id)))
+                ).rowcount
+            else:
+                counts = self._update(Assessment.id > state.last_assessment_id, Assessment.id <= last_id)
+                if state.updated_through is not None:
+                    edited = self._update(Assessment.id <= state.last_assessment_id,
+                                          Assessment.updated_at >= state.updated_through - EDIT_OVERLAP)
+                    counts = {key: counts[key] + edited[key] for key in counts}
+            state.rules_version = self.engine.version
+            state.energy_price = self.energy_price
+            state.last_assessment_id = last_id
+            state.updated_through = started
+            state.refreshed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            db.session.add(state)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+        return dict(counts, removed=removed, full=full)
+
+    def _group(self, column) -> List[Dict]:
+        query = (
+            select(column, func.count(), *[func.coalesce(func.sum(getattr(AssessmentROI, name)), 0)
+                                           for name in ROI_COLUMNS])
+            .join(Assessment, Assessment.id == AssessmentROI.assessment_id)
+            .group_by(column)
+            .order_by(column)
+        )
+        return [
+            dict(zip((column.key, 'assessments') + ROI_COLUMNS, row))
+            for row in db.session.execute(query).all()
+        ]
+
+    def generate(self, refresh: bool = False) -> Dict:
+        """Return fleet totals and breakdowns by provider and region, as of
+        the last refresh unless ``refresh`` is set."""
+        progress = self.refresh() if refresh else None
+        totals = db.session.execute(
+            select(func.count(), *[func.coalesce(func.sum(getattr(AssessmentROI, name)), 0)
+                                   for name in ROI_COLUMNS])
+            .join(Assessment, Assessment.id == AssessmentROI.assessment_id)
+        ).one()
+        state = db.session.get(FleetReportState, 1)
+        report = {
+            'rules_version': self.engine.version,
+            'energy_price': self.energy_price,
+            'refreshed_at': state.refreshed_at.isoformat() if state and state.refreshed_at else None,
+            'totals': dict(zip(('assessments',) + ROI_COLUMNS, totals)),
+            'by_provider': self._group(Assessment.cloud_provider),
+            'by_region': self._group(Assessment.region),
+        }
+        if progress is not None:
+            report['refresh'] = progress
+        return report
+
+
+reports_cli = AppGroup('reports', help='Maintain the fleet ROI report.')
+
+
+@reports_cli.command('refresh')
+@click.option('--full', is_flag=True, help='Walk every assessment, and drop rows of deleted ones.')
+def refresh_command(full):
+    """Bring the per-assessment ROI rows up to date."""
+    counts = FleetReport().refresh(full=full)
+    click.echo(f"{'Full' if counts['full'] else 'Incremental'} refresh: scanned {counts['scanned']}, "
+               f"updated {counts['updated']}, removed {counts['removed']}")
+
+
+def init_reports(app):
+    app.cli.add_command(reports_cli)
@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.models import Assessment, DailyEmissions, HourlyEmissions
+
+GRAINS = {'hour': HourlyEmissions, 'day': DailyEmissions}
+
+KEY_COLUMNS = ('bucket', 'cloud_provider', 'region', 'instance_type')
+SUM_COLUMNS = ('assessments', 'emissions', 'cpu_util_sum', 'cpu_util_count', 'gpu_util_sum', 'gpu_util_count')
+# Assessment columns the rollups are computed from
+SOURCE_COLUMNS = ('timestamp',) + KEY_COLUMNS[1:] + ('emissions', 'cpu_util', 'gpu_util')
+
+# SQLite stores DateTime columns as text in this layout; rebuilt buckets
+# must match what the ORM writes for the same instant
+_SQLITE_FORMATS = {'hour': '%Y-%m-%d %H:00:00.000000', 'day': '%Y-%m-%d 00:00:00.000000'}
+
+
+def truncate(value: datetime, grain: str) -> datetime:
+    """Start of the hour or day containing ``value``."""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if grain == 'day' else value
+
+
+def truncate_column(column, grain: str, dialect: str):
+    """SQL expression for the start of the hour or day of a DateTime column."""
+    if dialect == 'sqlite':
+        return func.strftime(_SQLITE_FORMATS[grain], column)
+    if dialect == 'postgresql':
+        return func.date_trunc(grain, column)
+    raise NotImplementedError(f'Emissions rollups do not support {dialect} databases')
+
+
+def aggregate(rows: Iterable, grain: str, sign: int = 1) -> List[Dict]:
+    """Sum assessment rows (dicts or Assessment objects) into rollup rows,
+    negated when ``sign`` is -1."""
+    buckets: Dict[tuple, List] = {}
+    for row in rows:
+        get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+        key = (truncate(get('timestamp'), grain), get('cloud_provider') or '',
+               get('region') or '', get('instance_type') or '')
+        sums = buckets.get(key)
+        if sums is None:
+            sums = buckets[key] = [0, 0.0, 0.0, 0, 0.0, 0]
+        sums[0] += 1
+        sums[1] += get('emissions') or 0.0
+        cpu_util, gpu_util = get('cpu_util'), get('gpu_util')
+        if cpu_util is not None:
+            sums[2] += cpu_util
+            sums[3] += 1
+        if gpu_util is not None:
+            sums[4] += gpu_util
+            sums[5] += 1
+    return [dict(zip(KEY_COLUMNS, key), **{name: sign * value for name, value in zip(SUM_COLUMNS, sums)})
+            for key, sums in buckets.items()]
+
+
+def _upsert(connection, model, rows: List[Dict]):
+    """Add ``rows`` onto existing buckets, creating missing ones."""
+    table = model.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={name: table.c[name] + stmt.excluded[name] for name in SUM_COLUMNS},
+        )
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[name] == row[name] for name in KEY_COLUMNS])
+            .values({name: table.c[name] + row[name] for name in SUM_COLUMNS})
+        )
+        if not result.rowcount:
+            connection.execute(insert(table), row)
+
+
+def record_assessments(rows: Iterable, connection=None, sign: int = 1):
+    """Add newly inserted assessments to the hourly and daily rollups in the
+    current transaction.
+
+    Args:
+        rows: Assessment dicts or objects with their timestamps set
+        connection: Connection to write with, defaulting to the session's
+        sign: -1 to take the rows back out of the rollups instead
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    connection = connection if connection is not None else db.session.connection()
+    for grain, model in GRAINS.items():
+        _upsert(connection, model, aggregate(rows, grain, sign))
+
+
+def _stored(connection, ids: List[int]) -> List[Dict]:
+    """The rolled-up columns of assessments ``ids`` as the database holds them."""
+    columns = [getattr(Assessment, name) for name in SOURCE_COLUMNS]
+    rows = []
+    for lo in range(0, len(ids), 1000):
+        result = connection.execute(select(*columns).where(Assessment.id.in_(ids[lo:lo + 1000])))
+        rows.extend(dict(zip(SOURCE_COLUMNS, row)) for row in result)
+    return rows
+
+
+def _sync_assessments(session, flush_context, instances):
+    """Keep the rollups in step with assessments added, changed or deleted
+    through the ORM.
+
+    Changed and deleted assessments are read back before the flush writes
+    them, and those values are subtracted from their buckets before the
+    new ones are added. Bulk UPDATE and DELETE statements bypass this; run
+    ``flask rollups rebuild`` after those.
+    """
+    added = [obj for obj in session.new if isinstance(obj, Assessment)]
+    changed = [obj for obj in session.dirty if isinstance(obj, Assessment)
+               and any(inspect(obj).attrs[name].history.has_changes() for name in SOURCE_COLUMNS)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Assessment)]
+    if not added and not changed and not deleted:
+        return
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for assessment in added + changed:
+        if assessment.timestamp is None:
+            assessment.timestamp = now
+    connection = session.connection()
+    ids = [inspect(obj).identity[0] for obj in changed + deleted]
+    record_assessments(_stored(connection, ids), connection, sign=-1)
+    with session.no_autoflush:
+        record_assessments(added + changed, connection)
+
+
+def rebuild(since: Optional[datetime] = None) -> Dict[str, int]:
+    """Recompute the rollups from the assessments table.
+
+    Args:
+        since: Only rebuild days from the one containing ``since``; the
+            whole history is rebuilt by default
+
+    Returns:
+        Number of hourly and daily buckets in the tables afterwards
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    start = truncate(since, 'day') if since is not None else None
+    counts = {}
+    sources = {'hour': (Assessment, Assessment.timestamp), 'day': (HourlyEmissions, HourlyEmissions.bucket)}
+    for grain, model in GRAINS.items():
+        table = model.__table__
+        source, time_column = sources[grain]
+        clear = delete(table)
+        if start is not None:
+            clear = clear.where(table.c.bucket >= start)
+        connection.execute(clear)
+
+        bucket = truncate_column(time_column, grain, dialect)
+        if source is Assessment:
+            keys = [func.coalesce(getattr(Assessment, name), '') for name in KEY_COLUMNS[1:]]
+            sums = [
+                func.count(),
+                func.coalesce(func.sum(Assessment.emissions), 0),
+                func.coalesce(func.sum(Assessment.cpu_util), 0),
+                func.count(Assessment.cpu_util),
+                func.coalesce(func.sum(Assessment.gpu_util), 0),
+                func.count(Assessment.gpu_util),
+            ]
+        else:
+            keys = [getattr(HourlyEmissions, name) for name in KEY_COLUMNS[1:]]
+            sums = [func.sum(getattr(HourlyEmissions, name)) for name in SUM_COLUMNS]
+        query = select(bucket, *keys, *sums).group_by(bucket, *keys)
+        if start is not None:
+            query = query.where(time_column >= start)
+        connection.execute(insert(table).from_select(list(KEY_COLUMNS + SUM_COLUMNS), query))
+        counts[grain] = connection.execute(select(func.count()).select_from(table)).scalar()
+    db.session.commit()
+    return counts
+
+
+rollups_cli = AppGroup('rollups', help='Maintain the emissions rollup tables.')
+
+
+@rollups_cli.command('rebuild')
+@click.option('--since', help='Only rebuild from this ISO 8601 date onwards.')
+@click.option('--days', type=int, help='Only rebuild the last DAYS days.')
+def rebuild_command(since, days):
+    """Backfill or rebuild the hourly and daily rollups."""
+    start = None
+    if since:
+        start = datetime.fromisoformat(since)
+    elif days:
+        start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days - 1)
+    counts = rebuild(start)
+    click.echo(f"Rollups rebuilt: {counts['hour']} hourly and {counts['day']} daily buckets")
+
+
+def init_rollups(app):
+    if not event.contains(Session, 'before_flush', _sync_assessments):
+        event.listen(Session, 'before_flush', _sync_assessments)
+    app.cli.add_command(rollups_cli)
@@ -0,0 +1,451 @@
+import fcntl
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import click
+import numpy as np
+from flask.cli import AppGroup
+
+from app.core.metrics import Frequency, MetricFrame, TimeLike
+from app.services.archive import MetricArchive
+
+logger = logging.getLogger(__name__)
+
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$')
+
+# <start ms>-<end ms>-<samples>-<w|c><id>.npz: freshly written or compacted
+SEGMENT_PATTERN = re.compile(r'^(\d+)-(\d+)-(\d+)-([wc])([0-9a-f]+)\.npz$')
+# Accepted sample times in epoch ms, exclusive: segment names have no sign,
+# and 2**42 ms (the year 2109) leaves int64 arithmetic plenty of room
+MAX_TIMESTAMP_MS = 2 ** 42
+
+
+class TelemetryError(ValueError):
+    """A telemetry batch that cannot be decoded or stored."""
+
+
+@dataclass
+class Batch:
+    """Samples of one metric from one source.
+
+    ``timestamps`` are epoch milliseconds and ``values`` is a float32 array
+    of shape (devices, samples).
+    """
+    source: str
+    metric: str
+    devices: List[str]
+    timestamps: np.ndarray
+    values: np.ndarray
+
+    def validate(self) -> 'Batch':
+        for label, name in (('source', self.source), ('metric', self.metric)):
+            if not isinstance(name, str) or not NAME_PATTERN.match(name):
+                raise TelemetryError(f'{label} must match {NAME_PATTERN.pattern}')
+        if self.timestamps.ndim != 1 or not len(self.timestamps):
+            raise TelemetryError(f'{self.metric}: timestamps must be a non-empty list')
+        if self.values.shape != (len(self.devices), len(self.timestamps)):
+            raise TelemetryError(f'{self.metric}: expected {len(self.devices)} devices of '
+                                 f'{len(self.timestamps)} samples, got shape {self.values.shape}')
+        if len(set(self.devices)) != len(self.devices):
+            raise TelemetryError(f'{self.metric}: device labels must be unique')
+        if not all(NAME_PATTERN.match(device) for device in self.devices):
+            raise TelemetryError(f'{self.metric}: device labels must match {NAME_PATTERN.pattern}')
+        return self
+
+
+def _float_array(value, dtype, what: str) -> np.ndarray:
+    """Decode a list of numbers or packed little-endian floats."""
+    try:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return np.frombuffer(value, dtype=np.dtype(dtype).newbyteorder('<')).astype(dtype)
+        return np.asarray(value, dtype=dtype)
+    except (TypeError, ValueError) as exc:
+        raise TelemetryError(f'{what}: {exc}')
+
+
+def _timestamps_ms(seconds: np.ndarray) -> np.ndarray:
+    if not np.isfinite(seconds).all():
+        raise TelemetryError('timestamps must be finite epoch seconds')
+    milliseconds = np.round(seconds * 1000)
+    if len(milliseconds) and (milliseconds.min() <= 0 or milliseconds.max() >= MAX_TIMESTAMP_MS):
+        raise TelemetryError(f'timestamps must be epoch seconds between 0 and {MAX_TIMESTAMP_MS // 1000}')
+    return milliseconds.astype(np.int64)
+
+
+def decode_msgpack(body: bytes) -> List[Batch]:
+    """Decode a msgpack telemetry message.
+
+    The message is a map, or a list of maps, of the form::
+
+        {"source": "node-1",
+         "timestamps": [epoch seconds, ...] or packed float64,
+         "metrics": {"gpu_utilization": {"devices": ["gpu0", "gpu1"],
+                                         "values": [[...], [...]] or packed float32}}}
+
+    Packed values are little-endian and device-major. ``devices`` defaults
+    to a single device '0'.
+    """
+    try:
+        import msgpack
+    except ImportError:
+        raise TelemetryError('msgpack telemetry requires the msgpack package')
+    try:
+        message = msgpack.unpackb(body, raw=False)
+    except (ValueError, msgpack.UnpackException) as exc:
+        raise TelemetryError(f'Invalid msgpack: {exc}')
+
+    batches = []
+    for part in message if isinstance(message, list) else [message]:
+        if not isinstance(part, dict) or not isinstance(part.get('metrics'), dict):
+            raise TelemetryError('Each message needs source, timestamps and a metrics map')
+        timestamps = _timestamps_ms(_float_array(part.get('timestamps'), np.float64, 'timestamps'))
+        for metric, spec in part['metrics'].items():
+            if not isinstance(spec, dict):
+                spec = {'values': spec}
+            devices = [str(device) for device in spec.get('devices') or ['0']]
+            values = _float_array(spec.get('values'), np.float32, metric)
+            if values.ndim == 1 and values.size == len(devices) * len(timestamps):
+                values = values.reshape(len(devices), len(timestamps))
+            batches.append(Batch(part.get('source'), metric, devices, timestamps, values).validate())
+    return batches
+
+
+def decode_packed(body: bytes, source: str, metric: str, devices: Sequence[str]) -> List[Batch]:
+    """Decode packed float arrays: N little-endian float64 epoch seconds
+    followed by N float32 values per device, device-major."""
+    devices = list(devices) or ['0']
+    row_bytes = 8 + 4 * len(devices)
+    if not body or len(body) % row_bytes:
+        raise TelemetryError(f'Body length must be a multiple of {row_bytes} bytes '
+                             f'for {len(devices)} devices')
+    samples = len(body) // row_bytes
+    timestamps = _timestamps_ms(np.frombuffer(body, dtype='<f8', count=samples))
+    values = np.frombuffer(body, dtype='<f4', offset=samples * 8).astype(np.float32)
+    return [Batch(source, metric, devices, timestamps, values.reshape(len(devices), samples)).validate()]
+
+
+@dataclass
+class Segment:
+    path: str
+    start: int
+    end: int
+    samples: int
+    compacted: bool
+
+    @classmethod
+    def parse(cls, directory: str, name: str) -> Optional['Segment']:
+        match = SEGMENT_PATTERN.match(name)
+        if not match:
+            return None
+        return cls(os.path.join(directory, name), int(match.group(1)), int(match.group(2)),
+                   int(match.group(3)), match.group(4) == 'c')
+
+
+def merge_series(parts: List[Tuple[np.ndarray, np.ndarray, List[str]]]):
+    """Combine (timestamps, values, devices) parts into one time-sorted
+    series over the union of their devices. Samples of a device at the same
+    timestamp are averaged, so re-sent batches do not double count."""
+    devices: List[str] = []
+    index: Dict[str, int] = {}
+    for _, _, part_devices in parts:
+        for device in part_devices:
+            if device not in index:
+                index[device] = len(devices)
+                devices.append(device)
+    timestamps = np.concatenate([part[0] for part in parts])
+    values = np.full((len(devices), len(timestamps)), np.nan, dtype=np.float32)
+    offset = 0
+    for part_timestamps, part_values, part_devices in parts:
+        rows = [index[device] for device in part_devices]
+        values[rows, offset:offset + len(part_timestamps)] = part_values
+        offset += len(part_timestamps)
+
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    values = values[:, order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(timestamps)) + 1))
+    if len(starts) < len(timestamps):
+        observed = np.isfinite(values)
+        sums = np.add.reduceat(np.where(observed, values, 0), starts, axis=1)
+        counts = np.add.reduceat(observed, starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = (sums / counts).astype(np.float32)
+        timestamps = timestamps[starts]
+    return timestamps, values, devices
+
+
+class TelemetryStore:
+    """Append-only columnar store for utilization telemetry on local disk.
+
+    Each (source, metric) pair is a directory of immutable segment files
+    holding a time column and a (devices, samples) value column. Every
+    append writes a new segment, so concurrent writers in any number of
+    processes never contend. Compaction periodically merges small segments
+    into larger time-sorted ones; readers merge whatever segments overlap
+    the requested window. Duplicate samples are averaged on read, so a
+    compaction interrupted before deleting its inputs loses nothing.
+    """
+
+    def __init__(self, root: str, compact_min_segments: int = 16,
+                 max_segment_samples: int = 1_000_000, compact_interval: float = 300,
+                 archive: MetricArchive = None, archive_after: float = 86400):
+        """Initialize the store.
+
+        Args:
+            root: Directory holding one subdirectory per source
+            compact_min_segments: Small segments needed before a metric is compacted
+            max_segment_samples: Target size of compacted segments
+            compact_interval: Seconds between background compactions, or 0 to disable
+            archive: Long-term archive that compaction moves old samples into
+            archive_after: Age in seconds after which segments are archived
+        """
+        self.root = root
+        self.compact_min_segments = compact_min_segments
+        self.max_segment_samples = max_segment_samples
+        self.compact_interval = compact_interval
+        self.archive = archive
+        self.archive_after = archive_after
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _directory(self, source: str, metric: str) -> str:
+        for name in (source, metric):
+            if not NAME_PATTERN.match(name):
+                raise TelemetryError(f'Invalid telemetry name: {name!r}')
+        return os.path.join(self.root, source, metric)
+
+    def _write_segment(self, directory: str, timestamps: np.ndarray, values: np.ndarray,
+                       devices: Sequence[str], compacted: bool = False) -> str:
+        name = (f'{int(timestamps[0])}-{int(timestamps[-1])}-{len(timestamps)}-'
+                f'{"c" if compacted else "w"}{uuid.uuid4().hex[:16]}.npz')
+        path = os.path.join(directory, name)
+        tmp = os.path.join(directory, f'.tmp-{name}')
+        with open(tmp, 'wb') as f:
+            np.savez(f, timestamps=timestamps, values=values, devices=np.array(devices, dtype=str))
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _read_segment(segment: Segment):
+        with np.load(segment.path) as data:
+            return data['timestamps'], data['values'], data['devices'].tolist()
+
+    def append(self, batch: Batch) -> str:
+        """Store a batch as a new segment and return its path."""
+        directory = self._directory(batch.source, batch.metric)
+        os.makedirs(directory, exist_ok=True)
+        order = np.argsort(batch.timestamps, kind='stable')
+        path = self._write_segment(directory, batch.timestamps[order], batch.values[:, order],
+                                   batch.devices)
+        self._ensure_compactor()
+        return path
+
+    def sources(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if NAME_PATTERN.match(name))
+
+    def metrics(self, source: str) -> List[str]:
+        directory = os.path.join(self.root, source)
+        if not NAME_PATTERN.match(source) or not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if NAME_PATTERN.match(name))
+
+    def segments(self, source: str, metric: str, start: int = None, end: int = None) -> List[Segment]:
+        """Segments overlapping ``[start, end)`` epoch milliseconds, oldest first."""
+        directory = self._directory(source, metric)
+        if not os.path.isdir(directory):
+            return []
+        found = []
+        for name in os.listdir(directory):
+            segment = Segment.parse(directory, name)
+            if segment is None:
+                continue
+            if (start is None or segment.end >= start) and (end is None or segment.start < end):
+                found.append(segment)
+        found.sort(key=lambda segment: (segment.start, segment.end))
+        return found
+
+    def read(self, source: str, metric: str, start: int = None, end: int = None):
+        """Return (timestamps ms, values, devices) for samples in
+        ``[start, end)``, or None if there are none."""
+        for attempt in range(3):
+            try:
+                parts = [self._read_segment(segment) for segment in self.segments(source, metric, start, end)]
+                break
+            except FileNotFoundError:
+                # Compaction replaced a segment between listing and reading
+                if attempt == 2:
+                    raise
+        if not parts:
+            return None
+        timestamps, values, devices = merge_series(parts)
+        lo = 0 if start is None else np.searchsorted(timestamps, start, 'left')
+        hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, 'left')
+        if lo >= hi:
+            return None
+        return timestamps[lo:hi], values[:, lo:hi], devices
+
+    def frame(self, source: str, start: TimeLike = None, end: TimeLike = None,
+              interval: Frequency = '1min', metrics: Sequence[str] = None) -> Optional[MetricFrame]:
+        """Read a source's metrics in ``[start, end)`` into one MetricFrame,
+        averaged into ``interval`` bins on a shared time axis. Archived
+        history is binned day by day, so long windows never hold more than
+        the binned result in memory.
+
+        Returns:
+            The frame, or None if the source has no samples in the window
+        """
+        start_ms = None if start is None else int(np.datetime64(start, 'ms').astype(np.int64))
+        end_ms = None if end is None else int(np.datetime64(end, 'ms').astype(np.int64))
+        if metrics is None:
+            metrics = set(self.metrics(source))
+            if self.archive is not None:
+                metrics.update(self.archive.metrics(source))
+            metrics = sorted(metrics)
+        binned = {}
+        for metric in metrics:
+            parts = []
+            if self.archive is not None:
+                archived = self.archive.frame(source, metric, start, end, interval)
+                if archived is not None:
+                    parts.append((archived.timestamps, archived.values(metric), archived.devices(metric)))
+            series = self.read(source, metric, start_ms, end_ms)
+            if series is not None:
+                timestamps, values, devices = series
+                recent = MetricFrame(timestamps.astype('datetime64[ms]').astype('datetime64[s]'),
+                                     {metric: values}, {metric: devices}).resample(interval)
+                parts.append((recent.timestamps, recent.values(metric), recent.devices(metric)))
+            if not parts:
+                continue
+            timestamps, values, devices = merge_series(parts) if len(parts) > 1 else parts[0]
+            binned[metric] = MetricFrame(timestamps, {metric: values}, {metric: devices})
+        if not binned:
+            return None
+
+        axis = np.unique(np.concatenate([frame.timestamps for frame in binned.values()]))
+        result = MetricFrame(axis)
+        for metric, frame in binned.items():
+            values = np.full((frame.device_count(metric), len(axis)), np.nan, dtype=np.float32)
+            values[:, np.searchsorted(axis, frame.timestamps)] = frame.values(metric)
+            result.add(metric, values, frame.devices(metric))
+        return result
+
+    def compact(self, source: str = None, metric: str = None, force: bool = False) -> Dict[str, int]:
+        """Move aged segments into the archive, then merge small segments of
+        each (source, metric) into larger ones.
+
+        A metric is compacted once it has ``compact_min_segments`` segments
+        smaller than half of ``max_segment_samples``, or at two with ``force``.
+
+        Returns:
+            Numbers of segments archived, merged and written
+        """
+        summary = {'archived': 0, 'merged': 0, 'written': 0}
+        for src in [source] if source else self.sources():
+            for name in [metric] if metric else self.metrics(src):
+                directory = self._directory(src, name)
+                if not os.path.isdir(directory):
+                    continue
+                with open(os.path.join(directory, '.compact.lock'), 'w') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    summary['archived'] += self._archive_directory(src, name)
+                    merged, written = self._compact_directory(src, name, directory, force)
+                summary['merged'] += merged
+                summary['written'] += written
+        return summary
+
+    def _compact_directory(self, source: str, metric: str, directory: str, force: bool):
+        small = [segment for segment in self.segments(source, metric)
+                 if segment.samples < self.max_segment_samples // 2]
+        if len(small) < (2 if force else self.compact_min_segments):
+            return 0, 0
+        timestamps, values, devices = merge_series([self._read_segment(segment) for segment in small])
+        written = 0
+        for lo in range(0, len(timestamps), self.max_segment_samples):
+            hi = lo + self.max_segment_samples
+            self._write_segment(directory, timestamps[lo:hi], values[:, lo:hi], devices, compacted=True)
+            written += 1
+        for segment in small:
+            os.unlink(segment.path)
+        return len(small), written
+
+    def _archive_directory(self, source: str, metric: str) -> int:
+        if self.archive is None:
+            return 0
+        cutoff = int((time.time() - self.archive_after) * 1000)
+        aged = [segment for segment in self.segments(source, metric) if segment.end < cutoff]
+        if not aged:
+            return 0
+        timestamps, values, devices = merge_series([self._read_segment(segment) for segment in aged])
+        self.archive.write(source, metric, timestamps, values, devices)
+        for segment in aged:
+            os.unlink(segment.path)
+        return len(aged)
+
+    def _ensure_compactor(self):
+        if not self.compact_interval:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._compact_periodically,
+                                            name='telemetry-compactor', daemon=True)
+            self._thread.start()
+
+    def _compact_periodically(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except Exception:
+                # A failed pass leaves its input segments in place for the next one
+                logger.exception('Telemetry compaction failed')
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_telemetry_store() -> TelemetryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TelemetryStore(os.environ.get('TELEMETRY_PATH') or 'telemetry')
+        return _store
+
+
+telemetry_cli = AppGroup('telemetry', help='Manage the telemetry segment store.')
+
+
+@telemetry_cli.command('compact')
+@click.option('--source', help='Only compact this source.')
+@click.option('--force', is_flag=True, help='Merge small segments even below the threshold.')
+def compact_command(source, force):
+    """Merge small telemetry segments into larger ones."""
+    summary = get_telemetry_store().compact(source, force=force)
+    click.echo(f"Archived {summary['archived']} segments; "
+               f"merged {summary['merged']} segments into {summary['written']}")
+
+
+def init_telemetry_store(app) -> TelemetryStore:
+    store = get_telemetry_store()
+    store.root = app.config.get('TELEMETRY_PATH', store.root)
+    store.compact_min_segments = app.config.get('TELEMETRY_COMPACT_MIN_SEGMENTS', 16)
+    store.max_segment_samples = app.config.get('TELEMETRY_SEGMENT_SAMPLES', 1_000_000)
+    store.compact_interval = app.config.get('TELEMETRY_COMPACT_INTERVAL', 300)
+    if app.config.get('TELEMETRY_ARCHIVE_PATH'):
+        store.archive = MetricArchive(app.config['TELEMETRY_ARCHIVE_PATH'],
+                                      app.config.get('TELEMETRY_ARCHIVE_RESOLUTION', 10))
+        store.archive_after = app.config.get('TELEMETRY_ARCHIVE_AFTER', 86400)
+    app.extensions['telemetry_store'] = store
+    app.cli.add_command(telemetry_cli)
+    return store
@@ -0,0 +1,258 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+from app.services.profiler import CPU_WATTS_PER_CORE, RaplReader, busy_cpu_seconds
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EnergySnapshot:
+    """Cumulative counters of a meter at one point in time."""
+    time: float
+    energy_kwh: float
+    cpu_energy_kwh: float = 0.0
+    gpu_energy_kwh: float = 0.0
+    ram_energy_kwh: float = 0.0
+    emissions_kg: Optional[float] = None
+    cpu_busy_s: float = 0.0
+
+
+@dataclass
+class Measurement:
+    """Energy used while a measurement session was open."""
+    name: str
+    duration: float
+    energy_kwh: float
+    emissions_kg: float
+    cpu_energy_kwh: float
+    gpu_energy_kwh: float
+    ram_energy_kwh: float
+    cpu_util: float
+    source: str
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class CodecarbonMeter:
+    """Machine-wide counters from one long-running codecarbon tracker.
+
+    A read calls the tracker's public ``flush()``, which measures up to now
+    and hands the cumulative totals to the tracker's output handlers, one
+    of which is kept here. Reads are serialized by the meter's own lock, as
+    the tracker is not thread-safe.
+    """
+
+    source = 'codecarbon'
+
+    def __init__(self, measure_power_secs: float = 15):
+        from codecarbon import EmissionsTracker
+        from codecarbon.output import BaseOutput
+
+        class LatestEmissions(BaseOutput):
+            """Keeps the cumulative EmissionsData the tracker last reported."""
+            total = None
+
+            def out(self, total, delta):
+                self.total = total
+
+            def live_out(self, total, delta):
+                self.total = total
+
+        self._latest = LatestEmissions()
+        self._lock = threading.Lock()
+        self.tracker = EmissionsTracker(
+            log_level='error',
+            save_to_file=False,
+            measure_power_secs=measure_power_secs,
+            allow_multiple_runs=True,
+            output_handlers=[self._latest]
+        )
+        self.tracker.start()
+        self.hardware = self.tracker.get_detected_hardware()
+
+    def read(self) -> EnergySnapshot:
+        with self._lock:
+            # codecarbon logs and swallows its own errors; the previous
+            # totals are then reused
+            self.tracker.flush()
+            data = self._latest.total
+        if data is None:
+            raise RuntimeError('codecarbon reported no emissions data')
+        return EnergySnapshot(
+            time=time.perf_counter(),
+            energy_kwh=data.energy_consumed,
+            cpu_energy_kwh=data.cpu_energy,
+            gpu_energy_kwh=data.gpu_energy,
+            ram_energy_kwh=data.ram_energy,
+            emissions_kg=data.emissions
+        )
+
+    def close(self):
+        with self._lock:
+            self.tracker.stop()
+
+
+class ProcfsMeter:
+    """Machine-wide CPU counters from RAPL, or from /proc/stat busy time when
+    RAPL is not exposed. Used when codecarbon is unavailable."""
+
+    def __init__(self):
+        self.rapl = RaplReader()
+        self.source = 'rapl' if self.rapl.available else 'cpu-time-estimate'
+        self.hardware = {'cpu_count': os.cpu_count()}
+        self._lock = threading.Lock()
+
+    def read(self) -> EnergySnapshot:
+        if self.rapl.available:
+            # The reader accumulates wraparound state per domain
+            with self._lock:
+                energy_kwh = self.rapl.read_joules() / 3.6e6
+        else:
+            energy_kwh = busy_cpu_seconds() * CPU_WATTS_PER_CORE / 3.6e6
+        return EnergySnapshot(time=time.perf_counter(), energy_kwh=energy_kwh,
+                              cpu_energy_kwh=energy_kwh)
+
+    def close(self):
+        self.rapl.close()
+
+
+class MeasurementSession:
+    """A start/stop window over the shared meter.
+
+    Sessions only hold their starting snapshot, so any number of them can be
+    open at once from different threads.
+    """
+
+    def __init__(self, manager: 'TrackerManager', name: str = None):
+        self.manager = manager
+        self.name = name or uuid.uuid4().hex
+        self.result: Optional[Measurement] = None
+        self._start: Optional[EnergySnapshot] = None
+
+    def start(self) -> 'MeasurementSession':
+        self._start = self.manager.read()
+        return self
+
+    def stop(self) -> Measurement:
+        end = self.manager.read()
+        start = self._start
+        energy_kwh = end.energy_kwh - start.energy_kwh
+        duration = end.time - start.time
+        if start.emissions_kg is not None and end.emissions_kg is not None:
+            emissions_kg = end.emissions_kg - start.emissions_kg
+        else:
+            emissions_kg = energy_kwh * self.manager.carbon_intensity / 1000
+        self.result = Measurement(
+            name=self.name,
+            duration=duration,
+            energy_kwh=energy_kwh,
+            emissions_kg=emissions_kg,
+            cpu_energy_kwh=end.cpu_energy_kwh - start.cpu_energy_kwh,
+            gpu_energy_kwh=end.gpu_energy_kwh - start.gpu_energy_kwh,
+            ram_energy_kwh=end.ram_energy_kwh - start.ram_energy_kwh,
+            cpu_util=((end.cpu_busy_s - start.cpu_busy_s) / (duration * (os.cpu_count() or 1))
+                      if duration > 0 else 0.0),
+            source=self.manager.source
+        )
+        return self.result
+
+    def __enter__(self) -> 'MeasurementSession':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class TrackerManager:
+    """Process-wide owner of the emissions meter.
+
+    Hardware and location detection happen once, when the meter is first
+    needed; every measurement afterwards is two counter reads.
+    """
+
+    def __init__(self, measure_power_secs: float = 15, carbon_intensity: float = 400):
+        self.measure_power_secs = measure_power_secs
+        # gCO2/kWh, used when the meter does not report emissions itself
+        self.carbon_intensity = carbon_intensity
+        self._meter = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_meter(self):
+        if self._meter is not None and self._pid == os.getpid():
+            return self._meter
+        try:
+            self._meter = CodecarbonMeter(self.measure_power_secs)
+        except Exception as exc:
+            logger.warning('codecarbon unavailable (%s), using /proc energy counters', exc)
+            self._meter = ProcfsMeter()
+        self._pid = os.getpid()
+        return self._meter
+
+    def warm_up(self):
+        """Run hardware detection now rather than on the first measurement."""
+        with self._lock:
+            self._ensure_meter()
+
+    @property
+    def source(self) -> str:
+        return self._meter.source if self._meter else 'none'
+
+    @property
+    def hardware(self) -> Dict:
+        with self._lock:
+            return self._ensure_meter().hardware
+
+    def read(self) -> EnergySnapshot:
+        # The manager lock only guards creating the meter, so sessions do not
+        # queue behind a codecarbon flush on the process-wide lock
+        with self._lock:
+            meter = self._ensure_meter()
+        snapshot = meter.read()
+        snapshot.cpu_busy_s = busy_cpu_seconds()
+        return snapshot
+
+    def start(self, name: str = None) -> MeasurementSession:
+        """Open a session now; call ``stop()`` on it to get the measurement."""
+        return MeasurementSession(self, name).start()
+
+    def session(self, name: str = None) -> MeasurementSession:
+        """Context manager measuring the enclosed block; the measurement is
+        on ``session.result`` once the block exits."""
+        return MeasurementSession(self, name)
+
+    def close(self):
+        with self._lock:
+            if self._meter is not None and self._pid == os.getpid():
+                self._meter.close()
+            self._meter = None
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_tracker_manager() -> TrackerManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = TrackerManager()
+        return _manager
+
+
+def init_tracker_manager(app) -> TrackerManager:
+    manager = get_tracker_manager()
+    manager.measure_power_secs = app.config.get('TRACKER_MEASURE_POWER_SECS', 15)
+    manager.carbon_intensity = app.config.get('CARBON_INTENSITY', 400)
+    app.extensions['tracker_manager'] = manager
+    # A preloading master forks before serving; workers warm up after the fork
+    if app.config.get('TRACKER_WARM_UP', True) and not app.config.get('PRELOAD'):
+        manager.warm_up()
+    return manager
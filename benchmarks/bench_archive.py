@@ -0,0 +1,91 @@
+"""Long-window telemetry reads: binning raw segments loaded whole versus
+the day-partitioned memory-mapped archive.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_archive --days 90 --devices 4 --resolution 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.archive import SECONDS_PER_DAY, MetricArchive
+from app.services.telemetry import Batch, TelemetryStore
+
+SOURCE = 'bench'
+METRIC = 'gpu_utilization'
+
+
+def load(store, days, devices, resolution, seed=0):
+    """Append one segment per day of samples every ``resolution`` seconds."""
+    rng = np.random.default_rng(seed)
+    labels = [f'gpu{i}' for i in range(devices)]
+    first = (int(time.time()) // SECONDS_PER_DAY - days) * SECONDS_PER_DAY
+    offsets = np.arange(0, SECONDS_PER_DAY, resolution, dtype=np.int64)
+    for day in range(days):
+        timestamps = (first + day * SECONDS_PER_DAY + offsets) * 1000
+        values = rng.uniform(0.2, 0.9, (devices, len(offsets))).astype(np.float32)
+        store.append(Batch(SOURCE, METRIC, labels, timestamps, values))
+    return first
+
+
+def measure(fn, repeat):
+    times, peak = [], 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(times), peak, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--resolution', type=int, default=10)
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = {'days': args.days, 'devices': args.devices, 'resolution': args.resolution,
+               'interval': args.interval}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TelemetryStore(os.path.join(tmp, 'segments'), compact_interval=0)
+        first = load(store, args.days, args.devices, args.resolution)
+        start = np.datetime64(first, 's')
+        end = start + np.timedelta64(args.days * SECONDS_PER_DAY, 's')
+
+        seconds, peak, raw = measure(lambda: store.frame(SOURCE, start, end, args.interval), args.repeat)
+        results['segments'] = {'seconds': seconds, 'peak_mb': peak / 1e6}
+
+        store.archive = MetricArchive(os.path.join(tmp, 'archive'), args.resolution)
+        store.archive_after = 0
+        begin = time.perf_counter()
+        results['archived_segments'] = store.compact()['archived']
+        results['archive_seconds'] = time.perf_counter() - begin
+
+        seconds, peak, archived = measure(lambda: store.frame(SOURCE, start, end, args.interval), args.repeat)
+        results['archive'] = {'seconds': seconds, 'peak_mb': peak / 1e6}
+        assert np.allclose(raw.values(METRIC), archived.values(METRIC), atol=1e-6)
+
+        seconds, peak, _ = measure(lambda: store.archive.summary(SOURCE, METRIC, start, end), args.repeat)
+        results['archive_summary'] = {'seconds': seconds, 'peak_mb': peak / 1e6}
+        results['memory_reduction'] = results['segments']['peak_mb'] / results['archive']['peak_mb']
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
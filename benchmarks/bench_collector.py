@@ -0,0 +1,112 @@
+"""Provider collection throughput by connection pool size, against the
+local fake aws/azure/gcp servers.
+
+Each run collects the models and a window of hardware metrics for every
+deployment through one CloudCollector per provider, all concurrently, and
+checks that no more requests were in flight than the pool allows. A last
+run adds server failures and a server-side rate limit to exercise retries.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_collector --deployments 16 --connections 1 4 16 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.core.collectors import CloudCollector, ResponseCache, RetryPolicy
+from app.core.fake_clouds import FakeCloudServer
+from app.core.providers import PROVIDERS
+
+
+async def collect_all(servers, deployments, days, interval, cache_root, **options):
+    end = np.datetime64('2024-06-01T00:00:00', 's')
+    start = end - np.timedelta64(days, 'D')
+    collectors = [CloudCollector(provider, server.url, cache=ResponseCache(cache_root), seed=0, **options)
+                  for provider, server in servers.items()]
+    try:
+        catalogs = await asyncio.gather(*(collector.instance_types() for collector in collectors))
+        results = await asyncio.gather(*(
+            collector.collect(f'deployment-{i}', start, end, interval)
+            for collector in collectors for i in range(deployments)
+        ))
+        assert await asyncio.gather(*(collector.instance_types() for collector in collectors)) == catalogs
+    finally:
+        for collector in collectors:
+            await collector.close()
+    for result in results:
+        assert result['models'] and result['hardware_metrics'] is not None
+    assert all(catalogs)
+    stats = [collector.stats for collector in collectors]
+    return {key: sum(s[key] for s in stats) for key in stats[0]}
+
+
+def run(servers, args, cache_root, **options):
+    for server in servers.values():
+        for key in ('requests', 'throttled', 'failed', 'peak_in_flight', 'peak_connections'):
+            server.stats[key] = 0
+    started = time.perf_counter()
+    stats = asyncio.run(collect_all(servers, args.deployments, args.days, args.interval, cache_root, **options))
+    seconds = time.perf_counter() - started
+    return dict(stats, seconds=seconds, requests_per_second=stats['requests'] / seconds,
+                peak_in_flight=max(s.stats['peak_in_flight'] for s in servers.values()),
+                throttled=sum(s.stats['throttled'] for s in servers.values()),
+                failed=sum(s.stats['failed'] for s in servers.values()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--deployments', type=int, default=16, help='Deployments per provider')
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--interval', default='5min')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds per fake server response')
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    results = {'deployments': args.deployments * len(PROVIDERS), 'days': args.days,
+               'interval': args.interval, 'latency': args.latency, 'runs': []}
+    servers = {provider: FakeCloudServer(provider, latency=args.latency, page_size=args.page_size)
+               for provider in PROVIDERS}
+    for server in servers.values():
+        server.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for connections in args.connections:
+                cache_root = os.path.join(tmp, f'cache-{connections}')
+                stats = run(servers, args, cache_root, connections=connections, rate_limit=None,
+                            page_size=args.page_size)
+                assert stats['peak_in_flight'] <= connections, stats
+                # The second catalog lookup of every collector is served from disk
+                assert stats['cache_hits'] >= len(PROVIDERS), stats
+                results['runs'].append(dict(stats, connections=connections))
+
+            for server in servers.values():
+                server.failure_rate, server.rate_limit = 0.05, 200
+            connections = args.connections[-1]
+            stats = run(servers, args, os.path.join(tmp, 'cache-faults'), connections=connections,
+                        rate_limit=150, page_size=args.page_size,
+                        retry=RetryPolicy(retries=8, base=0.05, cap=2.0))
+            results['faults'] = dict(stats, connections=connections, failure_rate=0.05,
+                                     server_rate_limit=200, client_rate_limit=150)
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    baseline = results['runs'][0]['seconds']
+    for run_stats in results['runs']:
+        run_stats['speedup'] = baseline / run_stats['seconds']
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
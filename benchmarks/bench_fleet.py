@@ -0,0 +1,86 @@
+"""Fleet assessment throughput by worker count, with stub providers in
+place of the cloud SDKs and results streamed into SQLite.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_fleet --deployments 64 --workers 1 2 4 8 --stub-latency 0.2
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app import db
+from app.models.models import Assessment
+from app.services.fleet import Deployment, FleetRunner, assess_deployment, store_result
+from app.services.rollups import init_rollups
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    init_rollups(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def make_deployments(count, days, interval, seed=0):
+    rng = random.Random(seed)
+    return [
+        Deployment(
+            name=f'deployment-{i}',
+            cloud_provider=rng.choice(['aws', 'azure', 'gcp']),
+            region=rng.choice(['us-east-1', 'eu-west-1', 'europe-north1', 'westeurope']),
+            instance_type=rng.choice(['p3.2xlarge', 'g4dn.xlarge', 'a2-highgpu-1g', 'nc6s_v3']),
+            days=days,
+            interval=interval,
+        )
+        for i in range(count)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--deployments', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', default='5min')
+    parser.add_argument('--stub-latency', type=float, default=0.2,
+                        help='Seconds per stub provider call (two calls per deployment)')
+    args = parser.parse_args(argv)
+
+    deployments = make_deployments(args.deployments, args.days, args.interval)
+    task = functools.partial(assess_deployment, stub={'latency': args.stub_latency})
+    results = {'deployments': args.deployments, 'cpus': os.cpu_count(), 'days': args.days,
+               'interval': args.interval, 'stub_latency': args.stub_latency, 'runs': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            app = make_app(os.path.join(tmp, f'bench-{workers}.db'))
+            with app.app_context():
+                summary = FleetRunner(workers=workers, timeout=None, retries=0, task=task).run(
+                    deployments, on_result=store_result)
+                assert summary['finished'] == args.deployments, summary['errors']
+                assert db.session.query(Assessment).count() == args.deployments
+                db.session.remove()
+                db.engine.dispose()
+            results['runs'].append({'workers': workers, 'seconds': summary['seconds'],
+                                    'deployments_per_second': args.deployments / summary['seconds']})
+    baseline = results['runs'][0]['seconds']
+    for run in results['runs']:
+        run['speedup'] = baseline / run['seconds']
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Inference energy of many models across configurations, looked up vs computed.
+
+Costs every model of a generated inventory at every precision, batch size
+and SKU the cost table covers, once by table lookup and once, for a
+sample, by evaluating the roofline model for each configuration as
+estimate_model does. Reports the table's build time, lookups and exact
+estimates per second, and the lookup's largest relative error on the
+sample.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_inference --models 5000 --sample 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.inference import InferenceCostTable, estimate_model
+from benchmarks.datagen import model_inventory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--models', type=int, default=5000)
+    parser.add_argument('--sample', type=int, default=2000, help='Configurations estimated exactly')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = InferenceCostTable()
+    build_seconds = time.perf_counter() - start
+
+    models = model_inventory(args.models)
+    configurations = [(precision, int(batch), sku) for precision in table.precisions
+                      for batch in table.batches for sku in table.skus]
+    start = time.perf_counter()
+    costs = [table.models(models, sku, precisions=precision, batch_sizes=batch)['joules_per_token']
+             for precision, batch, sku in configurations]
+    lookup_seconds = time.perf_counter() - start
+    lookups = args.models * len(configurations)
+
+    rng = np.random.default_rng(0)
+    names = list(models)
+    errors = []
+    start = time.perf_counter()
+    for _ in range(args.sample):
+        c, m = rng.integers(len(configurations)), rng.integers(len(names))
+        precision, batch, sku = configurations[c]
+        spec = models[names[m]]
+        exact = estimate_model(spec['type'], spec['parameters'], precision, batch, sku)['joules_per_token']
+        errors.append(abs(costs[c][m] / exact - 1))
+    exact_seconds = time.perf_counter() - start
+
+    result = {
+        'models': args.models,
+        'configurations': len(configurations),
+        'build_ms': build_seconds * 1e3,
+        'lookups': lookups,
+        'lookups_per_second': lookups / lookup_seconds,
+        'exact_per_second': args.sample / exact_seconds,
+        'max_relative_error': max(errors),
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == '__main__':
+    main()
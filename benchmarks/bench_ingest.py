@@ -0,0 +1,111 @@
+"""Assessment ingestion throughput: the per-row ORM path used by
+/api/analyze before bulk ingestion versus BulkIngestor.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ingest --records 5000 --chunk-size 1000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app import db
+from app.models.models import Assessment, Recommendation
+from app.services.ingest import BulkIngestor, iter_ndjson
+
+
+def make_records(count, recommendations_per_record=3, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            'cloud_provider': rng.choice(['aws', 'azure', 'gcp']),
+            'instance_type': rng.choice(['p3.2xlarge', 'g4dn.xlarge', 'a2-highgpu-1g']),
+            'region': rng.choice(['us-east-1', 'eu-west-1', 'europe-north1']),
+            'cpu_util': rng.random(),
+            'gpu_util': rng.random(),
+            'emissions': rng.random() * 10,
+            'recommendations': [
+                {'text': f'Recommendation {j}', 'impact': rng.random() * 50, 'effort': 'low'}
+                for j in range(recommendations_per_record)
+            ],
+        }
+        for _ in range(count)
+    ]
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def per_row(records):
+    for record in records:
+        assessment = Assessment(
+            cloud_provider=record['cloud_provider'],
+            instance_type=record['instance_type'],
+            region=record['region'],
+            cpu_util=record['cpu_util'],
+            gpu_util=record['gpu_util'],
+            emissions=record['emissions']
+        )
+        db.session.add(assessment)
+        db.session.commit()
+        for rec in record['recommendations']:
+            db.session.add(Recommendation(assessment_id=assessment.id, text=rec['text'],
+                                          impact=rec['impact'], effort=rec['effort']))
+        db.session.commit()
+
+
+def bulk(records, chunk_size):
+    body = '\n'.join(json.dumps(record) for record in records).encode()
+    summary = BulkIngestor(chunk_size).ingest(iter_ndjson(io.BytesIO(body)))
+    assert summary['accepted'] == len(records), summary
+
+
+def run(name, fn, records):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            start = time.perf_counter()
+            fn(records)
+            elapsed = time.perf_counter() - start
+            assert Assessment.query.count() == len(records)
+            db.session.remove()
+            db.engine.dispose()
+    return {'name': name, 'seconds': elapsed, 'records_per_s': len(records) / elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--skip-per-row', action='store_true',
+                        help='only time the bulk path (the per-row path is slow)')
+    args = parser.parse_args(argv)
+
+    records = make_records(args.records)
+    results = {'records': args.records, 'chunk_size': args.chunk_size}
+    results['bulk'] = run('bulk', lambda r: bulk(r, args.chunk_size), records)
+    if not args.skip_per_row:
+        results['per_row'] = run('per_row', per_row, records)
+        results['speedup'] = results['bulk']['records_per_s'] / results['per_row']['records_per_s']
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
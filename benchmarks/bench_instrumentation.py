@@ -0,0 +1,112 @@
+"""Cost of request instrumentation: requests per second with metrics off
+and on, with slow-request tracing on, and the cost of the request hooks
+and of one stage timer on their own.
+
+Whole-request timings are the best of ``--rounds`` so that scheduling
+noise, which is larger than the hooks themselves, mostly cancels out.
+
+The query listeners are registered on the SQLAlchemy Engine class and
+stay installed for the rest of the process, so the metrics-off app is
+measured first.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_instrumentation --requests 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.config import Config
+from app.services import instrumentation
+from app.services.instrumentation import registry, stage
+from benchmarks import datagen
+
+ENDPOINTS = ['/api/assessments?limit=50', '/api/assessments/rollup']
+
+
+def make_app(directory: str, **settings):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'assessments.db')}"
+        JOB_BACKEND = 'memory'
+        TRACKER_WARM_UP = False
+        TELEMETRY_PATH = os.path.join(directory, 'telemetry')
+        TELEMETRY_ARCHIVE_PATH = os.path.join(directory, 'telemetry_archive')
+    for key, value in settings.items():
+        setattr(BenchConfig, key, value)
+    return create_app(BenchConfig)
+
+
+def requests_per_second(app, requests: int, rounds: int) -> dict:
+    client = app.test_client()
+    results = {}
+    for url in ENDPOINTS:
+        assert client.get(url).status_code == 200
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(requests):
+                client.get(url)
+            best = min(best, time.perf_counter() - start)
+        results[url] = {'requests_per_second': requests / best, 'ms_per_request': best / requests * 1e3}
+    return results
+
+
+def per_call_us(fn, calls: int = 100_000) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--assessments', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp, METRICS_ENABLED=False)
+        with app.app_context():
+            datagen.seed_assessments(args.assessments)
+        modes = {'off': requests_per_second(app, args.requests, args.rounds)}
+        app = make_app(tmp)
+        modes['on'] = requests_per_second(app, args.requests, args.rounds)
+        modes['tracing'] = requests_per_second(make_app(tmp, SLOW_REQUEST_SECONDS=60.0), args.requests,
+                                               args.rounds)
+
+    def request_hooks():
+        instrumentation._start_request(False)
+        instrumentation._finish_request(200, None)
+
+    def stage_timer():
+        with stage('bench'):
+            pass
+
+    with app.test_request_context(ENDPOINTS[0]):
+        hooks_us = per_call_us(request_hooks)
+    stage_us = per_call_us(stage_timer)
+    start = time.perf_counter()
+    body = registry.render()
+    render_ms = (time.perf_counter() - start) * 1e3
+
+    overhead = {
+        mode: {url: modes[mode][url]['ms_per_request'] - modes['off'][url]['ms_per_request'] for url in ENDPOINTS}
+        for mode in ('on', 'tracing')
+    }
+    results = {'requests': args.requests, 'assessments': args.assessments, 'modes': modes,
+               'overhead_ms_per_request': overhead, 'request_hooks_us': hooks_us, 'stage_timer_us': stage_us,
+               'render_ms': render_ms, 'render_bytes': len(body)}
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Emissions aggregate latency: scanning the assessments table versus
+reading the hourly/daily rollup tables.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rollups --records 1000000 --days 365
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from app import db
+from app.models.models import Assessment
+from app.services.history import AssessmentHistory
+from app.services.rollups import init_rollups, rebuild
+
+QUERIES = [
+    ('daily, last 30 days', {}, ['day'], 30),
+    ('daily by region, last 30 days', {}, ['day', 'region'], 30),
+    ('by provider, last 365 days', {}, ['provider'], 365),
+    ('daily for one region, last 365 days', {'region': 'eu-west-1'}, ['day'], 365),
+]
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    init_rollups(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def load(records, days, seed=0, chunk=50000):
+    """Insert ``records`` assessments spread over the last ``days`` days,
+    bypassing the rollups so they can be rebuilt and timed separately."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = days * 86400
+    for lo in range(0, records, chunk):
+        rows = [
+            {
+                'timestamp': now - timedelta(seconds=rng.random() * span),
+                'cloud_provider': rng.choice(['aws', 'azure', 'gcp']),
+                'instance_type': rng.choice(['p3.2xlarge', 'g4dn.xlarge', 'a2-highgpu-1g', 'nc6s_v3']),
+                'region': rng.choice(['us-east-1', 'eu-west-1', 'europe-north1', 'westeurope', 'us-west-2']),
+                'cpu_util': rng.random(),
+                'gpu_util': rng.random(),
+                'emissions': rng.random() * 10,
+            }
+            for _ in range(min(chunk, records - lo))
+        ]
+        db.session.connection().execute(insert(Assessment), rows)
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = {'records': args.records, 'days': args.days, 'queries': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            start = time.perf_counter()
+            load(args.records, args.days)
+            results['load_seconds'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results['buckets'] = rebuild()
+            results['rebuild_seconds'] = time.perf_counter() - start
+
+            for name, filters, group_by, days in QUERIES:
+                history = AssessmentHistory(**filters)
+                raw, raw_rows = timed(lambda: history.rollup(group_by, days, source='raw'), args.repeat)
+                rollup, rollup_rows = timed(lambda: history.rollup(group_by, days, source='rollup'), args.repeat)
+                assert len(raw_rows) == len(rollup_rows), name
+                raw_total = sum(row['emissions'] for row in raw_rows)
+                assert abs(raw_total - sum(row['emissions'] for row in rollup_rows)) <= 1e-9 * raw_total, name
+                results['queries'].append({'name': name, 'groups': len(rollup_rows), 'raw_seconds': raw,
+                                           'rollup_seconds': rollup, 'speedup': raw / rollup})
+            db.session.remove()
+            db.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""What-if simulation latency as a user moves one control at a time.
+
+A cold run computes every pipeline stage; each following step changes one
+action, as a slider would, and recomputes only the stages after it. The
+last step returns to an earlier set of actions and is served from cache.
+
+Before timing, the carbon-aware scheduler's start hours are checked
+against a brute-force search on small random traces with mixed slack.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_simulation --days 30 --interval 1min --gpus 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.metrics import to_timedelta
+from app.core.simulation import JobTrace, WhatIfSimulator, simulate_carbon_shift
+from benchmarks.datagen import metric_frame
+
+MODELS = {
+    'llm': {'type': 'transformer', 'parameters': 13e9, 'precision': 'fp32'},
+    'embedder': {'type': 'transformer', 'parameters': 3e8, 'precision': 'fp16'},
+}
+
+QUANTIZE = {'type': 'quantize', 'model': 'llm', 'precision': 'int8'}
+STEPS = [
+    ('cold', []),
+    ('quantize', [QUANTIZE]),
+    ('downsize', [QUANTIZE, {'type': 'downsize', 'gpus': 4}]),
+    ('move_region', [QUANTIZE, {'type': 'downsize', 'gpus': 4}, {'type': 'move_region'}]),
+    ('shift_schedule', [QUANTIZE, {'type': 'downsize', 'gpus': 4}, {'type': 'move_region'},
+                        {'type': 'shift_schedule', 'deferrable_fraction': 0.5}]),
+    ('shift_flexibility', [QUANTIZE, {'type': 'downsize', 'gpus': 4}, {'type': 'move_region'},
+                           {'type': 'shift_schedule', 'deferrable_fraction': 0.5, 'flexibility_hours': 6}]),
+    ('back_to_downsize', [QUANTIZE, {'type': 'downsize', 'gpus': 4}]),
+]
+
+
+def brute_force_starts(curve, trace, capacity_kw=None):
+    """Start hours the scheduler should pick: jobs least slack first, each at
+    its cheapest start before its deadline with room under ``capacity_kw``,
+    or None when some job has no such start."""
+    earliest = np.floor(trace.arrival).astype(int)
+    latest = np.maximum(earliest, np.floor(trace.deadline - trace.duration).astype(int))
+    slots = np.ceil(trace.duration).astype(int)
+    usage = np.zeros(int((latest + slots).max()) + 1)
+    starts = np.empty(len(trace), dtype=int)
+    for job in np.lexsort((earliest, latest)):
+        # Full hours count whole, the last partial hour by its fraction
+        weights = np.minimum(trace.duration[job] - np.arange(slots[job]), 1)
+        costs = {}
+        for start in range(earliest[job], latest[job] + 1):
+            window = slice(start, start + slots[job])
+            if capacity_kw is None or usage[window].max() + trace.power_kw[job] <= capacity_kw:
+                costs[start] = np.dot(curve[np.arange(start, start + slots[job]) % len(curve)], weights)
+        if not costs:
+            return None
+        starts[job] = min(costs, key=costs.get)
+        usage[starts[job]:starts[job] + slots[job]] += trace.power_kw[job]
+    return starts
+
+
+def check_scheduler(traces: int = 300, seed: int = 0) -> int:
+    """Assert the scheduler agrees with ``brute_force_starts`` and return how
+    many traces were compared."""
+    rng = np.random.default_rng(seed)
+    compared = 0
+    for _ in range(traces):
+        jobs = int(rng.integers(1, 12))
+        # Longer than any trace, so no two starts tie on a repeated day
+        curve = rng.uniform(50, 500, 96)
+        arrival = rng.uniform(0, 30, jobs)
+        duration = rng.uniform(0.2, 4, jobs)
+        # Slack from none to past the curve's length, so blocks mix both
+        slack = rng.choice([0, 2, 12, 40], jobs) * rng.uniform(0, 1, jobs)
+        trace = JobTrace(arrival, duration, rng.uniform(0.1, 1, jobs), arrival + duration + slack)
+        capacity = None if rng.random() < 0.5 else float(rng.uniform(1, 3))
+        expected = brute_force_starts(curve, trace, capacity)
+        result = simulate_carbon_shift(curve, trace, capacity)
+        if expected is None:
+            continue
+        assert result.late_jobs == 0 and np.array_equal(result.start, expected), (arrival, duration, slack)
+        compared += 1
+    return compared
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', default='1min')
+    parser.add_argument('--gpus', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    schedule_checks = check_scheduler()
+    samples = int(args.days * 86400 // to_timedelta(args.interval).astype(int))
+    frame = metric_frame(samples, devices=args.gpus, interval=args.interval)
+    start = time.perf_counter()
+    simulator = WhatIfSimulator(frame, 'us-east-1', MODELS)
+    setup_ms = (time.perf_counter() - start) * 1e3
+
+    steps = []
+    for name, actions in STEPS:
+        start = time.perf_counter()
+        result = simulator.simulate(actions)
+        steps.append({
+            'step': name,
+            'ms': (time.perf_counter() - start) * 1e3,
+            'recomputed': result['recomputed'],
+            'carbon_fraction': result['savings']['carbon_fraction'],
+        })
+    print(json.dumps({'samples': samples, 'gpus': args.gpus, 'setup_ms': setup_ms,
+                      'schedule_checks': schedule_checks, 'steps': steps}, indent=2))
+    return steps
+
+
+if __name__ == '__main__':
+    main()
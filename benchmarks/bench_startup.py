@@ -0,0 +1,201 @@
+"""App startup time and per-worker memory, with and without preloading.
+
+Each measurement runs in a fresh interpreter:
+
+- ``import app`` and ``create_app()`` wall time, and whether modules that
+  should only load on demand (pandas, codecarbon, the async collectors)
+  were imported anyway;
+- gunicorn-style workers: with preloading the app is created once and
+  ``--workers`` children are forked from it, as ``gunicorn.conf.py`` does;
+  without it every forked child creates its own app. Each worker then
+  serves a few requests and computes recommendations for one assessment,
+  touching the rule and intensity tables, before its memory is read from
+  /proc/self/smaps_rollup while all workers are alive. ``private_mb`` is
+  what the worker holds alone; ``pss_mb`` also counts its share of pages
+  shared with the others.
+
+Results are checked against the "startup" budgets in thresholds.json and
+the script exits with status 1 when one is exceeded.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --workers 4 --repeat 5
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+ON_DEMAND_MODULES = ('pandas', 'codecarbon', 'app.core.collectors', 'app.services.analyzer')
+
+
+def memory_mb() -> dict:
+    """This process's RSS, PSS and private memory in MB."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss_mb': fields.get('Rss', 0.0),
+        'pss_mb': fields.get('Pss', 0.0),
+        'private_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+    }
+
+
+def create_app_in(directory: str):
+    from app import create_app
+    from app.config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'assessments.db')}"
+        JOB_BACKEND = 'memory'
+        TELEMETRY_PATH = os.path.join(directory, 'telemetry')
+        TELEMETRY_ARCHIVE_PATH = os.path.join(directory, 'telemetry_archive')
+        COLLECTOR_CACHE_PATH = os.path.join(directory, 'collector_cache')
+    return create_app(BenchConfig)
+
+
+def child_startup(directory: str) -> dict:
+    start = time.perf_counter()
+    importlib.import_module('app')
+    imported = time.perf_counter()
+    create_app_in(directory)
+    created = time.perf_counter()
+    return dict(memory_mb(), import_seconds=imported - start, create_app_seconds=created - imported,
+                loaded=[name for name in ON_DEMAND_MODULES if name in sys.modules])
+
+
+def serve(application):
+    """A worker's first requests: pages, history, and a recommendation run."""
+    from app.core.recommendation import RecommendationSystem
+    from benchmarks.datagen import assessment_data
+
+    client = application.test_client()
+    for url in ('/', '/api/assessments', '/api/assessments/rollup', '/metrics'):
+        client.get(url)
+    with application.app_context():
+        RecommendationSystem(assessment_data(50)).get_roi_estimates()
+
+
+def child_workers(directory: str, workers: int, preload: bool) -> dict:
+    if preload:
+        os.environ['APP_PRELOAD'] = '1'
+        start = time.perf_counter()
+        application = create_app_in(directory)
+        master_seconds = time.perf_counter() - start
+    ready_read, ready_write = os.pipe()
+    go_read, go_write = os.pipe()
+    result_read, result_write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                start = time.perf_counter()
+                if preload:
+                    from app.services.preload import after_fork
+                    after_fork(application)
+                else:
+                    application = create_app_in(directory)
+                boot_seconds = time.perf_counter() - start
+                serve(application)
+                os.write(ready_write, b'.')
+                os.read(go_read, 1)
+                line = json.dumps(dict(memory_mb(), boot_seconds=boot_seconds)) + '\n'
+                os.write(result_write, line.encode())
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    received = 0
+    while received < workers:
+        received += len(os.read(ready_read, workers))
+    # Measure only once every worker is up, so shared pages are counted as shared
+    os.write(go_write, b'.' * workers)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    os.close(result_write)
+    with os.fdopen(result_read) as f:
+        per_worker = [json.loads(line) for line in f]
+    summary = {key: statistics.mean(w[key] for w in per_worker) for key in per_worker[0]}
+    summary['total_pss_mb'] = sum(w['pss_mb'] for w in per_worker)
+    if preload:
+        summary['master_seconds'] = master_seconds
+    return summary
+
+
+def run_child(*args) -> dict:
+    env = dict(os.environ, TRACKER_WARM_UP='0')
+    env.pop('APP_PRELOAD', None)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', *args],
+                            cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check(results: dict, budgets: dict) -> list:
+    failures = [f'{name} imported at startup' for name in results['startup']['loaded']]
+    for key in ('import_seconds', 'create_app_seconds'):
+        if key in budgets and results['startup'][key] > budgets[key]:
+            failures.append(f'{key} {results["startup"][key]:.3f} > {budgets[key]}')
+    for mode in ('preload', 'no_preload'):
+        budget = budgets.get(f'{mode}_private_mb')
+        if budget is not None and results[mode]['private_mb'] > budget:
+            failures.append(f'{mode} private_mb {results[mode]["private_mb"]:.1f} > {budget}')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters timed for startup')
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--child', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        os.environ.setdefault('TRACKER_WARM_UP', '0')
+        mode, directory = args.child[0], args.child[1]
+        if mode == 'startup':
+            result = child_startup(directory)
+        else:
+            result = child_workers(directory, int(args.child[2]), mode == 'preload')
+        print(json.dumps(result))
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [run_child('startup', tmp) for _ in range(args.repeat)]
+        startup = {key: statistics.median(run[key] for run in runs)
+                   for key in ('import_seconds', 'create_app_seconds', 'rss_mb')}
+        startup['loaded'] = sorted({name for run in runs for name in run['loaded']})
+        results = {
+            'workers': args.workers,
+            'startup': startup,
+            'preload': run_child('preload', tmp, str(args.workers)),
+            'no_preload': run_child('no_preload', tmp, str(args.workers)),
+        }
+    results['private_mb_saved_per_worker'] = (results['no_preload']['private_mb']
+                                              - results['preload']['private_mb'])
+
+    budgets = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            budgets = json.load(f).get('startup', {})
+    results['failures'] = check(results, budgets)
+    print(json.dumps(results, indent=2))
+    if results['failures']:
+        raise SystemExit(1)
+    return results
+
+
+if __name__ == '__main__':
+    main()
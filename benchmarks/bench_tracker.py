@@ -0,0 +1,70 @@
+"""Per-measurement setup cost: a new EmissionsTracker per request versus a
+session on the shared TrackerManager.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_tracker --iterations 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.tracking import TrackerManager
+
+
+def time_calls(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        'iterations': iterations,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'max_ms': max(timings) * 1000,
+    }
+
+
+def per_request_tracker():
+    from codecarbon import EmissionsTracker
+    tracker = EmissionsTracker(log_level='error', save_to_file=False,
+                               allow_multiple_runs=True)
+    tracker.start()
+    tracker.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    manager = TrackerManager()
+    start = time.perf_counter()
+    manager.warm_up()
+    warm_up_ms = (time.perf_counter() - start) * 1000
+
+    results = {
+        'meter': manager.source,
+        'manager_warm_up_ms': warm_up_ms,
+        'manager_session': time_calls(lambda: manager.start().stop(), args.iterations),
+    }
+    try:
+        results['tracker_per_request'] = time_calls(per_request_tracker, args.iterations)
+        results['speedup'] = (results['tracker_per_request']['mean_ms']
+                              / results['manager_session']['mean_ms'])
+    except ImportError:
+        results['tracker_per_request'] = None
+    manager.close()
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
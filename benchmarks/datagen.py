@@ -0,0 +1,125 @@
+"""Synthetic data for the benchmark suite at 1k, 100k and 10M scale.
+
+Every generator is seeded, so a scale always produces the same data and
+timings from different runs compare like with like.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.core.energy import EnergyModel
+from app.core.metrics import MetricFrame, to_timedelta
+from app.models.models import Assessment, Recommendation
+from app.services.rollups import rebuild
+
+SCALES = {'1k': 1_000, '100k': 100_000, '10M': 10_000_000}
+
+PROVIDERS = np.array(['aws', 'azure', 'gcp'], dtype=object)
+REGIONS = np.array(['us-east-1', 'us-west-2', 'eu-west-1', 'europe-north1', 'westeurope'], dtype=object)
+INSTANCE_TYPES = np.array(['p3.2xlarge', 'g4dn.xlarge', 'a2-highgpu-1g', 'nc6s_v3'], dtype=object)
+MODEL_TYPES = np.array(['transformer', 'transformer', 'cnn', 'rnn'], dtype=object)
+PRECISIONS = np.array(['fp32', 'fp16', 'bf16', 'int8'], dtype=object)
+EFFORTS = np.array(['low', 'medium', 'high'], dtype=object)
+
+# Fixed end of generated time series, so intensity lookups repeat exactly
+EPOCH = np.datetime64('2024-06-01T00:00:00', 's')
+
+
+def parse_scale(scale: str) -> int:
+    """Size of a named scale, or of a plain integer such as '250000'."""
+    if scale in SCALES:
+        return SCALES[scale]
+    try:
+        size = int(scale)
+    except ValueError:
+        raise ValueError(f'Unknown scale {scale!r}; use {", ".join(SCALES)} or a number')
+    if size <= 0:
+        raise ValueError('Scale must be positive')
+    return size
+
+
+def metric_frame(samples: int, devices: int = 4, interval: str = '1min', seed: int = 0) -> MetricFrame:
+    """GPU, CPU and memory utilization with ``samples`` points per device,
+    ending at EPOCH, with about 1% of GPU samples missing."""
+    rng = np.random.default_rng(seed)
+    step = to_timedelta(interval)
+    timestamps = EPOCH - step * np.arange(samples, 0, -1)
+    hours = (timestamps.astype(np.int64) // 3600 % 24).astype(np.float32)
+    daily = 0.5 + 0.25 * np.sin(hours / 24 * 2 * np.pi)
+    gpu = np.clip(daily + rng.normal(0, 0.1, (devices, samples)).astype(np.float32), 0, 1)
+    gpu[rng.random((devices, samples)) < 0.01] = np.nan
+    frame = MetricFrame(timestamps)
+    frame.add('gpu_utilization', gpu, [f'gpu{i}' for i in range(devices)])
+    frame.add('cpu_utilization', rng.uniform(0.2, 0.6, samples), ['host'])
+    frame.add('memory_utilization', rng.uniform(0.4, 0.9, samples), ['host'])
+    return frame
+
+
+def model_inventory(count: int, seed: int = 0) -> dict:
+    """``count`` model specs with log-uniform parameter counts from 10M to 500B."""
+    rng = np.random.default_rng(seed)
+    parameters = np.round(10 ** rng.uniform(7, 11.7, count), -6)
+    types = MODEL_TYPES[rng.integers(0, len(MODEL_TYPES), count)]
+    precisions = PRECISIONS[rng.integers(0, len(PRECISIONS), count)]
+    return {
+        f'model{i}': {'type': types[i], 'parameters': float(parameters[i]), 'precision': precisions[i]}
+        for i in range(count)
+    }
+
+
+def assessment_data(models: int, samples: int = 7 * 24, region: str = 'us-east-1', seed: int = 0) -> dict:
+    """Assessment data as AssessmentEngine.run_full_assessment returns it,
+    for ``models`` deployed models and an hourly metrics window."""
+    metrics = metric_frame(samples, interval='1h', seed=seed)
+    return {
+        'deployment': {'name': 'bench', 'cloud_provider': 'aws', 'region': region},
+        'models': model_inventory(models, seed),
+        'hardware_metrics': metrics,
+        'energy_data': EnergyModel().estimate(metrics, region),
+    }
+
+
+def seed_assessments(count: int, days: int = 365, recommendations: int = 2,
+                     seed: int = 0, chunk: int = 100_000) -> dict:
+    """Insert ``count`` assessments spread over the last ``days`` days, each
+    with ``recommendations`` recommendations, then rebuild the rollups.
+
+    Rows go in as executemany inserts in ``chunk`` sized transactions,
+    bypassing the ORM, so 10M rows load in minutes rather than hours.
+
+    Returns:
+        Rows inserted per table and the rollup bucket counts
+    """
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    span = days * 86400
+    connection = db.session.connection()
+    first_id = (connection.execute(select(func.max(Assessment.id))).scalar() or 0) + 1
+    for lo in range(0, count, chunk):
+        n = min(chunk, count - lo)
+        ids = np.arange(first_id + lo, first_id + lo + n)
+        offsets = rng.integers(0, span, n)
+        providers = PROVIDERS[rng.integers(0, len(PROVIDERS), n)]
+        regions = REGIONS[rng.integers(0, len(REGIONS), n)]
+        instance_types = INSTANCE_TYPES[rng.integers(0, len(INSTANCE_TYPES), n)]
+        cpu, gpu, emissions = rng.random(n), rng.random(n), rng.random(n) * 10
+        connection.execute(insert(Assessment), [
+            {'id': int(ids[i]), 'timestamp': now - timedelta(seconds=int(offsets[i])),
+             'cloud_provider': providers[i], 'region': regions[i], 'instance_type': instance_types[i],
+             'cpu_util': float(cpu[i]), 'gpu_util': float(gpu[i]), 'emissions': float(emissions[i])}
+            for i in range(n)
+        ])
+        if recommendations:
+            impacts = rng.random((n, recommendations)) * 50
+            efforts = EFFORTS[rng.integers(0, len(EFFORTS), (n, recommendations))]
+            implemented = rng.random((n, recommendations)) < 0.3
+            connection.execute(insert(Recommendation), [
+                {'assessment_id': int(ids[i]), 'text': f'Recommendation {j} for assessment {ids[i]}',
+                 'impact': float(impacts[i, j]), 'effort': efforts[i, j], 'implemented': bool(implemented[i, j])}
+                for i in range(n) for j in range(recommendations)
+            ])
+        db.session.commit()
+        connection = db.session.connection()
+    return {'assessments': count, 'recommendations': count * recommendations, 'buckets': rebuild()}
@@ -0,0 +1,415 @@
+"""Benchmark suite for the assessment, recommendation and API hot paths.
+
+Covers /api/analyze latency, energy estimation over long utilization
+series, recommendations over large model inventories, and dashboard and
+history queries as the assessments table grows. Data comes from the seeded
+generators in benchmarks.datagen at 1k, 100k or 10M scale, in a SQLite
+database.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --scale 1k
+    python -m benchmarks.suite --scale 100k --output results.json --profile cprofile
+    python -m benchmarks.suite --scale 1k --baseline results.json
+
+Each benchmark runs once to warm up and is then timed --repeat times. A
+benchmark fails when its median exceeds its budget for the scale in
+thresholds.json, or the baseline's median by more than --tolerance; the
+exit status is 1 if any failed.
+"""
+import argparse
+import cProfile
+import gc
+import json
+import os
+import platform
+import pstats
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from app import create_app, db
+from app.config import Config
+from app.core.assessment import AssessmentEngine
+from app.core.recommendation import RecommendationSystem
+from app.models.models import Assessment
+from app.services.cache import ResultsCache
+from benchmarks import datagen
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, database: bool = False, limit: int = None):
+    """Register ``setup(context, size)``, which prepares the data for one
+    scale and returns the callable to time.
+
+    Args:
+        name: Benchmark name used in results and thresholds
+        database: Whether it needs the seeded assessments database
+        limit: Largest size it runs at without --no-limits
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = {'setup': setup, 'database': database, 'limit': limit,
+                            'description': setup.__doc__.strip().split('\n')[0]}
+        return setup
+    return decorator
+
+
+@benchmark('analyze_api', database=True)
+def analyze_api(context, size):
+    """POST /api/analyze and wait for the measurement job to finish."""
+    client = context['client']
+    payload = {'cloud_provider': 'aws', 'instance_type': 'p3.2xlarge', 'region': 'us-east-1',
+               'duration': 0}
+
+    def run():
+        response = client.post('/api/analyze', json=payload)
+        assert response.status_code == 202, response.get_data(as_text=True)
+        job = client.get(f"/api/jobs/{response.get_json()['id']}/wait?timeout=30").get_json()
+        assert job['status'] == 'finished', job
+    return run
+
+
+@benchmark('energy_estimate')
+def energy_estimate(context, size):
+    """AssessmentEngine.estimate_energy_consumption over 4 GPUs x size samples."""
+    engine = AssessmentEngine('aws', region='us-east-1')
+    engine.collected_data['hardware_metrics'] = datagen.metric_frame(size)
+
+    def run():
+        engine.estimate_energy_consumption()
+    return run
+
+
+@benchmark('recommendations', limit=1_000_000)
+def recommendations(context, size):
+    """RecommendationSystem.generate_recommendations for size models, uncached."""
+    data = datagen.assessment_data(size)
+
+    def run():
+        RecommendationSystem(data, cache=ResultsCache()).generate_recommendations()
+    return run
+
+
+@benchmark('recommendations_cached', limit=1_000_000)
+def recommendations_cached(context, size):
+    """RecommendationSystem.generate_recommendations for size models, from the results cache."""
+    data = datagen.assessment_data(size)
+    cache = ResultsCache()
+    RecommendationSystem(data, cache=cache).generate_recommendations()
+
+    def run():
+        RecommendationSystem(data, cache=cache).generate_recommendations()
+    return run
+
+
+@benchmark('dashboard', database=True)
+def dashboard(context, size):
+    """GET /dashboard over size assessments."""
+    client = context['client']
+
+    def run():
+        response = client.get('/dashboard')
+        assert response.status_code == 200
+    return run
+
+
+@benchmark('history_page', database=True)
+def history_page(context, size):
+    """GET /api/assessments, first and fifth page, unfiltered and by region."""
+    client = context['client']
+
+    def run():
+        for query in ('', 'region=eu-west-1&'):
+            cursor = None
+            for _ in range(5):
+                url = f'/api/assessments?{query}limit=50' + (f'&cursor={cursor}' if cursor else '')
+                page = client.get(url).get_json()
+                cursor = page['next_cursor']
+    return run
+
+
+@benchmark('history_rollup', database=True)
+def history_rollup(context, size):
+    """GET /api/assessments/rollup by day and region over 30 days."""
+    client = context['client']
+
+    def run():
+        response = client.get('/api/assessments/rollup?group_by=day,region')
+        assert response.status_code == 200
+    return run
+
+
+def short_path(filename: str) -> str:
+    path = os.path.relpath(filename, ROOT)
+    return filename if path.startswith('..') else path
+
+
+class SamplingProfiler:
+    """Samples the stacks of every other thread every ``interval`` seconds
+    and counts them in collapsed form, one ``frame;frame;... count`` line
+    per stack, as flamegraph.pl and speedscope read.
+
+    Stacks whose innermost frame is in the threading module are threads
+    blocked on a lock or condition; they are written out but left out of
+    ``top``.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({short_path(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def top(self, n: int = 15):
+        """Frames with the most samples at the top of a running stack."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(';', 1)[-1]
+            if f'({threading.__file__}:' not in leaf:
+                leaves[leaf] += count
+        total = sum(leaves.values()) or 1
+        return [{'frame': frame, 'samples': count, 'fraction': count / total}
+                for frame, count in leaves.most_common(n)]
+
+
+def cprofile_top(profile: cProfile.Profile, n: int = 15):
+    """Functions with the highest cumulative time."""
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:n]
+    return [{'function': f'{short_path(filename)}:{line}({name})', 'calls': calls,
+             'tottime': tottime, 'cumtime': cumtime}
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in rows]
+
+
+def repeat_for(run, seconds: float) -> int:
+    """Call ``run`` until ``seconds`` have passed, at least once."""
+    deadline = time.perf_counter() + seconds
+    runs = 0
+    while not runs or time.perf_counter() < deadline:
+        run()
+        runs += 1
+    return runs
+
+
+def capture_profile(run, kind: str, path: str, seconds: float, interval: float):
+    """Run repeatedly for ``seconds`` under a profiler, so even fast
+    benchmarks collect enough samples, writing the capture to ``path``."""
+    if kind == 'cprofile':
+        profile = cProfile.Profile()
+        runs = profile.runcall(repeat_for, run, seconds)
+        profile.dump_stats(path)
+        return {'kind': kind, 'path': path, 'runs': runs, 'top': cprofile_top(profile)}
+    with SamplingProfiler(interval) as profiler:
+        runs = repeat_for(run, seconds)
+    profiler.write(path)
+    return {'kind': kind, 'path': path, 'runs': runs, 'samples': sum(profiler.stacks.values()),
+            'top': profiler.top()}
+
+
+def time_runs(run, repeat: int):
+    run()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'p95': float(np.percentile(timings, 95)),
+        'max': max(timings),
+    }
+
+
+def make_app(directory: str, scale: str):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, f'assessments-{scale}.db')}"
+        JOB_BACKEND = 'memory'
+        TRACKER_WARM_UP = False
+        TELEMETRY_PATH = os.path.join(directory, 'telemetry')
+        TELEMETRY_ARCHIVE_PATH = os.path.join(directory, 'telemetry_archive')
+        COLLECTOR_CACHE_PATH = os.path.join(directory, 'collector_cache')
+    return create_app(BenchConfig)
+
+
+def seed_database(app, size: int):
+    """Seed the scale's database unless a previous run with --data-dir did."""
+    with app.app_context():
+        existing = db.session.query(Assessment).count()
+        if existing == size:
+            return {'assessments': existing, 'reused': True}
+        if existing:
+            raise SystemExit(f'{app.config["SQLALCHEMY_DATABASE_URI"]} holds {existing} assessments, '
+                             f'not {size}; remove it or use another --data-dir')
+        start = time.perf_counter()
+        seeded = datagen.seed_assessments(size)
+        seeded['seconds'] = time.perf_counter() - start
+        db.session.remove()
+        return seeded
+
+
+def check(result: dict, thresholds: dict, baseline: dict, tolerance: float):
+    """Failures of one benchmark result against its budget and baseline."""
+    failures = []
+    budget = thresholds.get(result['name'], {}).get(result['scale'])
+    if budget is not None and result['median'] > budget:
+        failures.append(f"median {result['median']:.4f}s exceeds the {budget:g}s budget")
+    previous = baseline.get((result['name'], result['scale']))
+    if previous is not None and result['median'] > previous['median'] * (1 + tolerance):
+        failures.append(f"median {result['median']:.4f}s is more than {tolerance:.0%} above "
+                        f"the baseline's {previous['median']:.4f}s")
+    return failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', nargs='+', default=['1k'],
+                        help=f'{", ".join(datagen.SCALES)} or a number of items (default: 1k)')
+    parser.add_argument('--benchmark', '-b', nargs='+', choices=sorted(BENCHMARKS),
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', '-o', help='Write results JSON here as well as to stdout')
+    parser.add_argument('--profile', choices=['cprofile', 'sample'],
+                        help='Capture a profile of one extra run of each benchmark; cprofile '
+                             'sees only the calling thread, sample sees every thread')
+    parser.add_argument('--profile-dir', default='profiles')
+    parser.add_argument('--profile-seconds', type=float, default=1.0,
+                        help='Minimum time to profile each benchmark for')
+    parser.add_argument('--sample-interval', type=float, default=0.005)
+    parser.add_argument('--baseline', help='Earlier results JSON to compare medians with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown over the baseline median (default: 0.25)')
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH,
+                        help='Budgets JSON of median seconds per benchmark and scale')
+    parser.add_argument('--data-dir', help='Keep seeded databases here and reuse them across runs')
+    parser.add_argument('--no-limits', action='store_true',
+                        help='Run benchmarks even above their size limit')
+    args = parser.parse_args(argv)
+
+    try:
+        scales = [(scale, datagen.parse_scale(scale)) for scale in args.scale]
+    except ValueError as exc:
+        parser.error(str(exc))
+    names = args.benchmark or list(BENCHMARKS)
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r['name'], r['scale']): r for r in json.load(f)['results'] if 'median' in r}
+    if args.profile:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    report = {
+        'started': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeat': args.repeat,
+        'tolerance': args.tolerance,
+        'setup': {},
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.data_dir or tmp
+        os.makedirs(directory, exist_ok=True)
+        for scale, size in scales:
+            app = make_app(directory, scale)
+            context = {'app': app, 'client': app.test_client()}
+            if any(BENCHMARKS[name]['database'] for name in names):
+                report['setup'][scale] = seed_database(app, size)
+            for name in names:
+                spec = BENCHMARKS[name]
+                result = {'name': name, 'scale': scale, 'size': size, 'description': spec['description']}
+                if spec['limit'] and size > spec['limit'] and not args.no_limits:
+                    result['skipped'] = f"size exceeds the benchmark's limit of {spec['limit']}"
+                    report['results'].append(result)
+                    print(f'{name} [{scale}]: skipped', file=sys.stderr)
+                    continue
+                with app.app_context():
+                    start = time.perf_counter()
+                    run = spec['setup'](context, size)
+                    result['setup_seconds'] = time.perf_counter() - start
+                    result.update(time_runs(run, args.repeat))
+                    if args.profile:
+                        suffix = 'prof' if args.profile == 'cprofile' else 'folded'
+                        path = os.path.join(args.profile_dir, f'{name}-{scale}.{suffix}')
+                        result['profile'] = capture_profile(run, args.profile, path, args.profile_seconds,
+                                                            args.sample_interval)
+                    db.session.remove()
+                result['failures'] = check(result, thresholds, baseline, args.tolerance)
+                report['results'].append(result)
+                status = 'FAIL: ' + '; '.join(result['failures']) if result['failures'] else 'ok'
+                print(f"{name} [{scale}]: median {result['median'] * 1000:.2f} ms ({status})", file=sys.stderr)
+            with app.app_context():
+                db.engine.dispose()
+
+    report['failed'] = sum(bool(r.get('failures')) for r in report['results'])
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    return report
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main()['failed'] else 0)
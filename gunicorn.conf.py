@@ -0,0 +1,31 @@
+"""gunicorn settings for the Docker image.
+
+GUNICORN_PRELOAD=1 (the default) loads the app once in the master so the
+workers share its read-only tables through copy-on-write; see
+app/services/preload.py. Set it to 0 to have every worker load its own
+copy, e.g. to pick up code changes with ``--reload``.
+
+WEB_CONCURRENCY sets the number of workers (default 2). With more than
+one, background jobs default to the SQLite store shared by all of them,
+and the app refuses to start with JOB_BACKEND=memory.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Read by app.config when the app is imported, which happens after this
+# file; APP_WORKERS makes background jobs default to the shared SQLite store
+if preload_app:
+    os.environ['APP_PRELOAD'] = '1'
+os.environ['APP_WORKERS'] = str(workers)
+
+
+def post_fork(server, worker):
+    # --workers on the command line overrides ``workers`` above; a worker
+    # that fails here stops gunicorn from booting
+    os.environ['APP_WORKERS'] = str(server.cfg.workers)
+    if preload_app:
+        from app.services.preload import after_fork
+        after_fork(worker.app.wsgi(), server.cfg.workers)